@@ -0,0 +1,175 @@
+import json
+import os
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Iterable, TextIO
+
+from lsprotocol.types import Diagnostic, DiagnosticSeverity
+
+from .diagnostics import diagnose_file
+from .index import find_unit_files
+from .values import get_value_schema
+
+#  Headless mode checking unit files with the same diagnostics as the editor, for use in
+#  CI: systemd-language-server check PATH... Files are checked in a pool of processes,
+#  since checking is CPU bound.
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+#  below this number of files, starting a process pool costs more than it saves
+POOL_THRESHOLD = 64
+
+severity_names = {
+    DiagnosticSeverity.Error: "error",
+    DiagnosticSeverity.Warning: "warning",
+    DiagnosticSeverity.Information: "note",
+    DiagnosticSeverity.Hint: "note",
+}
+
+
+def add_check_arguments(parser: ArgumentParser):
+    parser.add_argument("paths", nargs="+", type=Path, metavar="PATH")
+    parser.add_argument(
+        "--format", choices=["text", "json", "sarif"], default="text", dest="format"
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes",
+    )
+
+
+def collect_unit_files(paths: Iterable[Path]) -> list[Path]:
+    """Unit files given, and the unit files and drop-ins found in the directories
+    given"""
+    files: list[Path] = []
+    for path in paths:
+        if path.is_dir():
+            files += sorted(find_unit_files(path, dropins=True))
+        elif path.exists():
+            files.append(path)
+        else:
+            raise FileNotFoundError(path)
+    return list(dict.fromkeys(files))
+
+
+def check_files(paths: list[Path], jobs: int) -> list[tuple[Path, list[Diagnostic]]]:
+    """Diagnostics of each file, in the order given"""
+    if jobs <= 1 or len(paths) < POOL_THRESHOLD:
+        return [(path, diagnose_file(path)) for path in paths]
+    #  multiprocessing is imported here, as other commands only need it for large
+    #  workspaces
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    #  forked workers inherit the directive tables and value schema loaded here, workers
+    #  started otherwise (forkserver, spawn) load them as they start
+    if multiprocessing.get_start_method() == "fork":
+        get_value_schema()
+    chunksize = max(1, len(paths) // (jobs * 4))
+    with ProcessPoolExecutor(jobs, initializer=get_value_schema) as executor:
+        return list(zip(paths, executor.map(diagnose_file, paths, chunksize=chunksize)))
+
+
+def severity_name(diagnostic: Diagnostic) -> str:
+    return severity_names.get(diagnostic.severity or DiagnosticSeverity.Error, "error")
+
+
+def write_text(results: list[tuple[Path, list[Diagnostic]]], output: TextIO):
+    for path, diagnostics in results:
+        for diagnostic in diagnostics:
+            start = diagnostic.range.start
+            output.write(
+                f"{path}:{start.line + 1}:{start.character + 1}: "
+                f"{severity_name(diagnostic)}: {diagnostic.message} [{diagnostic.code}]\n"
+            )
+
+
+def write_json(results: list[tuple[Path, list[Diagnostic]]], output: TextIO):
+    json.dump(
+        [
+            {
+                "path": str(path),
+                "line": diagnostic.range.start.line + 1,
+                "column": diagnostic.range.start.character + 1,
+                "end_line": diagnostic.range.end.line + 1,
+                "end_column": diagnostic.range.end.character + 1,
+                "severity": severity_name(diagnostic),
+                "code": diagnostic.code,
+                "message": diagnostic.message,
+            }
+            for path, diagnostics in results
+            for diagnostic in diagnostics
+        ],
+        output,
+        indent=2,
+    )
+    output.write("\n")
+
+
+def write_sarif(results: list[tuple[Path, list[Diagnostic]]], output: TextIO):
+    sarif_results = [
+        {
+            "ruleId": diagnostic.code,
+            "level": severity_name(diagnostic),
+            "message": {"text": diagnostic.message},
+            "locations": [
+                {
+                    "physicalLocation": {
+                        "artifactLocation": {"uri": path.as_posix()},
+                        "region": {
+                            "startLine": diagnostic.range.start.line + 1,
+                            "startColumn": diagnostic.range.start.character + 1,
+                            "endLine": diagnostic.range.end.line + 1,
+                            "endColumn": diagnostic.range.end.character + 1,
+                        },
+                    }
+                }
+            ],
+        }
+        for path, diagnostics in results
+        for diagnostic in diagnostics
+    ]
+    rules = sorted({result["ruleId"] for result in sarif_results})
+    json.dump(
+        {
+            "$schema": SARIF_SCHEMA,
+            "version": "2.1.0",
+            "runs": [
+                {
+                    "tool": {
+                        "driver": {
+                            "name": "systemd-language-server",
+                            "informationUri": "https://github.com/psacawa/systemd-language-server",
+                            "rules": [{"id": rule} for rule in rules],
+                        }
+                    },
+                    "results": sarif_results,
+                }
+            ],
+        },
+        output,
+        indent=2,
+    )
+    output.write("\n")
+
+
+writers = {"text": write_text, "json": write_json, "sarif": write_sarif}
+
+
+def check(args, output: TextIO = sys.stdout) -> int:
+    """Run the check command. Return the exit code: 0 if no problems were found, 1 if
+    some were, 2 if a path doesn't exist."""
+    try:
+        paths = collect_unit_files(args.paths)
+    except FileNotFoundError as e:
+        print(
+            f"systemd-language-server: no such file or directory: {e}", file=sys.stderr
+        )
+        return 2
+    results = check_files(paths, args.jobs)
+    writers[args.format](results, output)
+    return 1 if any(diagnostics for _, diagnostics in results) else 0
@@ -0,0 +1,85 @@
+"""Compile the bundled docbooks into the documentation bundle loaded by the language
+server at runtime, so that neither lxml nor the docbooks are needed to serve hovers.
+Rerun whenever the docbooks in assets/ are updated:
+
+    python -m systemd_language_server.compile_docs
+"""
+
+import logging
+import pickle
+import shutil
+import sys
+import zlib
+from argparse import ArgumentParser
+from pathlib import Path
+
+from .markdown import docbook_to_markdown, pandoc_to_markdown
+from .unit import (
+    DOCUMENTATION_BUNDLE_VERSION,
+    build_directive_index,
+    docbook_digest,
+    documentation_bundle_path,
+    get_docbooks,
+)
+
+logger = logging.getLogger("systemd_language_server")
+
+
+def render_markdown(docbook: bytes, use_pandoc: bool) -> str:
+    markdown = pandoc_to_markdown(docbook) if use_pandoc else None
+    return markdown if markdown is not None else docbook_to_markdown(docbook)
+
+
+def compile_bundle(markdown: bool, use_pandoc: bool) -> dict:
+    directives = dict()
+    for docbook in sorted(get_docbooks()):
+        logger.info("compiling %s", docbook)
+        index = build_directive_index(docbook)
+        if markdown:
+            #  varlistentries documenting several directives are shared between them, so
+            #  convert each only once
+            converted = dict()
+            for directive, documentation in index.items():
+                if id(documentation) not in converted:
+                    converted[id(documentation)] = documentation._replace(
+                        markdown=render_markdown(documentation.docbook, use_pandoc)
+                    )
+                index[directive] = converted[id(documentation)]
+        directives[docbook] = index
+    return {
+        "version": DOCUMENTATION_BUNDLE_VERSION,
+        "sources": {docbook: docbook_digest(docbook) for docbook in get_docbooks()},
+        "directives": directives,
+    }
+
+
+def get_parser():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--output", type=Path, default=documentation_bundle_path, help="bundle path"
+    )
+    parser.add_argument(
+        "--no-markdown", action="store_true", help="don't prerender markdown"
+    )
+    parser.add_argument(
+        "--native",
+        action="store_true",
+        help="prerender markdown with the native renderer instead of pandoc",
+    )
+    return parser
+
+
+def main():
+    args = get_parser().parse_args(sys.argv[1:])
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+
+    use_pandoc = not args.native
+    if use_pandoc and shutil.which("pandoc") is None:
+        logger.warning("pandoc not found, falling back to native markdown renderer")
+        use_pandoc = False
+    bundle = compile_bundle(not args.no_markdown, use_pandoc)
+    args.output.write_bytes(zlib.compress(pickle.dumps(bundle, protocol=4), 9))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import bisect
+import functools
+import re
+
+from lsprotocol.types import CompletionItem, CompletionItemKind
+
+from .constants import systemd_timespan_units
+from .unit import UnitFileSection, UnitType, get_directives
+from .values import (
+    ValueType,
+    enum_directive_sections,
+    get_value_candidates,
+    get_value_type,
+)
+
+#  Completion is served from an index per directive table or set of directive values,
+#  holding the candidates sorted case-insensitively for prefix search by bisection, their
+#  camel humps for fuzzy matching (e.g. "ExSt" matches ExecStart), and prebuilt completion
+#  items which are reused across requests.
+
+HUMP_PROG = re.compile(r"[A-Z]+(?![a-z])|[A-Z][a-z0-9]*|[a-z0-9]+")
+NUMBER_PROG = re.compile(r"^[0-9]+(\.[0-9]+)?$")
+#  characters negating or otherwise modifying a value in a list, e.g. SystemCallFilter=~
+VALUE_PREFIX_CHARS = "~-+!"
+
+value_item_kinds = {
+    ValueType.boolean: CompletionItemKind.Value,
+    ValueType.enumeration: CompletionItemKind.EnumMember,
+    ValueType.signal: CompletionItemKind.Constant,
+    ValueType.timespan: CompletionItemKind.Unit,
+    ValueType.capability: CompletionItemKind.Constant,
+    ValueType.syscall: CompletionItemKind.Module,
+    ValueType.unit_name: CompletionItemKind.File,
+}
+
+
+class MatchRank:
+    """Ranks of matches, best first. They prefix the sort text of completion items."""
+
+    prefix = 0
+    prefix_ignore_case = 1
+    camel_hump = 2
+
+
+def split_humps(name: str) -> tuple[str, ...]:
+    """Split a directive name into lowercased camel humps, e.g. CPUQuota -> cpu, quota"""
+    return tuple(hump.lower() for hump in HUMP_PROG.findall(name))
+
+
+def match_humps(query: str, humps: tuple[str, ...]) -> bool:
+    """Whether a lowercased query can be consumed by taking a non-empty prefix of each of
+    a subsequence of humps, in order."""
+    if not query:
+        return True
+    for i, hump in enumerate(humps):
+        common = 0
+        while common < min(len(query), len(hump)) and query[common] == hump[common]:
+            common += 1
+        for n in range(common, 0, -1):
+            if match_humps(query[n:], humps[i + 1 :]):
+                return True
+    return False
+
+
+class CompletionIndex:
+    """Labels sorted for prefix search, with their humps and prebuilt completion items"""
+
+    def __init__(
+        self, labels: tuple[str, ...], kind: CompletionItemKind, insert_suffix=""
+    ):
+        self.labels = labels
+        ordered = sorted(labels, key=lambda label: (label.lower(), label))
+        self.keys = [label.lower() for label in ordered]
+        self.ordered = tuple(ordered)
+        self.humps = {label: split_humps(label) for label in labels}
+        #  first letters of the humps, to reject most fuzzy match candidates quickly
+        self.initials = {
+            label: frozenset(hump[0] for hump in humps)
+            for label, humps in self.humps.items()
+            if humps
+        }
+        self.items = {
+            rank: {
+                label: CompletionItem(
+                    label=label,
+                    insert_text=label + insert_suffix,
+                    kind=kind,
+                    sort_text=f"{rank}{label}",
+                )
+                for label in labels
+            }
+            for rank in vars(MatchRank).values()
+            if isinstance(rank, int)
+        }
+        self.all_items = tuple(self.items[MatchRank.prefix][label] for label in labels)
+
+    def prefix_range(self, prefix: str) -> range:
+        """Positions in self.ordered of labels starting with prefix, ignoring case"""
+        key = prefix.lower()
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_right(self.keys, key + "\uffff", lo)
+        return range(lo, hi)
+
+    def complete(self, text: str) -> tuple[CompletionItem, ...] | list[CompletionItem]:
+        """Completion items matching text, best matches first"""
+        if not text:
+            return self.all_items
+        items = self.items
+        positions = self.prefix_range(text)
+        exact = []
+        ignore_case = []
+        for i in positions:
+            label = self.ordered[i]
+            if label.startswith(text):
+                exact.append(items[MatchRank.prefix][label])
+            else:
+                ignore_case.append(items[MatchRank.prefix_ignore_case][label])
+        query = text.lower()
+        initials = self.initials
+        fuzzy = [
+            items[MatchRank.camel_hump][label]
+            for i, label in enumerate(self.ordered)
+            if query[0] in initials.get(label, ())
+            and i not in positions
+            and match_humps(query, self.humps[label])
+        ]
+        return exact + ignore_case + fuzzy
+
+
+class DirectiveIndex(CompletionIndex):
+    def __init__(self, directives: tuple[str, ...]):
+        super().__init__(directives, CompletionItemKind.Property, "=")
+
+
+@functools.lru_cache(maxsize=None)
+def get_completion_index(
+    unit_type: UnitType, section: UnitFileSection | None
+) -> DirectiveIndex:
+    return DirectiveIndex(get_directives(unit_type, section))
+
+
+@functools.lru_cache(maxsize=None)
+def get_value_completion_index(directive: str) -> CompletionIndex | None:
+    value_type = get_value_type(directive)
+    if value_type is None:
+        return None
+    return CompletionIndex(
+        get_value_candidates(directive), value_item_kinds[value_type]
+    )
+
+
+def value_token_start(directive: str, value: str) -> int:
+    """Offset in value at which the value being completed starts. For directives taking
+    lists, that is the last one."""
+    value_type = get_value_type(directive)
+    start = len(value) - len(value.lstrip())
+    if value_type is not None and value_type.is_list():
+        start = max(start, value.rfind(" ") + 1, value.rfind("\t") + 1)
+        while start < len(value) and value[start] in VALUE_PREFIX_CHARS:
+            start += 1
+    return start
+
+
+def complete_value(
+    directive: str, token: str, section: UnitFileSection | None = None
+) -> tuple[CompletionItem, ...] | list[CompletionItem]:
+    """Completion items for a value of directive, in section"""
+    index = get_value_completion_index(directive)
+    if index is None:
+        return ()
+    #  e.g. Type= of [Mount] doesn't take the types of services
+    if enum_directive_sections.get(directive, section) != section:
+        return ()
+    if get_value_type(directive) == ValueType.timespan and NUMBER_PROG.match(token):
+        return [
+            CompletionItem(label=token + unit, kind=CompletionItemKind.Unit)
+            for unit in systemd_timespan_units
+        ]
+    return index.complete(token)
@@ -1,4 +1,4 @@
-systemd_unit_directives = [
+systemd_unit_directives = (
     "Description",
     "Documentation",
     "Wants",
@@ -107,18 +107,18 @@ systemd_unit_directives = [
     "AssertMemoryPressure",
     "AssertCPUPressure",
     "AssertIOPressure",
-]
+)
 
-systemd_install_directives = [
+systemd_install_directives = (
     "Alias",
     "WantedBy",
     "RequiredBy",
     "UpheldBy",
     "Also",
     "DefaultInstance",
-]
+)
 
-systemd_service_directives = [
+systemd_service_directives = (
     "Type",
     "ExitType",
     "RemainAfterExit",
@@ -160,9 +160,9 @@ systemd_service_directives = [
     "OOMPolicy",
     "OpenFile",
     "ReloadSignal",
-]
+)
 
-systemd_socket_directives = [
+systemd_socket_directives = (
     "ListenStream",
     "ListenDatagram",
     "ListenSequentialPacket",
@@ -225,9 +225,9 @@ systemd_socket_directives = [
     "TriggerLimitBurst",
     "PollLimitIntervalSec",
     "PollLimitBurst",
-]
+)
 
-systemd_mount_directives = [
+systemd_mount_directives = (
     "What",
     "Where",
     "Type",
@@ -238,17 +238,17 @@ systemd_mount_directives = [
     "ForceUnmount",
     "DirectoryMode",
     "TimeoutSec",
-]
+)
 
-systemd_automount_directives = [
+systemd_automount_directives = (
     "Where",
     "ExtraOptions",
     "DirectoryMode",
     "TimeoutIdleSec",
-]
+)
 
 
-systemd_timer_directives = [
+systemd_timer_directives = (
     "OnActiveSec",
     "OnBootSec",
     "OnStartupSec",
@@ -264,21 +264,21 @@ systemd_timer_directives = [
     "Persistent",
     "WakeSystem",
     "RemainAfterElapse",
-]
+)
 
-systemd_scope_directives = [
+systemd_scope_directives = (
     "RuntimeMaxSec",
     "RuntimeRandomizedExtraSec",
-]
+)
 
-systemd_swap_directives = [
+systemd_swap_directives = (
     "What",
     "Priority",
     "Options",
     "TimeoutSec",
-]
+)
 
-systemd_path_directives = [
+systemd_path_directives = (
     "PathExists",
     "PathExistsGlob",
     "PathChanged",
@@ -289,10 +289,10 @@ systemd_path_directives = [
     "DirectoryMode",
     "TriggerLimitIntervalSec",
     "TriggerLimitBurst",
-]
+)
 
 # from systemd.exec(5)
-systemd_exec_directives = [
+systemd_exec_directives = (
     "ExecSearchPath",
     "WorkingDirectory",
     "RootDirectory",
@@ -438,9 +438,9 @@ systemd_exec_directives = [
     "SetCredentialEncrypted",
     "UtmpIdentifier",
     "UtmpMode",
-]
+)
 
-systemd_kill_directives = [
+systemd_kill_directives = (
     "KillMode",
     "KillSignal",
     "RestartKillSignal",
@@ -448,4 +448,443 @@ systemd_kill_directives = [
     "SendSIGKILL",
     "FinalKillSignal",
     "WatchdogSignal",
-]
+)
+
+#  see systemd.resource-control(5), whose docbook isn't bundled
+systemd_resource_control_directives = (
+    "Slice",
+    "Delegate",
+    "DelegateSubgroup",
+    "DisableControllers",
+    "CPUAccounting",
+    "CPUWeight",
+    "StartupCPUWeight",
+    "CPUQuota",
+    "CPUQuotaPeriodSec",
+    "AllowedCPUs",
+    "StartupAllowedCPUs",
+    "AllowedMemoryNodes",
+    "StartupAllowedMemoryNodes",
+    "MemoryAccounting",
+    "MemoryMin",
+    "MemoryLow",
+    "StartupMemoryLow",
+    "DefaultStartupMemoryLow",
+    "DefaultMemoryMin",
+    "DefaultMemoryLow",
+    "MemoryHigh",
+    "StartupMemoryHigh",
+    "MemoryMax",
+    "StartupMemoryMax",
+    "MemorySwapMax",
+    "StartupMemorySwapMax",
+    "MemoryZSwapMax",
+    "StartupMemoryZSwapMax",
+    "MemoryZSwapWriteback",
+    "TasksAccounting",
+    "TasksMax",
+    "IOAccounting",
+    "IOWeight",
+    "StartupIOWeight",
+    "IODeviceWeight",
+    "IOReadBandwidthMax",
+    "IOWriteBandwidthMax",
+    "IOReadIOPSMax",
+    "IOWriteIOPSMax",
+    "IODeviceLatencyTargetSec",
+    "IPAccounting",
+    "IPAddressAllow",
+    "IPAddressDeny",
+    "SocketBindAllow",
+    "SocketBindDeny",
+    "RestrictNetworkInterfaces",
+    "NFTSet",
+    "IPIngressFilterPath",
+    "IPEgressFilterPath",
+    "BPFProgram",
+    "DeviceAllow",
+    "DevicePolicy",
+    "ManagedOOMSwap",
+    "ManagedOOMMemoryPressure",
+    "ManagedOOMMemoryPressureLimit",
+    "ManagedOOMMemoryPressureDurationSec",
+    "ManagedOOMPreference",
+    "MemoryPressureWatch",
+    "MemoryPressureThresholdSec",
+    "CoredumpReceive",
+    "CPUShares",
+    "StartupCPUShares",
+    "MemoryLimit",
+    "BlockIOAccounting",
+    "BlockIOWeight",
+    "StartupBlockIOWeight",
+    "BlockIODeviceWeight",
+    "BlockIOReadBandwidth",
+    "BlockIOWriteBandwidth",
+)
+
+#  Values of directives. Booleans are recognized from the docbooks, system call groups are
+#  extracted from them (see values.py).
+
+systemd_boolean_values = ("yes", "no", "true", "false", "on", "off")
+
+systemd_timespan_units = ("us", "ms", "s", "min", "h", "d", "w", "M", "y")
+
+#  directives taking a single time span; not all directives suffixed "Sec" do, e.g.
+#  IODeviceLatencyTargetSec= takes a device and a time span
+systemd_timespan_directives = (
+    "AccuracySec",
+    "CPUQuotaPeriodSec",
+    "DeferAcceptSec",
+    "JobRunningTimeoutSec",
+    "JobTimeoutSec",
+    "KeepAliveIntervalSec",
+    "KeepAliveTimeSec",
+    "LogRateLimitIntervalSec",
+    "ManagedOOMMemoryPressureDurationSec",
+    "MemoryPressureThresholdSec",
+    "OnActiveSec",
+    "OnBootSec",
+    "OnStartupSec",
+    "OnUnitActiveSec",
+    "OnUnitInactiveSec",
+    "PollLimitIntervalSec",
+    "RandomizedDelaySec",
+    "RestartMaxDelaySec",
+    "RestartSec",
+    "RuntimeMaxSec",
+    "RuntimeRandomizedExtraSec",
+    "StartLimitIntervalSec",
+    "TimeoutAbortSec",
+    "TimeoutCleanSec",
+    "TimeoutIdleSec",
+    "TimeoutSec",
+    "TimeoutStartSec",
+    "TimeoutStopSec",
+    "TimerSlackNSec",
+    "TriggerLimitIntervalSec",
+    "WatchdogSec",
+)
+
+#  directives taking one of an enumeration of values
+systemd_enum_directive_values = {
+    "Type": (
+        "simple",
+        "exec",
+        "forking",
+        "oneshot",
+        "dbus",
+        "notify",
+        "notify-reload",
+        "idle",
+    ),
+    "ExitType": ("main", "cgroup"),
+    "Restart": (
+        "no",
+        "always",
+        "on-success",
+        "on-failure",
+        "on-abnormal",
+        "on-abort",
+        "on-watchdog",
+    ),
+    "RestartMode": ("normal", "direct"),
+    "NotifyAccess": ("none", "main", "exec", "all"),
+    "KillMode": ("control-group", "mixed", "process", "none"),
+    "CollectMode": ("inactive", "inactive-or-failed"),
+    "OnSuccessJobMode": (
+        "fail",
+        "replace",
+        "replace-irreversibly",
+        "isolate",
+        "flush",
+        "ignore-dependencies",
+        "ignore-requirements",
+    ),
+    "OnFailureJobMode": (
+        "fail",
+        "replace",
+        "replace-irreversibly",
+        "isolate",
+        "flush",
+        "ignore-dependencies",
+        "ignore-requirements",
+    ),
+    "FailureAction": (
+        "none",
+        "reboot",
+        "reboot-force",
+        "reboot-immediate",
+        "poweroff",
+        "poweroff-force",
+        "poweroff-immediate",
+        "exit",
+        "exit-force",
+        "soft-reboot",
+        "soft-reboot-force",
+        "kexec",
+        "kexec-force",
+        "halt",
+        "halt-force",
+        "halt-immediate",
+    ),
+    "SuccessAction": (
+        "none",
+        "reboot",
+        "reboot-force",
+        "reboot-immediate",
+        "poweroff",
+        "poweroff-force",
+        "poweroff-immediate",
+        "exit",
+        "exit-force",
+        "soft-reboot",
+        "soft-reboot-force",
+        "kexec",
+        "kexec-force",
+        "halt",
+        "halt-force",
+        "halt-immediate",
+    ),
+    "ProtectSystem": ("yes", "no", "full", "strict"),
+    "ProtectHome": ("yes", "no", "read-only", "tmpfs"),
+    "ProtectProc": ("noaccess", "invisible", "ptraceable", "default"),
+    "ProcSubset": ("all", "pid"),
+    "RuntimeDirectoryPreserve": ("yes", "no", "restart"),
+    "DevicePolicy": ("auto", "closed", "strict"),
+    "StandardInput": ("null", "tty", "tty-force", "tty-fail", "data", "socket"),
+    "StandardOutput": (
+        "inherit",
+        "null",
+        "tty",
+        "journal",
+        "kmsg",
+        "journal+console",
+        "kmsg+console",
+        "socket",
+    ),
+    "StandardError": (
+        "inherit",
+        "null",
+        "tty",
+        "journal",
+        "kmsg",
+        "journal+console",
+        "kmsg+console",
+        "socket",
+    ),
+    "CPUSchedulingPolicy": ("other", "batch", "idle", "fifo", "rr"),
+    "IOSchedulingClass": ("realtime", "best-effort", "idle"),
+    "SyslogLevel": (
+        "emerg",
+        "alert",
+        "crit",
+        "err",
+        "warning",
+        "notice",
+        "info",
+        "debug",
+    ),
+    "LogLevelMax": (
+        "emerg",
+        "alert",
+        "crit",
+        "err",
+        "warning",
+        "notice",
+        "info",
+        "debug",
+    ),
+    "KeyringMode": ("inherit", "private", "shared"),
+    "PrivateUsers": ("yes", "no", "self", "identity"),
+    "Personality": (
+        "x86",
+        "x86-64",
+        "ppc",
+        "ppc-le",
+        "ppc64",
+        "ppc64-le",
+        "s390",
+        "s390x",
+        "arm",
+        "arm64",
+    ),
+    "BindIPv6Only": ("default", "both", "ipv6-only"),
+    "Timestamping": ("off", "us", "usec", "μs", "ns", "nsec"),
+    "SocketProtocol": ("udplite", "sctp", "mptcp"),
+    "FileDescriptorStorePreserve": ("no", "yes", "restart"),
+}
+
+systemd_signal_directives = (
+    "KillSignal",
+    "RestartKillSignal",
+    "FinalKillSignal",
+    "WatchdogSignal",
+    "ReloadSignal",
+)
+
+systemd_signals = (
+    "SIGHUP",
+    "SIGINT",
+    "SIGQUIT",
+    "SIGILL",
+    "SIGTRAP",
+    "SIGABRT",
+    "SIGBUS",
+    "SIGFPE",
+    "SIGKILL",
+    "SIGUSR1",
+    "SIGSEGV",
+    "SIGUSR2",
+    "SIGPIPE",
+    "SIGALRM",
+    "SIGTERM",
+    "SIGCHLD",
+    "SIGCONT",
+    "SIGSTOP",
+    "SIGTSTP",
+    "SIGTTIN",
+    "SIGTTOU",
+    "SIGURG",
+    "SIGXCPU",
+    "SIGXFSZ",
+    "SIGVTALRM",
+    "SIGPROF",
+    "SIGWINCH",
+    "SIGIO",
+    "SIGPWR",
+    "SIGSYS",
+    "SIGRTMIN",
+    "SIGRTMAX",
+)
+
+systemd_capability_directives = ("CapabilityBoundingSet", "AmbientCapabilities")
+
+# from capabilities(7)
+systemd_capabilities = (
+    "CAP_AUDIT_CONTROL",
+    "CAP_AUDIT_READ",
+    "CAP_AUDIT_WRITE",
+    "CAP_BLOCK_SUSPEND",
+    "CAP_BPF",
+    "CAP_CHECKPOINT_RESTORE",
+    "CAP_CHOWN",
+    "CAP_DAC_OVERRIDE",
+    "CAP_DAC_READ_SEARCH",
+    "CAP_FOWNER",
+    "CAP_FSETID",
+    "CAP_IPC_LOCK",
+    "CAP_IPC_OWNER",
+    "CAP_KILL",
+    "CAP_LEASE",
+    "CAP_LINUX_IMMUTABLE",
+    "CAP_MAC_ADMIN",
+    "CAP_MAC_OVERRIDE",
+    "CAP_MKNOD",
+    "CAP_NET_ADMIN",
+    "CAP_NET_BIND_SERVICE",
+    "CAP_NET_BROADCAST",
+    "CAP_NET_RAW",
+    "CAP_PERFMON",
+    "CAP_SETFCAP",
+    "CAP_SETGID",
+    "CAP_SETPCAP",
+    "CAP_SETUID",
+    "CAP_SYS_ADMIN",
+    "CAP_SYS_BOOT",
+    "CAP_SYS_CHROOT",
+    "CAP_SYS_MODULE",
+    "CAP_SYS_NICE",
+    "CAP_SYS_PACCT",
+    "CAP_SYS_PTRACE",
+    "CAP_SYS_RAWIO",
+    "CAP_SYS_RESOURCE",
+    "CAP_SYS_TIME",
+    "CAP_SYS_TTY_CONFIG",
+    "CAP_SYSLOG",
+    "CAP_WAKE_ALARM",
+)
+
+systemd_syscall_directives = ("SystemCallFilter", "SystemCallLog")
+
+#  directives taking a list of unit names
+systemd_unit_name_directives = (
+    "Wants",
+    "Requires",
+    "Requisite",
+    "BindsTo",
+    "PartOf",
+    "Upholds",
+    "Conflicts",
+    "Before",
+    "After",
+    "OnFailure",
+    "OnSuccess",
+    "PropagatesReloadTo",
+    "ReloadPropagatedFrom",
+    "PropagatesStopTo",
+    "StopPropagatedFrom",
+    "JoinsNamespaceOf",
+    "WantedBy",
+    "RequiredBy",
+    "UpheldBy",
+    "Also",
+    "Unit",
+    "Sockets",
+    "Service",
+    "Slice",
+)
+
+# from systemd.special(7)
+systemd_special_units = (
+    "basic.target",
+    "bluetooth.target",
+    "cryptsetup.target",
+    "ctrl-alt-del.target",
+    "default.target",
+    "emergency.target",
+    "exit.target",
+    "final.target",
+    "getty.target",
+    "graphical.target",
+    "halt.target",
+    "hibernate.target",
+    "hybrid-sleep.target",
+    "initrd-fs.target",
+    "initrd-root-fs.target",
+    "kexec.target",
+    "local-fs-pre.target",
+    "local-fs.target",
+    "multi-user.target",
+    "network-online.target",
+    "network-pre.target",
+    "network.target",
+    "nss-lookup.target",
+    "nss-user-lookup.target",
+    "paths.target",
+    "poweroff.target",
+    "reboot.target",
+    "remote-fs-pre.target",
+    "remote-fs.target",
+    "rescue.target",
+    "shutdown.target",
+    "sleep.target",
+    "slices.target",
+    "sockets.target",
+    "suspend.target",
+    "swap.target",
+    "sysinit.target",
+    "system-update.target",
+    "time-set.target",
+    "time-sync.target",
+    "timers.target",
+    "umount.target",
+    "dbus.service",
+    "dbus.socket",
+    "syslog.socket",
+    "-.mount",
+    "-.slice",
+    "system.slice",
+    "user.slice",
+    "machine.slice",
+)
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import signal
+import sys
+from concurrent.futures import Executor
+
+from lsprotocol.types import EXIT
+from pygls.protocol import LanguageServerProtocol, lsp_method
+
+from .server import (
+    SERVER_NAME,
+    SERVER_VERSION,
+    SystemdLanguageServer,
+    start_process_pool,
+)
+
+#  A daemon serves many clients over TCP or WebSocket from a single process, so that
+#  editors share the documentation, completion and markdown caches, which are module
+#  globals, instead of loading them in a process each. Each connection gets a session: a
+#  server of its own, holding the documents, workspace index and dependency graph of its
+#  client, running on the event loop of the daemon. Sessions share the process pool.
+
+logger = logging.getLogger("systemd_language_server")
+
+
+class ClientProtocol(LanguageServerProtocol):
+    """Protocol of a session of a daemon. The exit notification and the loss of the
+    connection end the session, where they would end the process of a server on stdio.
+    """
+
+    daemon: "Daemon | None" = None
+
+    @lsp_method(EXIT)
+    def lsp_exit(self, *args) -> None:
+        if self.transport is not None:
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        if self.daemon is not None:
+            self.daemon.disconnect(self._server)
+
+
+class WebSocketTransport:
+    """Transport writing messages to a WebSocket, one per frame"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+
+    def write(self, data: str):
+        asyncio.ensure_future(self.websocket.send(data))
+
+    def close(self):
+        asyncio.ensure_future(self.websocket.close())
+
+
+class Daemon:
+    #  seconds between logs of the statistics of each session, if any
+    stats_interval: float | None = None
+    #  whether sessions save their index, and restore it at startup
+    persist_index: bool = True
+    _process_pool: Executor | None = None
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None):
+        self.loop = loop or asyncio.new_event_loop()
+        #  servers of the clients connected
+        self.sessions: set[SystemdLanguageServer] = set()
+
+    @property
+    def process_pool(self) -> Executor:
+        """Worker processes shared by the sessions. They are started on first use."""
+        if self._process_pool is None:
+            self._process_pool = start_process_pool()
+        return self._process_pool
+
+    def connect(self) -> ClientProtocol:
+        """Start the session of a new client"""
+        server = SystemdLanguageServer(
+            SERVER_NAME, SERVER_VERSION, loop=self.loop, protocol_cls=ClientProtocol
+        )
+        server.lsp.daemon = self
+        server.stats_interval = self.stats_interval
+        server.persist_index = self.persist_index
+        server.process_pool = self.process_pool
+        self.sessions.add(server)
+        logger.info("client connected, %d sessions", len(self.sessions))
+        return server.lsp
+
+    def disconnect(self, server: SystemdLanguageServer):
+        if server not in self.sessions:
+            return
+        self.sessions.discard(server)
+        server.close()
+        logger.info("client disconnected, %d sessions", len(self.sessions))
+
+    def listen_tcp(self, host: str, port: int) -> asyncio.AbstractServer:
+        logger.info("listening on tcp://%s:%s", host, port)
+        return self.loop.run_until_complete(
+            self.loop.create_server(self.connect, host, port)
+        )
+
+    def listen_ws(self, host: str, port: int):
+        try:
+            from websockets.server import serve
+        except ImportError:
+            logger.error("Run `pip install pygls[ws]` to install `websockets`.")
+            sys.exit(1)
+        logger.info("listening on ws://%s:%s", host, port)
+        return self.loop.run_until_complete(serve(self.serve_websocket, host, port))
+
+    async def serve_websocket(self, websocket, *args):
+        """Serve a client connected over WebSocket, whose messages come without
+        headers, one per frame"""
+        protocol = self.connect()
+        protocol._send_only_body = True
+        protocol.connection_made(WebSocketTransport(websocket))
+        try:
+            async for message in websocket:
+                protocol._procedure_handler(
+                    json.loads(message, object_hook=protocol._deserialize_message)
+                )
+        finally:
+            protocol.connection_lost(None)
+
+    def serve_forever(self, listener):
+        """Serve clients until interrupted or terminated, then close their sessions"""
+        try:
+            self.loop.add_signal_handler(signal.SIGTERM, self.loop.stop)
+        except (NotImplementedError, RuntimeError):
+            #  not on Windows, nor outside of the main thread
+            pass
+        try:
+            self.loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            for server in list(self.sessions):
+                if server.lsp.transport is not None:
+                    server.lsp.transport.close()
+                self.disconnect(server)
+            self.loop.run_until_complete(listener.wait_closed())
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self.loop.close()
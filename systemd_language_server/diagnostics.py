@@ -0,0 +1,265 @@
+from pathlib import Path
+
+from lsprotocol.types import Diagnostic, DiagnosticSeverity, Position, Range
+
+from . import stats
+from .constants import systemd_special_units
+from .graph import DependencyGraph, dependency_directives, ordering_directives
+from .index import UnitIndex
+from .parser import Directive, Section, UnitFile
+from .unit import (
+    UnitFileSection,
+    UnitType,
+    directive_sets,
+    unit_type_to_unit_file_section,
+)
+from .values import check_value
+
+#  Diagnostics are computed section by section, and cached by the text of the section, so
+#  that after a change only the sections it touched are checked again. They are cached
+#  with lines relative to the start of their section, and moved into place on each run.
+
+SOURCE = "systemd-language-server"
+
+known_directives = frozenset().union(*directive_sets.values())
+
+
+def is_extension(name: str) -> bool:
+    """Whether a section or directive name is reserved for other programs than systemd"""
+    return name.startswith("X-")
+
+
+def check_directive(directive: Directive, unit_type: UnitType) -> list[Diagnostic]:
+    if is_extension(directive.name):
+        return []
+    if directive.name not in known_directives:
+        return [
+            Diagnostic(
+                range=directive.name_range,
+                message=f"Unknown directive {directive.name}=",
+                code="unknown-directive",
+                severity=DiagnosticSeverity.Warning,
+                source=SOURCE,
+            )
+        ]
+    section = directive.section
+    if (
+        section is not None
+        and directive.name not in directive_sets[(unit_type, section)]
+    ):
+        return [
+            Diagnostic(
+                range=directive.name_range,
+                message=f"{directive.name}= is not valid in section [{section.value}]",
+                code="misplaced-directive",
+                severity=DiagnosticSeverity.Warning,
+                source=SOURCE,
+            )
+        ]
+    message = check_value(directive.name, directive.value, directive.section)
+    if message is not None:
+        return [
+            Diagnostic(
+                range=directive.value_range,
+                message=message,
+                code="invalid-value",
+                severity=DiagnosticSeverity.Warning,
+                source=SOURCE,
+            )
+        ]
+    return []
+
+
+def check_section(section: Section, unit_type: UnitType) -> list[Diagnostic]:
+    if section.name is None and section.line is not None:
+        #  a header being typed, e.g. "[Serv"
+        return []
+    if section.name is None:
+        return [
+            Diagnostic(
+                range=directive.name_range,
+                message="Directive outside of any section",
+                code="directive-outside-section",
+                severity=DiagnosticSeverity.Warning,
+                source=SOURCE,
+            )
+            for directive in section.directives
+        ]
+    if is_extension(section.name):
+        return []
+    start = section.range.start
+    header_range = Range(
+        start, Position(start.line, start.character + len(section.name) + 2)
+    )
+    if section.section is None:
+        #  directives of unknown sections are ignored by systemd, so aren't checked
+        return [
+            Diagnostic(
+                range=header_range,
+                message=f"Unknown section [{section.name}]",
+                code="unknown-section",
+                severity=DiagnosticSeverity.Warning,
+                source=SOURCE,
+            )
+        ]
+    diagnostics = []
+    if section.section not in valid_sections(unit_type):
+        diagnostics.append(
+            Diagnostic(
+                range=header_range,
+                message=f"Section [{section.name}] is not valid in .{unit_type.value} units",
+                code="misplaced-section",
+                severity=DiagnosticSeverity.Warning,
+                source=SOURCE,
+            )
+        )
+    for directive in section.directives:
+        diagnostics += check_directive(directive, unit_type)
+    return diagnostics
+
+
+def valid_sections(unit_type: UnitType) -> list[UnitFileSection]:
+    sections = [UnitFileSection.unit, UnitFileSection.install]
+    section = unit_type_to_unit_file_section(unit_type)
+    if section is not None:
+        sections.append(section)
+    return sections
+
+
+def move(diagnostic: Diagnostic, lines: int) -> Diagnostic:
+    """Copy of diagnostic moved down by a number of lines"""
+    start, end = diagnostic.range.start, diagnostic.range.end
+    return Diagnostic(
+        range=Range(
+            Position(start.line + lines, start.character),
+            Position(end.line + lines, end.character),
+        ),
+        message=diagnostic.message,
+        severity=diagnostic.severity,
+        code=diagnostic.code,
+        source=diagnostic.source,
+    )
+
+
+class DiagnosticsCache:
+    """Diagnostics of a document, cached per section"""
+
+    def __init__(self):
+        #  diagnostics relative to the start of their section, keyed by its text
+        self.sections: dict[tuple[str, ...], list[Diagnostic]] = dict()
+        #  number of sections checked on the last run, as opposed to found in the cache
+        self.checked = 0
+
+    def diagnose(self, unit_file: UnitFile) -> list[Diagnostic]:
+        try:
+            unit_type = unit_file.unit_type
+        except ValueError:
+            return []
+        sections: dict[tuple[str, ...], list[Diagnostic]] = dict()
+        diagnostics: list[Diagnostic] = []
+        self.checked = 0
+        for section in unit_file.sections:
+            start, end = section.range.start.line, section.range.end.line
+            key = tuple(unit_file.line_text(line) for line in range(start, end + 1))
+            relative = sections.get(key)
+            if relative is None:
+                relative = self.sections.get(key)
+            if relative is None:
+                self.checked += 1
+                relative = [
+                    move(diagnostic, -start)
+                    for diagnostic in check_section(section, unit_type)
+                ]
+            sections[key] = relative
+            diagnostics += [move(diagnostic, start) for diagnostic in relative]
+        #  only keep the sections still in the document
+        self.sections = sections
+        stats.count("diagnostics_section.miss", self.checked)
+        stats.count("diagnostics_section.hit", len(unit_file.sections) - self.checked)
+        return diagnostics
+
+
+def dependency_diagnostics(
+    unit_file: UnitFile, name: str, graph: DependencyGraph, index: UnitIndex
+) -> list[Diagnostic]:
+    """Diagnostics of the dependencies of a unit: requirements of missing units, and
+    ordering directives taking part in an ordering cycle"""
+    cycle = graph.ordering_cycle(name)
+    #  pairs of units in the cycle, the first ordered after the second
+    cycle_edges = set(zip(cycle, cycle[1:])) if cycle is not None else set()
+    diagnostics = []
+    for section in unit_file.sections:
+        if section.section != UnitFileSection.unit:
+            continue
+        for directive in section.directives:
+            if directive.name not in dependency_directives:
+                continue
+            for word, word_range in unit_file.value_words(directive):
+                edge = (word, name) if directive.name == "Before" else (name, word)
+                if directive.name in ordering_directives and edge in cycle_edges:
+                    assert cycle is not None
+                    diagnostics.append(
+                        Diagnostic(
+                            range=word_range,
+                            message="Ordering cycle, each unit ordered after the next: "
+                            + " → ".join(cycle),
+                            severity=DiagnosticSeverity.Warning,
+                            code="ordering-cycle",
+                            source=SOURCE,
+                        )
+                    )
+                elif (
+                    directive.name not in ordering_directives
+                    and "%" not in word
+                    and word not in systemd_special_units
+                    and not index.lookup(word)
+                ):
+                    #  wanted units may well be missing, they're just not started
+                    severity = (
+                        DiagnosticSeverity.Information
+                        if directive.name == "Wants"
+                        else DiagnosticSeverity.Warning
+                    )
+                    diagnostics.append(
+                        Diagnostic(
+                            range=word_range,
+                            message=f"Unit {word} not found",
+                            severity=severity,
+                            code="missing-dependency",
+                            source=SOURCE,
+                        )
+                    )
+    return diagnostics
+
+
+def diagnose_file(path: Path) -> list[Diagnostic]:
+    """Diagnostics of a unit file on disk"""
+    try:
+        text = path.read_text()
+    except (OSError, UnicodeDecodeError):
+        return []
+    unit_file = UnitFile(path.absolute().as_uri(), text.splitlines(True))
+    return DiagnosticsCache().diagnose(unit_file)
+
+
+def diagnose_files(paths: list[Path]) -> list[list[Diagnostic]]:
+    """Diagnostics of unit files on disk, in batches to amortize sending them to worker
+    processes"""
+    return [diagnose_file(path) for path in paths]
+
+
+#  Result ids of pull diagnostics identify the content they were computed from: the version
+#  of open documents, and the modification time of other files.
+
+
+def document_result_id(version: int | None, dependencies: str = "") -> str:
+    """Result id of an open document, also identifying the state of the dependency graph
+    its diagnostics depend on"""
+    return f"version:{version}:{dependencies}"
+
+
+def file_result_id(path: Path, dependencies: str = "") -> str:
+    """Result id of a file which isn't open, identified by its modification time and
+    size"""
+    stat = path.stat()
+    return f"mtime:{stat.st_mtime_ns}:{stat.st_size}:{dependencies}"
@@ -0,0 +1,152 @@
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+from . import stats
+from .index import UnitIndex
+from .parser import UnitFile
+from .values import get_value_type
+
+#  The effective configuration of a unit is that of its unit file, extended by its
+#  drop-ins in the order they are applied. Assignments of a directive taking a single
+#  value (a boolean, an enumeration, a signal or a time span) replace those made before
+#  them; assignments of other directives accumulate, and an empty assignment resets
+#  those made before it. Unit files are parsed once per modification time, and effective
+#  configurations are cached until one of the files they are made of changes, is added
+#  or is removed, so that serving them only costs a stat of each file. Files on disk are
+#  identified by their modification time and size. As the configurations of a whole
+#  workspace are kept, assignments are stored compactly: the names in keys are interned,
+#  so that all configurations share them, and the assignments of a key are a tuple.
+
+
+def file_stamp(path: Path) -> tuple[int, int]:
+    """Modification time and size of a file, which change with its content"""
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def is_scalar(directive: str) -> bool:
+    """Whether the directive is known to take a single value"""
+    value_type = get_value_type(directive)
+    return value_type is not None and not value_type.is_list()
+
+
+@dataclass(frozen=True, slots=True)
+class Assignment:
+    value: str
+    uri: str
+    line: int
+
+
+class EffectiveConfig:
+    """Merged assignments of the directives of a unit and its drop-ins"""
+
+    def __init__(self, name: str, unit_files: Iterable[UnitFile]):
+        self.name = name
+        #  assignments from the last reset on, keyed by section and directive name
+        self.assignments: dict[tuple[str, str], tuple[Assignment, ...]]
+        self.uris: list[str] = []
+        assignments: dict[tuple[str, str], list[Assignment]] = dict()
+        for unit_file in unit_files:
+            self.uris.append(unit_file.uri)
+            for section, directive, value, line in unit_file.assignments():
+                if section is None:
+                    continue
+                key = (sys.intern(section), sys.intern(directive))
+                assignment = Assignment(value, unit_file.uri, line)
+                if not value or is_scalar(directive):
+                    assignments[key] = [assignment]
+                else:
+                    assignments.setdefault(key, []).append(assignment)
+        self.assignments = {key: tuple(value) for key, value in assignments.items()}
+
+    def get(self, section: str, directive: str) -> list[Assignment]:
+        """Assignments of the directive in effect, preceded by the reset if any. Only
+        the last assignment of directives taking a single value is in effect."""
+        return list(self.assignments.get((section, directive), ()))
+
+    def values(self, section: str, directive: str) -> list[str]:
+        return [a.value for a in self.get(section, directive) if a.value]
+
+
+class EffectiveConfigCache:
+    def __init__(self, index: UnitIndex):
+        self.index = index
+        #  parse of files on disk, with their stamp
+        self._unit_files: dict[Path, tuple[tuple[int, int], UnitFile]] = dict()
+        #  effective configurations, with the stamps of the files they are made of
+        self._configs: dict[str, tuple[tuple, EffectiveConfig]] = dict()
+        self._uris: dict[Path, str] = dict()
+
+    def sources(self, name: str) -> list[Path]:
+        """Files making up the effective configuration of a unit, in order"""
+        return self.index.lookup(name)[:1] + self.index.lookup_dropins(name)
+
+    def get(
+        self, name: str, open_files: dict[str, UnitFile] | None = None
+    ) -> EffectiveConfig | None:
+        """Effective configuration of a unit. Open files, keyed by URI, take precedence
+        over their content on disk."""
+        return self.build(name, self.stamps(name, open_files), open_files)
+
+    def stamps(self, name: str, open_files: dict[str, UnitFile] | None = None) -> tuple:
+        """Stamps of the files making up the effective configuration of a unit, which
+        change with their content. Empty if the unit isn't found."""
+        return tuple(self._stamp(path, open_files) for path in self.sources(name))
+
+    def build(
+        self, name: str, stamps: tuple, open_files: dict[str, UnitFile] | None = None
+    ) -> EffectiveConfig | None:
+        """Effective configuration of a unit, given the current stamps of its files"""
+        if not stamps:
+            return None
+        open_files = open_files or dict()
+        paths = [stamp[0] for stamp in stamps]
+        cached = self._configs.get(name)
+        if cached is not None and cached[0] == stamps:
+            stats.count("effective_config.hit")
+            return cached[1]
+        stats.count("effective_config.miss")
+        unit_files = [self._unit_file(path, open_files) for path in paths]
+        config = EffectiveConfig(name, [f for f in unit_files if f is not None])
+        self._configs[name] = (stamps, config)
+        return config
+
+    def _uri(self, path: Path) -> str:
+        uri = self._uris.get(path)
+        if uri is None:
+            uri = self._uris[path] = path.as_uri()
+        return uri
+
+    def _stamp(self, path: Path, open_files: dict[str, UnitFile] | None):
+        unit_file = open_files.get(self._uri(path)) if open_files else None
+        if unit_file is not None:
+            return (path, "version", unit_file.version)
+        try:
+            return (path, "stat", file_stamp(path))
+        except OSError:
+            return (path, "missing", None)
+
+    def _unit_file(
+        self, path: Path, open_files: dict[str, UnitFile]
+    ) -> UnitFile | None:
+        unit_file = open_files.get(self._uri(path)) if open_files else None
+        if unit_file is not None:
+            return unit_file
+        try:
+            stamp = file_stamp(path)
+            cached = self._unit_files.get(path)
+            if cached is not None and cached[0] == stamp:
+                stats.count("unit_file.hit")
+                return cached[1]
+            stats.count("unit_file.miss")
+            unit_file = UnitFile(self._uri(path), path.read_text().splitlines(True))
+        except (OSError, UnicodeDecodeError):
+            return None
+        self._unit_files[path] = (stamp, unit_file)
+        return unit_file
+
+    def invalidate(self, path: Path):
+        """Drop the parse of a file, e.g. when notified of a change to it"""
+        self._unit_files.pop(path, None)
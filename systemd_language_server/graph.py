@@ -0,0 +1,244 @@
+import sys
+from collections import deque
+from typing import Iterable
+
+from .effective import EffectiveConfig, EffectiveConfigCache
+from .parser import UnitFile
+
+#  Graph of the dependencies between the units of the index, from the [Unit] directives of
+#  their effective configuration. It is refreshed by comparing the stamps of the files of
+#  each unit with those its edges were extracted from, so only the units whose files
+#  changed are extracted again. Edges and their stamps can be saved, and restored by
+#  another server, which then only stats the files of each unit.
+#  Ordering cycles are found as the strongly connected components of the ordering graph,
+#  in which a unit points to those it's ordered after.
+
+#  directives of [Unit] making edges of the graph
+requirement_directives = ("Wants", "Requires", "BindsTo", "PartOf")
+ordering_directives = ("After", "Before")
+dependency_directives = requirement_directives + ordering_directives
+
+#  edges of each unit, with the stamps of the files they were extracted from
+GraphSnapshot = dict[str, tuple[tuple, dict[str, tuple[str, ...]]]]
+#  new edges of changed units, or None for units to remove, with the stamps of their files
+GraphChanges = dict[str, tuple[tuple, dict[str, tuple[str, ...]] | None]]
+
+
+def extract_edges(config: EffectiveConfig) -> dict[str, tuple[str, ...]]:
+    """Units named by each dependency directive of a unit. Names are interned, as each
+    is named by many units."""
+    edges = dict()
+    for directive in dependency_directives:
+        names = tuple(
+            dict.fromkeys(
+                sys.intern(name)
+                for value in config.values("Unit", directive)
+                for name in value.split()
+            )
+        )
+        if names:
+            edges[directive] = names
+    return edges
+
+
+class DependencyGraph:
+    def __init__(self):
+        #  units named by each dependency directive, for each unit
+        self.edges: dict[str, dict[str, tuple[str, ...]]] = dict()
+        #  units naming each unit, with the directive naming it
+        self.reverse: dict[str, set[tuple[str, str]]] = dict()
+        #  incremented on each change of the edges
+        self.generation = 0
+        #  stamps of the files the edges of each unit were extracted from
+        self._stamps: dict[str, tuple] = dict()
+        self._cycles: tuple[int, dict[str, frozenset[str]]] = (-1, dict())
+
+    def set_unit(self, name: str, edges: dict[str, tuple[str, ...]]):
+        if self.edges.get(name) == edges:
+            return
+        self.remove_unit(name)
+        self.edges[name] = edges
+        for directive, targets in edges.items():
+            for target in targets:
+                self.reverse.setdefault(target, set()).add((name, directive))
+        self.generation += 1
+
+    def remove_unit(self, name: str):
+        edges = self.edges.pop(name, None)
+        self._stamps.pop(name, None)
+        if edges is None:
+            return
+        for directive, targets in edges.items():
+            for target in targets:
+                sources = self.reverse.get(target)
+                if sources is not None:
+                    sources.discard((name, directive))
+                    if not sources:
+                        del self.reverse[target]
+        self.generation += 1
+
+    def refresh(
+        self,
+        names: Iterable[str],
+        configs: EffectiveConfigCache,
+        open_files: dict[str, UnitFile] | None = None,
+    ):
+        """Update the graph to the current configuration of the units named"""
+        self.apply(self.changes(names, configs, open_files))
+
+    def changes(
+        self,
+        names: Iterable[str],
+        configs: EffectiveConfigCache,
+        open_files: dict[str, UnitFile] | None = None,
+    ) -> GraphChanges:
+        """Edges of the units named whose files changed since their edges were
+        extracted, with the stamps of their files, and None for units to remove. The
+        graph is only read, so that changes can be found in another thread while the
+        graph is served."""
+        names = set(names)
+        changes: GraphChanges = {name: ((), None) for name in self.edges.keys() - names}
+        for name in names:
+            stamps = configs.stamps(name, open_files)
+            if self._stamps.get(name) == stamps:
+                continue
+            config = configs.build(name, stamps, open_files)
+            changes[name] = (stamps, None if config is None else extract_edges(config))
+        return changes
+
+    def apply(self, changes: GraphChanges):
+        for name, (stamps, edges) in changes.items():
+            if edges is None:
+                self.remove_unit(name)
+            else:
+                self.set_unit(name, edges)
+                self._stamps[name] = stamps
+
+    def snapshot(self) -> GraphSnapshot:
+        """Edges of each unit, with the stamps of the files they were extracted from"""
+        return {
+            name: (self._stamps[name], edges)
+            for name, edges in self.edges.items()
+            if name in self._stamps
+        }
+
+    def restore(self, snapshot: GraphSnapshot):
+        """Set the edges of a snapshot, to be checked against the stamps of their files
+        on the next refresh"""
+        for name, (stamps, edges) in snapshot.items():
+            self.set_unit(name, edges)
+            self._stamps[name] = stamps
+
+    def ordered_after(self, name: str) -> set[str]:
+        """Units a unit is ordered after, by its After= or by their Before="""
+        after = set(self.edges.get(name, {}).get("After", ()))
+        after.update(s for s, d in self.reverse.get(name, ()) if d == "Before")
+        return after
+
+    def ordering_cycles(self) -> dict[str, frozenset[str]]:
+        """Units in ordering cycles, mapped to the strongly connected component of the
+        ordering graph they are in"""
+        generation, cycles = self._cycles
+        if generation == self.generation:
+            return cycles
+        cycles = dict()
+        for component in self._strongly_connected_components():
+            member = next(iter(component))
+            if len(component) > 1 or member in self.ordered_after(member):
+                for name in component:
+                    cycles[name] = component
+        self._cycles = (self.generation, cycles)
+        return cycles
+
+    def _strongly_connected_components(self) -> Iterable[frozenset[str]]:
+        """Tarjan's algorithm, iteratively, over the ordering graph"""
+        nodes = set(self.edges) | set(self.reverse)
+        index: dict[str, int] = dict()
+        lowlink: dict[str, int] = dict()
+        stack: list[str] = []
+        on_stack: set[str] = set()
+        for root in nodes:
+            if root in index:
+                continue
+            work = [(root, iter(self.ordered_after(root)))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, successors = work[-1]
+                for successor in successors:
+                    if successor not in index:
+                        index[successor] = lowlink[successor] = len(index)
+                        stack.append(successor)
+                        on_stack.add(successor)
+                        work.append((successor, iter(self.ordered_after(successor))))
+                        break
+                    if successor in on_stack:
+                        lowlink[node] = min(lowlink[node], index[successor])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = set()
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.add(member)
+                            if member == node:
+                                break
+                        yield frozenset(component)
+
+    def ordering_cycle(self, name: str) -> list[str] | None:
+        """A shortest ordering cycle through a unit, starting and ending with it"""
+        component = self.ordering_cycles().get(name)
+        if component is None:
+            return None
+        previous: dict[str, str] = dict()
+        queue = deque([name])
+        while queue:
+            node = queue.popleft()
+            for successor in sorted(self.ordered_after(node) & component):
+                if successor == name:
+                    path = [node]
+                    while path[-1] != name:
+                        path.append(previous[path[-1]])
+                    return path[::-1] + [name]
+                if successor not in previous:
+                    previous[successor] = node
+                    queue.append(successor)
+        return None
+
+    def subgraph(self, name: str, depth: int = 1) -> dict:
+        """Units within depth edges of a unit in either direction, and the edges between
+        them, for visualization"""
+        distances = {name: 0}
+        queue = deque([name])
+        edges = set()
+        while queue:
+            node = queue.popleft()
+            if distances[node] >= depth:
+                continue
+            neighbours = [
+                (node, directive, target)
+                for directive, targets in self.edges.get(node, {}).items()
+                for target in targets
+            ]
+            neighbours += [
+                (source, directive, node)
+                for source, directive in self.reverse.get(node, ())
+            ]
+            for source, directive, target in neighbours:
+                edges.add((source, directive, target))
+                for unit in (source, target):
+                    if unit not in distances:
+                        distances[unit] = distances[node] + 1
+                        queue.append(unit)
+        return {
+            "nodes": sorted(distances),
+            "edges": [
+                {"from": source, "kind": directive, "to": target}
+                for source, directive, target in sorted(edges)
+            ],
+        }
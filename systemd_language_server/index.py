@@ -0,0 +1,217 @@
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterable
+
+from lsprotocol.types import CompletionItemKind
+
+from .completion import CompletionIndex
+from .constants import systemd_special_units
+from .unit import UnitType
+
+#  Index of the unit files found in the workspace and in the systemd search paths, so
+#  that unit names in e.g. Wants= can be completed and resolved to files, and of the
+#  drop-ins extending them (foo.service.d/*.conf). The index is built in a background
+#  thread, and kept up to date from the client's file watching notifications.
+
+logger = logging.getLogger("systemd_language_server")
+
+UNIT_SUFFIXES = frozenset("." + unit_type.value for unit_type in UnitType)
+
+#  in order of precedence, see systemd.unit(5)
+system_search_paths = (
+    "/etc/systemd/system",
+    "/run/systemd/system",
+    "/usr/local/lib/systemd/system",
+    "/usr/lib/systemd/system",
+    "/lib/systemd/system",
+)
+user_search_paths = (
+    "~/.config/systemd/user",
+    "/etc/systemd/user",
+    "/run/systemd/user",
+    "/usr/local/lib/systemd/user",
+    "/usr/lib/systemd/user",
+)
+
+
+def default_search_paths() -> list[Path]:
+    return [Path(path).expanduser() for path in system_search_paths + user_search_paths]
+
+
+def is_unit_file(path: Path) -> bool:
+    return path.suffix in UNIT_SUFFIXES
+
+
+def is_dropin(path: Path) -> bool:
+    return path.suffix == ".conf" and dropin_unit_name(path.parent.name) is not None
+
+
+def dropin_unit_name(directory: str) -> str | None:
+    """Name of the unit, or unit name prefix, whose drop-ins are in a directory, e.g.
+    foo.service for foo.service.d, and service for service.d"""
+    if not directory.endswith(".d"):
+        return None
+    name = directory[: -len(".d")]
+    if Path(name).suffix in UNIT_SUFFIXES or "." + name in UNIT_SUFFIXES:
+        return name
+    return None
+
+
+def unit_name(path: Path) -> str | None:
+    """Name of the unit configured by a unit file or drop-in, None for drop-ins of all
+    units of a type"""
+    if is_dropin(path):
+        name = dropin_unit_name(path.parent.name)
+        return name if name is not None and Path(name).suffix else None
+    return path.name if is_unit_file(path) else None
+
+
+def dropin_directories(name: str) -> list[str]:
+    """Names of the drop-in directories applying to a unit, least specific first: those
+    of its type, of the prefixes of its name up to each "-", of its template, and its
+    own. See systemd.unit(5)."""
+    #  as Path(name).suffix, which is costly for every unit of the graph
+    stem, dot, extension = name.rpartition(".")
+    if not stem or not extension:
+        stem, dot, extension = name, "", ""
+    suffix = dot + extension
+    directories = [suffix[1:] + ".d"]
+    directories += [
+        stem[: i + 1] + suffix + ".d" for i, c in enumerate(stem) if c == "-"
+    ]
+    template = template_name(name)
+    if template is not None:
+        directories.append(template + ".d")
+    directories.append(name + ".d")
+    return directories
+
+
+def template_name(name: str) -> str | None:
+    """Name of the template of a template instance, e.g. getty@.service for
+    getty@tty1.service"""
+    prefix, at, rest = name.partition("@")
+    if not at or rest.startswith("."):
+        return None
+    suffix = rest[rest.rfind(".") :] if "." in rest else ""
+    return f"{prefix}@{suffix}"
+
+
+def find_unit_files(root: Path, dropins: bool = False) -> Iterable[Path]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        #  skip hidden directories like .git, and dependency symlink farms like
+        #  multi-user.target.wants, which only alias units defined elsewhere
+        dirnames[:] = [
+            d
+            for d in dirnames
+            if not d.startswith(".") and not d.endswith((".wants", ".requires"))
+        ]
+        for filename in filenames:
+            path = Path(dirpath) / filename
+            if is_unit_file(path) or dropins and is_dropin(path):
+                yield path
+
+
+class UnitIndex:
+    """Map unit names to the paths of the unit files defining them, in order of
+    precedence."""
+
+    def __init__(self):
+        self.units: dict[str, list[Path]] = dict()
+        #  drop-ins, keyed by the name of their directory
+        self.dropins: dict[str, list[Path]] = dict()
+        #  precedence of each root, lower first
+        self.roots: list[Path] = []
+        self.lock = threading.Lock()
+        #  set by the server once the roots are walked and the snapshot restored
+        self.ready = threading.Event()
+        #  incremented on each change of the index
+        self.generation = 0
+        self._completion_index: CompletionIndex | None = None
+
+    def walk(self):
+        """Add the unit files and drop-ins found under the roots"""
+        for root in self.roots:
+            for path in find_unit_files(root, dropins=True):
+                self.add(path)
+        logger.debug("indexed %d units", len(self.units))
+
+    def paths(self) -> dict[str, Path]:
+        """Indexed files, keyed by their path as a string"""
+        with self.lock:
+            return {
+                str(path): path
+                for files in (self.units, self.dropins)
+                for paths in files.values()
+                for path in paths
+            }
+
+    def _precedence(self, path: Path) -> int:
+        for i, root in enumerate(self.roots):
+            if path.is_relative_to(root):
+                return i
+        return len(self.roots)
+
+    def _files(self, path: Path) -> tuple[dict[str, list[Path]], str]:
+        """Mapping indexing the path, and its key"""
+        if is_dropin(path):
+            return self.dropins, path.parent.name
+        return self.units, path.name
+
+    def add(self, path: Path):
+        files, key = self._files(path)
+        with self.lock:
+            paths = files.setdefault(key, [])
+            if path not in paths:
+                paths.append(path)
+                if len(paths) > 1:
+                    paths.sort(key=self._precedence)
+                self.generation += 1
+                self._completion_index = None
+
+    def remove(self, path: Path):
+        files, key = self._files(path)
+        with self.lock:
+            paths = files.get(key, [])
+            if path in paths:
+                paths.remove(path)
+                if not paths:
+                    del files[key]
+                self.generation += 1
+                self._completion_index = None
+
+    def lookup(self, name: str) -> list[Path]:
+        """Unit files defining the unit, falling back to the template for template
+        instances"""
+        paths = self.units.get(name)
+        if not paths:
+            template = template_name(name)
+            paths = self.units.get(template) if template is not None else None
+        return list(paths or [])
+
+    def lookup_dropins(self, name: str) -> list[Path]:
+        """Drop-ins applying to the unit, in the order they are applied. Of drop-ins of
+        the same name, only the one of highest precedence applies."""
+        dropins: dict[str, tuple[tuple[int, int], Path]] = dict()
+        with self.lock:
+            for specificity, directory in enumerate(dropin_directories(name)):
+                for path in self.dropins.get(directory, []):
+                    rank = (self._precedence(path), -specificity)
+                    if path.name not in dropins or rank < dropins[path.name][0]:
+                        dropins[path.name] = (rank, path)
+        return [dropins[filename][1] for filename in sorted(dropins)]
+
+    def completion_index(self) -> CompletionIndex:
+        """Completion index of the unit names, except special units which are always
+        completed. Rebuilt only after the index changes."""
+        with self.lock:
+            if self._completion_index is not None:
+                return self._completion_index
+            generation = self.generation
+            names = tuple(sorted(set(self.units).difference(systemd_special_units)))
+        completion_index = CompletionIndex(names, CompletionItemKind.File)
+        with self.lock:
+            if generation == self.generation:
+                self._completion_index = completion_index
+        return completion_index
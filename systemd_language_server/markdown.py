@@ -0,0 +1,384 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from . import stats
+
+#  Docbook varlistentries are converted to markdown with pandoc when it is available.
+#  Since forking pandoc costs tens of milliseconds, conversions are cached in memory and on
+#  disk (keyed by pandoc version, since its output changes between releases). When pandoc
+#  is missing or fails, a native renderer for the subset of docbook used in the bundled
+#  docbooks takes over.
+
+MARKDOWN_CACHE_SIZE = 256
+#  marks the boundaries between varlistentries converted together by a single pandoc run
+BATCH_SEPARATOR = "SYSTEMD-LANGUAGE-SERVER-BATCH-SEPARATOR"
+
+#  inline tags rendered as code spans
+CODE_TAGS = {
+    "literal",
+    "option",
+    "constant",
+    "varname",
+    "filename",
+    "command",
+    "function",
+    "parameter",
+    "type",
+    "code",
+}
+#  tags which may occur inside a para, but must be rendered as blocks of their own
+BLOCK_TAGS = {
+    "para",
+    "simpara",
+    "programlisting",
+    "screen",
+    "itemizedlist",
+    "orderedlist",
+    "variablelist",
+    "table",
+    "informaltable",
+    "example",
+    "note",
+}
+XINCLUDE_TAG = "{http://www.w3.org/2001/XInclude}include"
+
+PANDOC_ARGV = ["pandoc", "--from=docbook", "--to", "markdown", "-"]
+
+WHITESPACE_PROG = re.compile(r"\s+")
+MARKDOWN_ESCAPE_PROG = re.compile(r"([\\`*])")
+
+
+def docbook_to_markdown(docbook: bytes) -> str:
+    """Render a docbook varlistentry as markdown without pandoc."""
+    #  imported here, since importing it costs more than the rest of startup
+    from xml.etree import ElementTree
+
+    root = ElementTree.fromstring(docbook)
+    return "\n\n".join(_render_blocks(root)) + "\n"
+
+
+def _render_blocks(element) -> list[str]:
+    tag = element.tag
+    if tag == XINCLUDE_TAG:
+        return []
+    if tag in ("varlistentry", "variablelist"):
+        blocks = []
+        entries = (
+            [element] if tag == "varlistentry" else element.findall("varlistentry")
+        )
+        for entry in entries:
+            terms = ", ".join(_render_inline(term) for term in entry.findall("term"))
+            blocks.append(terms)
+            for listitem in entry.findall("listitem"):
+                blocks += _render_children(listitem)
+        return blocks
+    if tag in ("itemizedlist", "orderedlist"):
+        items = []
+        for i, listitem in enumerate(element.findall("listitem"), 1):
+            bullet = "-" if tag == "itemizedlist" else f"{i}."
+            body = "\n\n".join(_render_children(listitem))
+            items.append(
+                bullet + " " + body.replace("\n", "\n" + " " * (len(bullet) + 1))
+            )
+        return ["\n".join(items)]
+    if tag in ("programlisting", "screen"):
+        code = "".join(element.itertext()).strip("\n")
+        return ["```\n" + code + "\n```"]
+    if tag in ("table", "informaltable"):
+        return _render_table(element)
+    if tag == "title":
+        return ["**" + _render_inline(element) + "**"]
+    return _render_children(element)
+
+
+def _render_children(element) -> list[str]:
+    """Render the content of an element which may mix inline content and blocks. Runs of
+    inline content become paragraphs."""
+    blocks = []
+    inline = [_escape(element.text or "")]
+
+    def flush():
+        paragraph = WHITESPACE_PROG.sub(" ", "".join(inline)).strip()
+        if paragraph:
+            blocks.append(paragraph)
+        inline.clear()
+
+    for child in element:
+        if child.tag in BLOCK_TAGS or child.tag == "title":
+            flush()
+            blocks += _render_blocks(child)
+        else:
+            inline.append(_render_inline(child, strip=False))
+        inline.append(_escape(child.tail or ""))
+    flush()
+    return blocks
+
+
+def _render_inline(element, strip=True) -> str:
+    tag = element.tag
+    if tag == XINCLUDE_TAG:
+        text = ""
+    elif tag in CODE_TAGS:
+        text = "`" + WHITESPACE_PROG.sub(" ", "".join(element.itertext())) + "`"
+    elif tag == "citerefentry":
+        title = element.findtext("refentrytitle", "")
+        volume = element.findtext("manvolnum")
+        text = f"{title}({volume})" if volume else title
+    elif tag == "ulink":
+        content = _render_contents(element)
+        url = element.get("url", "")
+        text = f"[{content}]({url})" if content.strip() else f"<{url}>"
+    else:
+        text = _render_contents(element)
+        if tag in ("emphasis", "replaceable"):
+            text = f"*{text}*"
+        elif tag == "optional":
+            text = f"[{text}]"
+    return WHITESPACE_PROG.sub(" ", text).strip() if strip else text
+
+
+def _render_contents(element) -> str:
+    parts = [_escape(element.text or "")]
+    for child in element:
+        parts.append(_render_inline(child, strip=False))
+        parts.append(_escape(child.tail or ""))
+    return "".join(parts)
+
+
+def _render_table(table) -> list[str]:
+    blocks = []
+    title = table.find("title")
+    if title is not None:
+        blocks.append("**" + _render_inline(title) + "**")
+    head = [_render_row(row) for row in table.iterfind("./tgroup/thead/row")]
+    body = [_render_row(row) for row in table.iterfind("./tgroup/tbody/row")]
+    if not head and body:
+        head = [["" for _ in body[0]]]
+    if head:
+        lines = ["| " + " | ".join(head[0]) + " |"]
+        lines.append("|" + "|".join("---" for _ in head[0]) + "|")
+        lines += ["| " + " | ".join(row) + " |" for row in head[1:] + body]
+        blocks.append("\n".join(lines))
+    return blocks
+
+
+def _render_row(row) -> list[str]:
+    return [_render_inline(entry).replace("|", "\\|") for entry in row.findall("entry")]
+
+
+def _escape(text: str) -> str:
+    return MARKDOWN_ESCAPE_PROG.sub(r"\\\1", text)
+
+
+def markdown_cache_dir() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "systemd-language-server" / "markdown"
+
+
+@functools.lru_cache(maxsize=1)
+def pandoc_version() -> str | None:
+    if shutil.which("pandoc") is None:
+        return None
+    try:
+        proc = subprocess.run(
+            ["pandoc", "--version"], stdout=subprocess.PIPE, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.decode().split("\n", 1)[0].split()[-1]
+
+
+def pandoc_to_markdown(raw_varlistentry: bytes) -> str | None:
+    """Use pandoc to convert docbook entry to markdown. Return None if pandoc fails."""
+    stats.count("pandoc_runs")
+    try:
+        proc = subprocess.run(
+            PANDOC_ARGV, input=raw_varlistentry, stdout=subprocess.PIPE, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.decode()
+
+
+async def pandoc_to_markdown_async(raw_varlistentry: bytes) -> str | None:
+    """Like pandoc_to_markdown, running pandoc as a subprocess of the event loop, which
+    is free meanwhile. pandoc is killed if the conversion is cancelled."""
+    stats.count("pandoc_runs")
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *PANDOC_ARGV, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+    except OSError:
+        return None
+    try:
+        stdout, _ = await proc.communicate(raw_varlistentry)
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+    if proc.returncode != 0:
+        return None
+    return stdout.decode()
+
+
+def pandoc_to_markdown_batch(raw_varlistentries: list[bytes]) -> list[str] | None:
+    """Convert many docbook entries to markdown with a single pandoc run, which is much
+    cheaper than one run per entry. Return None if pandoc fails."""
+    separator = f"<para>{BATCH_SEPARATOR}</para>".encode()
+    document = b"<article>" + separator.join(raw_varlistentries) + b"</article>"
+    markdown = pandoc_to_markdown(document)
+    if markdown is None:
+        return None
+    parts = markdown.split(BATCH_SEPARATOR + "\n")
+    if len(parts) != len(raw_varlistentries):
+        return None
+    return [part.strip("\n") + "\n" for part in parts]
+
+
+def _cache_file(raw_varlistentry: bytes, version: str) -> Path:
+    digest = hashlib.sha256(raw_varlistentry).hexdigest()
+    return markdown_cache_dir() / version / (digest + ".md")
+
+
+def load_cached_markdown(raw_varlistentry: bytes, version: str) -> str | None:
+    try:
+        markdown = _cache_file(raw_varlistentry, version).read_text()
+    except OSError:
+        stats.count("markdown_disk.miss")
+        return None
+    stats.count("markdown_disk.hit")
+    return markdown
+
+
+def store_cached_markdown(raw_varlistentry: bytes, version: str, markdown: str):
+    cache_file = _cache_file(raw_varlistentry, version)
+    tmp_file = None
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        #  named uniquely, as hovers and the prerendering may store the same entry
+        with tempfile.NamedTemporaryFile(
+            "w", dir=cache_file.parent, suffix=".tmp", delete=False
+        ) as f:
+            tmp_file = f.name
+            f.write(markdown)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        if tmp_file is not None:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_file)
+
+
+class MarkdownCache:
+    """Markdown of the docbook entries converted last, shared by the synchronous and
+    asynchronous conversions"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries: OrderedDict[bytes, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, raw_varlistentry: bytes) -> str | None:
+        with self._lock:
+            markdown = self._entries.get(raw_varlistentry)
+            if markdown is not None:
+                self._entries.move_to_end(raw_varlistentry)
+        hit = markdown is not None
+        stats.count("markdown_memory.hit" if hit else "markdown_memory.miss")
+        return markdown
+
+    def put(self, raw_varlistentry: bytes, markdown: str):
+        with self._lock:
+            self._entries[raw_varlistentry] = markdown
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+memory_cache = MarkdownCache(MARKDOWN_CACHE_SIZE)
+
+
+def convert_to_markdown(raw_varlistentry: bytes) -> str:
+    """Convert docbook entry to markdown, with pandoc if possible, consulting the memory
+    and disk caches first."""
+    markdown = memory_cache.get(raw_varlistentry)
+    if markdown is None:
+        markdown = _convert_to_markdown(raw_varlistentry)
+        memory_cache.put(raw_varlistentry, markdown)
+    return markdown
+
+
+async def convert_to_markdown_async(
+    raw_varlistentry: bytes, pandoc: bool = True
+) -> str:
+    """Like convert_to_markdown, without blocking the event loop: pandoc runs as its
+    subprocess, and the disk cache is read and written in the default executor. Only
+    the builtin renderer is used if pandoc is false."""
+    markdown = memory_cache.get(raw_varlistentry)
+    if markdown is not None:
+        return markdown
+    loop = asyncio.get_running_loop()
+    version = await loop.run_in_executor(None, pandoc_version) if pandoc else None
+    if version is not None:
+        markdown = await loop.run_in_executor(
+            None, load_cached_markdown, raw_varlistentry, version
+        )
+        if markdown is None:
+            markdown = await pandoc_to_markdown_async(raw_varlistentry)
+            if markdown is not None:
+                await loop.run_in_executor(
+                    None, store_cached_markdown, raw_varlistentry, version, markdown
+                )
+    if markdown is None:
+        markdown = docbook_to_markdown(raw_varlistentry)
+    memory_cache.put(raw_varlistentry, markdown)
+    return markdown
+
+
+def _convert_to_markdown(raw_varlistentry: bytes) -> str:
+    version = pandoc_version()
+    if version is None:
+        return docbook_to_markdown(raw_varlistentry)
+
+    markdown = load_cached_markdown(raw_varlistentry, version)
+    if markdown is not None:
+        return markdown
+    markdown = pandoc_to_markdown(raw_varlistentry)
+    if markdown is None:
+        return docbook_to_markdown(raw_varlistentry)
+    store_cached_markdown(raw_varlistentry, version, markdown)
+    return markdown
+
+
+def convert_to_markdown_batch(raw_varlistentries: list[bytes]) -> list[str]:
+    """Convert many docbook entries to markdown, like convert_to_markdown, but running
+    pandoc once for all entries not found in the disk cache."""
+    version = pandoc_version()
+    if version is None:
+        return [docbook_to_markdown(raw) for raw in raw_varlistentries]
+
+    markdowns = [load_cached_markdown(raw, version) for raw in raw_varlistentries]
+    missing = [i for i, markdown in enumerate(markdowns) if markdown is None]
+    if not missing:
+        return markdowns  # type: ignore[return-value]
+    converted = pandoc_to_markdown_batch([raw_varlistentries[i] for i in missing])
+    for n, i in enumerate(missing):
+        raw = raw_varlistentries[i]
+        if converted is None:
+            markdowns[i] = convert_to_markdown(raw)
+        else:
+            markdowns[i] = converted[n]
+            store_cached_markdown(raw, version, converted[n])
+    return markdowns  # type: ignore[return-value]
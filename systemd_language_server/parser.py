@@ -0,0 +1,316 @@
+import re
+import sys
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Iterator
+
+from lsprotocol.types import (
+    Position,
+    Range,
+    TextDocumentContentChangeEvent,
+    TextDocumentContentChangeEvent_Type1,
+)
+
+from .unit import SectionIndex, UnitFileSection, UnitType, get_unit_type
+
+#  A unit file is parsed line by line into a list of Line objects. Lines are reparsed only
+#  when they are changed, or when a change decides whether they continue a directive from
+#  the line above (a line ending in "\"). Sections and directives spanning several lines
+#  are assembled from the lines on demand, and cached until the next change. As the parses
+#  of all the unit files of a workspace are kept, lines are slotted, and directive and
+#  section names are interned, sharing the strings of constants.py for known ones.
+
+WORD_PROG = re.compile(r"\S+")
+
+
+class LineKind(Enum):
+    blank = "blank"
+    comment = "comment"
+    section_header = "section_header"
+    directive = "directive"
+    #  a line continuing a directive from the line above
+    continuation = "continuation"
+    #  anything else, e.g. a directive without "=" being typed
+    other = "other"
+
+
+@dataclass(slots=True)
+class Line:
+    kind: LineKind
+    #  text of the line, without line terminator
+    text: str
+    #  whether the line above ends with a line continuation
+    continued: bool
+    #  whether this line ends with a line continuation
+    continues: bool
+    #  column of the first non-whitespace character
+    start: int = 0
+    #  directive or section name
+    name: str | None = None
+    #  directive value, or content of a continuation line, without the trailing "\"
+    value: str | None = None
+    #  column at which the value starts
+    value_start: int = 0
+
+
+@dataclass
+class Directive:
+    name: str
+    #  value, with the continuation lines joined
+    value: str
+    #  section of the nearest header above, None if there is none or it's unknown
+    section: UnitFileSection | None
+    #  from the start of the name to the end of the last continuation line
+    range: Range
+    name_range: Range
+    value_range: Range
+
+
+@dataclass
+class Section:
+    #  None for the directives preceding the first section header
+    name: str | None
+    section: UnitFileSection | None
+    #  line of the header, None for the directives preceding the first section header
+    line: int | None
+    range: Range
+    directives: list[Directive] = field(default_factory=list)
+
+
+def parse_line(text: str, continued: bool) -> Line:
+    text = text.rstrip("\r\n")
+    stripped = text.strip()
+    start = len(text) - len(text.lstrip())
+    continues = stripped.endswith("\\")
+    if not stripped:
+        return Line(LineKind.blank, text, continued, False, start)
+    if stripped[0] in "#;":
+        #  comments within a continuation are skipped, it carries on past them
+        return Line(LineKind.comment, text, continued, continued, start)
+    if continued:
+        value = stripped[:-1].rstrip() if continues else stripped
+        return Line(
+            LineKind.continuation, text, continued, continues, start, None, value, start
+        )
+    if stripped[0] == "[":
+        name = sys.intern(stripped[1:-1]) if stripped.endswith("]") else None
+        return Line(LineKind.section_header, text, continued, False, start, name)
+    if "=" in stripped:
+        name, value = stripped.split("=", 1)
+        value_start = text.index("=") + 1
+        value_start += len(text[value_start:]) - len(text[value_start:].lstrip())
+        value = value.strip()
+        if continues:
+            value = value[:-1].rstrip()
+        return Line(
+            LineKind.directive,
+            text,
+            continued,
+            continues,
+            start,
+            sys.intern(name.strip()),
+            value,
+            value_start,
+        )
+    return Line(LineKind.other, text, continued, False, start)
+
+
+class UnitFile:
+    """Parsed representation of a unit file, for one version of a document."""
+
+    __slots__ = (
+        "uri",
+        "version",
+        "lines",
+        "_section_index",
+        "_directives",
+        "_sections",
+    )
+    uri: str
+    version: int | None
+    lines: list[Line]
+
+    def __init__(self, uri: str, lines: list[str], version: int | None = None):
+        self.uri = uri
+        self.version = version
+        #  built on first use, as files parsed only to be read never need it
+        self._section_index: SectionIndex | None = None
+        self._parse(lines)
+
+    @property
+    def section_index(self) -> SectionIndex:
+        if self._section_index is None:
+            self._section_index = SectionIndex([line.text for line in self.lines])
+        return self._section_index
+
+    def _parse(self, lines: list[str]):
+        self.lines = []
+        self._reset_cache()
+        continued = False
+        for text in lines:
+            line = parse_line(text, continued)
+            self.lines.append(line)
+            continued = line.continues
+
+    def _reset_cache(self):
+        self._directives: dict[int, Directive | None] = dict()
+        self._sections: list[Section] | None = None
+
+    def apply_changes(
+        self,
+        changes: list[TextDocumentContentChangeEvent],
+        lines: list[str],
+        version: int | None,
+    ):
+        """Update the parse after changes, given the lines of the document with all
+        changes applied. Only the changed lines are reparsed."""
+        self.version = version
+        self._reset_cache()
+        if self._section_index is not None:
+            self._section_index.apply_changes(changes, lines)
+        parsed: list[Line | None] = list(self.lines)
+        for change in changes:
+            if not isinstance(change, TextDocumentContentChangeEvent_Type1):
+                self._parse(lines)
+                return
+            start, end = change.range.start.line, change.range.end.line
+            parsed[start : end + 1] = [None] * (change.text.count("\n") + 1)
+        #  a change past the last line may leave a dangling placeholder
+        del parsed[len(lines) :]
+        parsed += [None] * (len(lines) - len(parsed))
+
+        #  besides changed lines, reparse those whose continuation status changed
+        continued = False
+        for i, line in enumerate(parsed):
+            if line is None or line.continued != continued:
+                line = parsed[i] = parse_line(lines[i], continued)
+            continued = line.continues
+        self.lines = parsed  # type: ignore[assignment]
+
+    @property
+    def unit_type(self) -> UnitType:
+        return get_unit_type(self)
+
+    def line_text(self, line: int) -> str:
+        return self.lines[line].text if 0 <= line < len(self.lines) else ""
+
+    def section_at(self, line: int) -> UnitFileSection | None:
+        return self.section_index.section_at(line)
+
+    def directive_at(self, line: int) -> Directive | None:
+        """The directive spanning the given line, if any."""
+        if not 0 <= line < len(self.lines):
+            return None
+        start = line
+        while start > 0 and self.lines[start].continued:
+            start -= 1
+        if start not in self._directives:
+            self._directives[start] = self._build_directive(
+                start, self.section_index.section_at(start)
+            )
+        directive = self._directives[start]
+        if directive is None or line > directive.range.end.line:
+            return None
+        return directive
+
+    def value_words(self, directive: Directive) -> list[tuple[str, Range]]:
+        """Whitespace separated words of the value of a directive, with their ranges"""
+        words = []
+        start = directive.value_range.start
+        for i in range(start.line, directive.range.end.line + 1):
+            line = self.lines[i]
+            if line.kind == LineKind.comment:
+                continue
+            end = len(line.text.rstrip())
+            if line.continues:
+                end -= 1
+            begin = start.character if i == start.line else 0
+            for match in WORD_PROG.finditer(line.text, begin, end):
+                words.append(
+                    (
+                        match.group(),
+                        Range(Position(i, match.start()), Position(i, match.end())),
+                    )
+                )
+        return words
+
+    def _build_directive(
+        self, start: int, section: UnitFileSection | None
+    ) -> Directive | None:
+        first = self.lines[start]
+        if first.kind != LineKind.directive:
+            return None
+        assert first.name is not None
+        value, end = self._join_value(start)
+        last = self.lines[end]
+        name_end = first.start + len(first.name)
+        return Directive(
+            name=first.name,
+            value=value,
+            section=section,
+            range=Range(Position(start, first.start), Position(end, len(last.text))),
+            name_range=Range(Position(start, first.start), Position(start, name_end)),
+            value_range=Range(
+                Position(start, first.value_start), Position(end, len(last.text))
+            ),
+        )
+
+    def _join_value(self, start: int) -> tuple[str, int]:
+        """Value of the directive on a line, joined with its continuation lines, and
+        the last line of the directive"""
+        values = [self.lines[start].value]
+        end = start
+        while self.lines[end].continues and end + 1 < len(self.lines):
+            end += 1
+            if self.lines[end].kind == LineKind.continuation:
+                values.append(self.lines[end].value)
+        return " ".join(value for value in values if value), end
+
+    def assignments(self) -> Iterator[tuple[str | None, str, str, int]]:
+        """Section name, name, value and line of each directive. Cheaper than sections,
+        since no ranges are built."""
+        section = None
+        for i, line in enumerate(self.lines):
+            if line.kind == LineKind.section_header:
+                section = line.name
+            elif line.kind == LineKind.directive:
+                assert line.name is not None
+                yield section, line.name, self._join_value(i)[0], i
+
+    @staticmethod
+    def _section_from_name(name: str | None) -> UnitFileSection | None:
+        try:
+            return UnitFileSection(name)
+        except ValueError:
+            return None
+
+    @property
+    def sections(self) -> list[Section]:
+        """Sections of the unit file, in order, each with its directives."""
+        if self._sections is not None:
+            return self._sections
+        sections: list[Section] = []
+        current: Section | None = None
+        for i, line in enumerate(self.lines):
+            if line.kind == LineKind.section_header:
+                current = Section(
+                    name=line.name,
+                    section=self._section_from_name(line.name),
+                    line=i,
+                    range=Range(Position(i, line.start), Position(i, len(line.text))),
+                )
+                sections.append(current)
+            elif line.kind == LineKind.directive:
+                if current is None:
+                    current = Section(
+                        None, None, None, Range(Position(i, 0), Position(i, 0))
+                    )
+                    sections.append(current)
+                if i not in self._directives:
+                    self._directives[i] = self._build_directive(i, current.section)
+                directive = self._directives[i]
+                assert directive is not None
+                current.directives.append(directive)
+                current.range.end = directive.range.end
+        self._sections = sections
+        return sections
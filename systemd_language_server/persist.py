@@ -0,0 +1,133 @@
+import functools
+import gc
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterable
+
+from . import __version__, stats
+from .graph import GraphSnapshot
+from .symbols import SymbolSnapshot
+
+#  The dependency graph and the symbols of the unit files of a workspace are saved to
+#  the cache directory, with the modification time and size of the files they were
+#  found in, so that a server started again on the same workspace restores them instead
+#  of parsing every unit. Restored entries are checked against the files on the next
+#  refresh, and only the files changed since are parsed again. Snapshots are keyed by
+#  the roots of the index, and dropped if saved by another version of the server.
+#  Paths are saved as strings, and restored as the paths found by the scan of the
+#  roots, since creating as many Path objects would take most of the time of a restore;
+#  entries of files no longer found are dropped. The garbage collector is paused while
+#  snapshots are loaded, as the many objects allocated would trigger full collections.
+#  Symbols are pickled apart and only loaded on the first search, so that the graph is
+#  ready sooner.
+
+logger = logging.getLogger("systemd_language_server")
+
+#  incremented when the content of snapshots changes
+INDEX_FORMAT = 1
+#  seconds after a change of the graph or the symbols before the snapshot is saved
+SAVE_DELAY = 5.0
+
+
+@contextmanager
+def gc_paused():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def index_cache_dir() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "systemd-language-server" / "index"
+
+
+def snapshot_format() -> tuple[int, str]:
+    return INDEX_FORMAT, __version__
+
+
+def snapshot_path(roots: Iterable[Path]) -> Path:
+    """File of the snapshot of the index of roots"""
+    digest = hashlib.sha256("\0".join(map(str, roots)).encode()).hexdigest()
+    return index_cache_dir() / (digest + ".pickle")
+
+
+def load_snapshot(path: Path) -> dict | None:
+    """Snapshot saved by this version of the server, if any"""
+    try:
+        with path.open("rb") as f, gc_paused():
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        snapshot = None
+    #  unpickling a corrupt file may raise about anything, e.g. ValueError
+    except Exception:
+        logger.warning("ignoring unreadable index snapshot %s", path)
+        snapshot = None
+    if not isinstance(snapshot, dict) or snapshot.get("format") != snapshot_format():
+        stats.count("index_snapshot.miss")
+        return None
+    stats.count("index_snapshot.hit")
+    return snapshot
+
+
+def save_snapshot(path: Path, snapshot: dict):
+    snapshot = dict(snapshot, format=snapshot_format())
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        #  named uniquely, as the sessions of a daemon save from the same process
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, suffix=".tmp", delete=False
+        ) as f:
+            pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, path)
+    except OSError:
+        pass
+
+
+def encode_snapshot(graph: GraphSnapshot, symbols: SymbolSnapshot) -> dict:
+    return {
+        "graph": {
+            name: (tuple((str(path), *stamp) for path, *stamp in stamps), edges)
+            for name, (stamps, edges) in graph.items()
+        },
+        #  pickled apart, to be loaded on the first search
+        "symbols": pickle.dumps(
+            {str(path): entry for path, entry in symbols.items()},
+            pickle.HIGHEST_PROTOCOL,
+        ),
+    }
+
+
+def decode_snapshot(
+    snapshot: dict, paths: dict[str, Path]
+) -> tuple[GraphSnapshot, Callable[[], SymbolSnapshot]]:
+    """Graph of a snapshot, and a function loading its symbols, of the files among
+    paths"""
+    graph = dict()
+    for name, (stamps, edges) in snapshot["graph"].items():
+        if all(stamp[0] in paths for stamp in stamps):
+            stamps = tuple((paths[path], *stamp) for path, *stamp in stamps)
+            graph[name] = (stamps, edges)
+    return graph, functools.partial(decode_symbols, snapshot["symbols"], paths)
+
+
+def decode_symbols(data: bytes, paths: dict[str, Path]) -> SymbolSnapshot:
+    """Symbols of a snapshot, of the files among paths, none if they can't be read:
+    the files are then indexed again"""
+    with gc_paused():
+        try:
+            symbols = pickle.loads(data)
+            return {
+                paths[path]: entry for path, entry in symbols.items() if path in paths
+            }
+        except Exception:
+            logger.warning("ignoring unreadable symbols of the index snapshot")
+            return {}
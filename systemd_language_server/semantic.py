@@ -0,0 +1,210 @@
+import itertools
+import re
+
+from lsprotocol.types import (
+    Range,
+    SemanticTokenModifiers,
+    SemanticTokens,
+    SemanticTokensDelta,
+    SemanticTokensEdit,
+    SemanticTokensLegend,
+    SemanticTokenTypes,
+)
+
+from . import stats
+from .diagnostics import known_directives
+from .parser import Line, LineKind, UnitFile
+from .unit import UnitFileSection
+
+#  Semantic tokens are computed line by line, from the parse of each line. The parser only
+#  replaces the lines a change touched, so the lines between the unchanged ones at the
+#  start and end of the document are the only ones classified again, and deltas only
+#  encode the tokens of those lines.
+
+#  token types and modifiers, in the order of their index in the legend
+TOKEN_TYPES = [
+    SemanticTokenTypes.Namespace,  # section header
+    SemanticTokenTypes.Property,  # directive name
+    SemanticTokenTypes.String,  # directive value
+    SemanticTokenTypes.Macro,  # specifier, e.g. %n
+    SemanticTokenTypes.Variable,  # environment variable reference, e.g. ${FOO}
+    SemanticTokenTypes.Comment,
+]
+#  set on the sections and directives known to systemd
+TOKEN_MODIFIERS = [SemanticTokenModifiers.DefaultLibrary]
+
+LEGEND = SemanticTokensLegend(
+    token_types=[t.value for t in TOKEN_TYPES],
+    token_modifiers=[m.value for m in TOKEN_MODIFIERS],
+)
+
+SECTION, DIRECTIVE, VALUE, SPECIFIER, VARIABLE, COMMENT = range(len(TOKEN_TYPES))
+KNOWN = 1 << TOKEN_MODIFIERS.index(SemanticTokenModifiers.DefaultLibrary)
+
+#  "%%" and "$$" are escapes, matched so that what follows them isn't taken for a
+#  reference
+REFERENCE_PROG = re.compile(
+    r"%[%A-Za-z]|\$\$|\$\{[A-Za-z_][A-Za-z0-9_]*\}|\$[A-Za-z_][A-Za-z0-9_]*"
+)
+
+#  start, length, type and modifiers of a token on a line
+Token = tuple[int, int, int, int]
+
+_result_ids = itertools.count()
+
+
+def value_tokens(value: str, start: int) -> list[Token]:
+    """Tokens of a value starting at column start, split around references"""
+    tokens = []
+    end = 0
+    for match in REFERENCE_PROG.finditer(value):
+        if match.group() in ("%%", "$$"):
+            continue
+        if match.start() > end:
+            tokens.append((start + end, match.start() - end, VALUE, 0))
+        kind = SPECIFIER if match.group()[0] == "%" else VARIABLE
+        tokens.append((start + match.start(), len(match.group()), kind, 0))
+        end = match.end()
+    if end < len(value):
+        tokens.append((start + end, len(value) - end, VALUE, 0))
+    return tokens
+
+
+def line_tokens(line: Line) -> list[Token]:
+    if line.kind == LineKind.comment:
+        return [(line.start, len(line.text.rstrip()) - line.start, COMMENT, 0)]
+    if line.kind == LineKind.section_header:
+        try:
+            modifiers = KNOWN if UnitFileSection(line.name) else 0
+        except ValueError:
+            modifiers = 0
+        return [(line.start, len(line.text.rstrip()) - line.start, SECTION, modifiers)]
+    if line.kind == LineKind.directive:
+        assert line.name is not None and line.value is not None
+        modifiers = KNOWN if line.name in known_directives else 0
+        return [(line.start, len(line.name), DIRECTIVE, modifiers)] + value_tokens(
+            line.value, line.value_start
+        )
+    if line.kind == LineKind.continuation:
+        assert line.value is not None
+        return value_tokens(line.value, line.value_start)
+    return []
+
+
+def encode(
+    lines: list[list[Token]], first: int = 0, previous: tuple[int, int] = (0, 0)
+) -> list[int]:
+    """Encode the tokens of consecutive lines, from line first on, relative to the
+    line and start of the previous token"""
+    data = []
+    previous_line, previous_start = previous
+    for i, tokens in enumerate(lines, first):
+        for start, length, kind, modifiers in tokens:
+            if i != previous_line:
+                previous_start = 0
+            data += [i - previous_line, start - previous_start, length, kind, modifiers]
+            previous_line, previous_start = i, start
+    return data
+
+
+def common_ends(old: list, new: list) -> tuple[int, int]:
+    """Number of items two lists share at their start, and at their end, compared by
+    identity"""
+    limit = min(len(old), len(new))
+    first = 0
+    while first < limit and old[first] is new[first]:
+        first += 1
+    last = 0
+    while last < limit - first and old[-last - 1] is new[-last - 1]:
+        last += 1
+    return first, last
+
+
+def diff(old: list[list[Token]], new: list[list[Token]]) -> list[SemanticTokensEdit]:
+    """Edit of the encoding of the tokens of old lines into that of new lines. Lines
+    between those the two share at their start and end are encoded again, as is the
+    first token after them, which is relative to the last token before it."""
+    first, last = common_ends(old, new)
+    if first == len(old) == len(new):
+        return []
+    #  end of the changed lines, extended to the line of the first token after them
+    old_end, new_end = len(old) - last, len(new) - last
+    while old_end < len(old) and not old[old_end]:
+        old_end, new_end = old_end + 1, new_end + 1
+    old_end, new_end = min(old_end + 1, len(old)), min(new_end + 1, len(new))
+    #  last token before the changed lines
+    line = first - 1
+    while line >= 0 and not new[line]:
+        line -= 1
+    previous = (line, new[line][-1][0]) if line >= 0 else (0, 0)
+    return [
+        SemanticTokensEdit(
+            start=5 * sum(map(len, old[:first])),
+            delete_count=5 * sum(map(len, old[first:old_end])),
+            data=encode(new[first:new_end], first, previous),
+        )
+    ]
+
+
+class SemanticTokensCache:
+    """Semantic tokens of a document, and the last result sent"""
+
+    def __init__(self):
+        #  parse of the lines the tokens were last computed from
+        self.lines: list[Line] = []
+        #  tokens of each of those lines
+        self.result: list[list[Token]] = []
+        self.result_id: str | None = None
+        #  number of lines classified on the last run, as opposed to kept
+        self.classified = 0
+
+    def tokens(self, unit_file: UnitFile) -> list[list[Token]]:
+        """Tokens of each line of the document, classifying only the lines parsed
+        again since the last run"""
+        first, last = common_ends(self.lines, unit_file.lines)
+        end = len(self.lines) - last
+        #  lines between changes far apart are kept, if not at the same index
+        kept = {
+            id(line): tokens
+            for line, tokens in zip(self.lines[first:end], self.result[first:end])
+        }
+        self.classified = 0
+        changed = []
+        for line in unit_file.lines[first : len(unit_file.lines) - last]:
+            tokens = kept.get(id(line))
+            if tokens is None:
+                self.classified += 1
+                tokens = line_tokens(line)
+            changed.append(tokens)
+        self.result = self.result[:first] + changed + self.result[end:]
+        self.lines = unit_file.lines
+        stats.count("semantic_tokens_line.miss", self.classified)
+        stats.count("semantic_tokens_line.hit", len(self.lines) - self.classified)
+        return self.result
+
+    def full(self, unit_file: UnitFile) -> SemanticTokens:
+        self.result_id = str(next(_result_ids))
+        return SemanticTokens(
+            data=encode(self.tokens(unit_file)), result_id=self.result_id
+        )
+
+    def delta(
+        self, unit_file: UnitFile, previous_result_id: str
+    ) -> SemanticTokens | SemanticTokensDelta:
+        """Edits of the last result sent, or all tokens if the client holds another"""
+        if previous_result_id != self.result_id:
+            return self.full(unit_file)
+        old = self.result
+        self.result_id = str(next(_result_ids))
+        return SemanticTokensDelta(
+            edits=diff(old, self.tokens(unit_file)), result_id=self.result_id
+        )
+
+    def range(self, unit_file: UnitFile, range: Range) -> SemanticTokens:
+        """Tokens of the lines of a range, which are not kept as a result"""
+        start, end = range.start.line, min(range.end.line + 1, len(unit_file.lines))
+        if self.lines is unit_file.lines:
+            lines = self.result[start:end]
+        else:
+            lines = [line_tokens(line) for line in unit_file.lines[start:end]]
+        return SemanticTokens(data=encode(lines, start))
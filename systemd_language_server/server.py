@@ -1,36 +1,147 @@
+import asyncio
+import copy
+import json
 import logging
 import os
 import shutil
 import sys
-from argparse import ArgumentParser
+import threading
+from argparse import ArgumentParser, ArgumentTypeError
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Callable
 
 from lsprotocol.types import (
     INITIALIZE,
+    INITIALIZED,
+    PROGRESS,
     TEXT_DOCUMENT_COMPLETION,
+    TEXT_DOCUMENT_DEFINITION,
+    TEXT_DOCUMENT_DIAGNOSTIC,
+    TEXT_DOCUMENT_DID_CHANGE,
+    TEXT_DOCUMENT_DID_CLOSE,
+    TEXT_DOCUMENT_DID_OPEN,
+    TEXT_DOCUMENT_DOCUMENT_SYMBOL,
     TEXT_DOCUMENT_HOVER,
+    TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL,
+    TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL_DELTA,
+    TEXT_DOCUMENT_SEMANTIC_TOKENS_RANGE,
+    WORKSPACE_DIAGNOSTIC,
+    WORKSPACE_DID_CHANGE_WATCHED_FILES,
+    WORKSPACE_SYMBOL,
     CompletionItem,
     CompletionItemKind,
     CompletionList,
+    CompletionListItemDefaultsType,
     CompletionOptions,
     CompletionParams,
+    DefinitionParams,
+    Diagnostic,
+    DiagnosticOptions,
+    DidChangeTextDocumentParams,
+    DidChangeWatchedFilesParams,
+    DidChangeWatchedFilesRegistrationOptions,
+    DidCloseTextDocumentParams,
+    DidOpenTextDocumentParams,
+    DocumentDiagnosticParams,
+    DocumentSymbol,
+    DocumentSymbolParams,
+    FileChangeType,
+    FileSystemWatcher,
     Hover,
     HoverParams,
     InitializedParams,
+    InitializeParams,
+    Location,
+    MarkupContent,
+    MarkupKind,
     Position,
+    ProgressParams,
     Range,
+    Registration,
+    RegistrationParams,
+    RelatedFullDocumentDiagnosticReport,
+    RelatedUnchangedDocumentDiagnosticReport,
+    SemanticTokens,
+    SemanticTokensDelta,
+    SemanticTokensDeltaParams,
+    SemanticTokensParams,
+    SemanticTokensRangeParams,
+    SymbolInformation,
+    WorkspaceDiagnosticParams,
+    WorkspaceDiagnosticReport,
+    WorkspaceDiagnosticReportPartialResult,
+    WorkspaceDocumentDiagnosticReport,
+    WorkspaceFullDocumentDiagnosticReport,
+    WorkspaceSymbolParams,
+    WorkspaceUnchangedDocumentDiagnosticReport,
 )
+from pygls.exceptions import JsonRpcInvalidParams, JsonRpcServerError
 from pygls.server import LanguageServer
-from pygls.workspace import TextDocument
+from pygls.uris import to_fs_path
 
+from .check import POOL_THRESHOLD, add_check_arguments, check
+from .completion import (
+    VALUE_PREFIX_CHARS,
+    CompletionIndex,
+    complete_value,
+    get_completion_index,
+    value_token_start,
+)
+from .diagnostics import (
+    DiagnosticsCache,
+    dependency_diagnostics,
+    diagnose_files,
+    document_result_id,
+    file_result_id,
+)
+from .effective import Assignment, EffectiveConfigCache
+from .graph import DependencyGraph
+from .index import (
+    UNIT_SUFFIXES,
+    UnitIndex,
+    default_search_paths,
+    find_unit_files,
+    is_dropin,
+    is_unit_file,
+    unit_name,
+)
+from .markdown import convert_to_markdown_async
+from .parser import UnitFile
+from .persist import (
+    SAVE_DELAY,
+    decode_snapshot,
+    encode_snapshot,
+    gc_paused,
+    load_snapshot,
+    save_snapshot,
+    snapshot_path,
+)
+from .semantic import LEGEND, SemanticTokensCache
+from .startup import profile_startup
+from .stats import HandlerStats
+from .symbols import SymbolIndex, document_symbols
 from .unit import (
     UnitFileSection,
     UnitType,
-    get_current_section,
-    get_directives,
-    get_documentation_content,
-    get_unit_type,
+    find_documentation,
+    prerender_documentation,
     unit_type_to_unit_file_section,
 )
+from .values import ValueType, get_value_type
+
+#  custom request dumping a subgraph of the dependency graph
+SYSTEMD_DEPENDENCY_GRAPH = "systemd/dependencyGraph"
+#  error code of its requests made before the unit index is ready
+INDEXING_ERROR = -32000
+#  custom request reporting handler latencies and cache statistics
+SYSTEMD_STATS = "systemd/stats"
+
+SERVER_NAME = "systemd-language-server"
+SERVER_VERSION = "v0.1"
+
+#  maximum number of files checked per task sent to a worker process
+BATCH_SIZE = 32
 
 logger = logging.getLogger("systemd_language_server")
 handler = logging.StreamHandler(sys.stderr)
@@ -40,31 +151,173 @@ logger.addHandler(handler)
 
 
 class SystemdLanguageServer(LanguageServer):
-    has_pandoc: bool = False
+    #  whether pandoc is in $PATH, looked up on first hover
+    _has_pandoc: bool | None = None
+    #  parse of each open document, keyed by URI
+    unit_files: dict[str, UnitFile]
+    #  unit files of the workspace and the systemd search paths
+    unit_index: UnitIndex
+    #  configuration of units merged with their drop-ins
+    effective_configs: EffectiveConfigCache
+    #  dependencies between the units of the index
+    dependency_graph: DependencyGraph
+    #  units of the index and the programs they run, for workspace symbol search
+    symbol_index: SymbolIndex
+    #  whether to index units in the systemd search paths besides the workspace
+    index_search_paths: bool = True
+    #  whether to save the dependency graph and symbols, and restore them on startup
+    persist_index: bool = True
+    #  seconds for which changes must pause before diagnostics are published
+    diagnostics_delay: float = 0.3
+    #  diagnostics of each open document, keyed by URI
+    diagnostics: dict[str, DiagnosticsCache]
+    #  semantic tokens of each open document, keyed by URI
+    semantic_tokens: dict[str, SemanticTokensCache]
+    #  folders of the workspace
+    workspace_roots: list[Path]
+    #  latencies of the handlers
+    stats: HandlerStats
+    #  seconds between logs of the statistics at debug level, if any
+    stats_interval: float | None = None
+    #  number of files from which workspace diagnostics are checked in worker processes
+    process_pool_threshold: int = POOL_THRESHOLD
+    _process_pool: Executor | None = None
 
     def __init__(self, *args, **kwargs):
+        self.stats = HandlerStats()
         super().__init__(*args, **kwargs)
-        self.has_pandoc = shutil.which("pandoc") is not None
+        self.unit_files = dict()
+        self.unit_index = UnitIndex()
+        self.effective_configs = EffectiveConfigCache(self.unit_index)
+        self.dependency_graph = DependencyGraph()
+        self.symbol_index = SymbolIndex(self.unit_index)
+        self.diagnostics = dict()
+        self.semantic_tokens = dict()
+        self.workspace_roots = []
+        #  state of the dependency graph when diagnostics were last published
+        self._published_dependencies = ""
+        #  latest refresh of the dependency graph, and whether it started
+        self._graph_refresh: asyncio.Task | None = None
+        self._graph_refresh_started = False
+        #  pending diagnostics runs, keyed by URI
+        self._diagnostics_runs: dict[str, asyncio.TimerHandle] = dict()
+        #  pending save of the index snapshot
+        self._index_save: asyncio.TimerHandle | None = None
+        #  generations of the graph and the symbols last saved or restored
+        self._saved_index: tuple[int, int] | None = None
 
         #  perhaps bizarrely, pygls LSP implementation forces dynamic feature registration
         #  which frustrates a more tradition OOP design
 
         @self.feature(INITIALIZE)
-        def initialize(params: InitializedParams):
-            pass
+        def initialize(params: InitializeParams):
+            roots = [
+                Path(to_fs_path(folder.uri))
+                for folder in self.workspace.folders.values()
+            ]
+            if not roots and self.workspace.root_path:
+                roots.append(Path(self.workspace.root_path))
+            self.workspace_roots = roots
+            if self.index_search_paths:
+                roots = roots + default_search_paths()
+            self.unit_index.roots = roots
+            threading.Thread(target=self.index_workspace, daemon=True).start()
+            if self.stats_interval and logger.isEnabledFor(logging.DEBUG):
+                self.loop.call_later(self.stats_interval, self.log_stats)
+
+        @self.feature(INITIALIZED)
+        def initialized(params: InitializedParams):
+            watched_files = self.client_capabilities.workspace
+            if watched_files is not None:
+                watched_files = watched_files.did_change_watched_files
+            if watched_files is None or not watched_files.dynamic_registration:
+                return
+            pattern = "**/*.{" + ",".join(s[1:] for s in sorted(UNIT_SUFFIXES)) + "}"
+            self.register_capability(
+                RegistrationParams(
+                    [
+                        Registration(
+                            id="systemd-unit-files",
+                            method=WORKSPACE_DID_CHANGE_WATCHED_FILES,
+                            register_options=DidChangeWatchedFilesRegistrationOptions(
+                                watchers=[
+                                    FileSystemWatcher(glob_pattern=pattern),
+                                    FileSystemWatcher(glob_pattern="**/*.d/*.conf"),
+                                ]
+                            ),
+                        )
+                    ]
+                )
+            )
+
+        @self.feature(WORKSPACE_DID_CHANGE_WATCHED_FILES)
+        def workspace_didChangeWatchedFiles(params: DidChangeWatchedFilesParams):
+            for change in params.changes:
+                path = Path(to_fs_path(change.uri))
+                self.effective_configs.invalidate(path)
+                self.symbol_index.invalidate(path)
+                if not is_unit_file(path) and not is_dropin(path):
+                    continue
+                if change.type == FileChangeType.Deleted:
+                    self.unit_index.remove(path)
+                else:
+                    self.unit_index.add(path)
+
+        @self.feature(TEXT_DOCUMENT_DID_OPEN)
+        def textDocument_didOpen(params: DidOpenTextDocumentParams):
+            uri = params.text_document.uri
+            document = self.workspace.get_text_document(uri)
+            self.unit_files[uri] = UnitFile(uri, document.lines, document.version)
+            #  index units opened from outside of the workspace, for their drop-ins
+            path = Path(to_fs_path(uri))
+            if uri.startswith("file:") and path.is_file():
+                if is_unit_file(path) or is_dropin(path):
+                    self.unit_index.add(path)
+            self.schedule_diagnostics(uri)
+
+        @self.feature(TEXT_DOCUMENT_DID_CHANGE)
+        def textDocument_didChange(params: DidChangeTextDocumentParams):
+            uri = params.text_document.uri
+            document = self.workspace.get_text_document(uri)
+            unit_file = self.unit_files.get(uri)
+            if unit_file is None:
+                self.unit_files[uri] = UnitFile(uri, document.lines, document.version)
+            else:
+                unit_file.apply_changes(
+                    params.content_changes, document.lines, document.version
+                )
+            self.schedule_diagnostics(uri)
+
+        @self.feature(TEXT_DOCUMENT_DID_CLOSE)
+        def textDocument_didClose(params: DidCloseTextDocumentParams):
+            uri = params.text_document.uri
+            self.unit_files.pop(uri, None)
+            self.diagnostics.pop(uri, None)
+            self.semantic_tokens.pop(uri, None)
+            run = self._diagnostics_runs.pop(uri, None)
+            if run is not None:
+                run.cancel()
+            if not self.uses_pull_diagnostics:
+                self.publish_diagnostics(uri, [])
 
         @self.feature(
-            TEXT_DOCUMENT_COMPLETION, CompletionOptions(trigger_characters=["[', '="])
+            TEXT_DOCUMENT_COMPLETION, CompletionOptions(trigger_characters=["[", "="])
         )
-        def textDocument_completion(params: CompletionParams) -> CompletionList | None:
+        async def textDocument_completion(
+            params: CompletionParams,
+        ) -> CompletionList | None:
             """Complete systemd unit properties. Determine the required completion type and
             dispatch it."""
-            items = []
             uri = params.text_document.uri
-            document = self.workspace.get_text_document(uri)
-            current_line = document.lines[params.position.line].strip()
-            unit_type = get_unit_type(document)
-            section = get_current_section(document, params.position)
+            version = self.document_version(uri)
+            #  let changes and cancellations received meanwhile be handled first
+            await asyncio.sleep(0)
+            if self.document_version(uri) != version:
+                return None
+            unit_file = self.get_unit_file(uri)
+            current_line = unit_file.line_text(params.position.line).strip()
+            unit_type = unit_file.unit_type
+            section = unit_file.section_at(params.position.line)
 
             if current_line == "[":
                 return complete_unit_file_section(params, unit_type)
@@ -72,29 +325,600 @@ class SystemdLanguageServer(LanguageServer):
                 return complete_directive(params, unit_type, section, current_line)
             elif len(current_line.split("=")) == 2:
                 return complete_directive_property(
-                    params, unit_type, section, current_line
+                    params,
+                    unit_type,
+                    section,
+                    unit_file.line_text(params.position.line),
+                    self.unit_index.completion_index,
                 )
 
         @self.feature(TEXT_DOCUMENT_HOVER)
-        def textDocument_hover(params: HoverParams):
+        async def textDocument_hover(params: HoverParams):
             """Help for unit file directives."""
-            document = self.workspace.get_text_document(params.text_document.uri)
-            current_line = document.lines[params.position.line].strip()
-            unit_type = get_unit_type(document)
-            section = get_current_section(document, params.position)
-
-            if "=" in current_line:
-                directive = current_line.split("=")[0]
-                hover_range = range_for_directive(document, params.position)
-                contents = get_documentation_content(
-                    directive, unit_type, section, self.has_pandoc
+            uri = params.text_document.uri
+            version = self.document_version(uri)
+            await asyncio.sleep(0)
+            if self.document_version(uri) != version:
+                return None
+            unit_file = self.get_unit_file(uri)
+            directive = unit_file.directive_at(params.position.line)
+            if directive is None:
+                return None
+            section = unit_file.section_at(params.position.line)
+            #  loading documentation may read the bundle or parse docbooks: it's done off
+            #  the event loop, for changes and cancellation to be handled meanwhile
+            documentation = await asyncio.get_running_loop().run_in_executor(
+                self.thread_pool_executor,
+                find_documentation,
+                directive.name,
+                unit_file.unit_type,
+                section,
+            )
+            #  markdown is rendered by the builtin renderer when pandoc isn't found
+            contents = None
+            if documentation is not None and self.supports_markdown:
+                markdown = documentation.markdown or await convert_to_markdown_async(
+                    documentation.docbook, self.has_pandoc
+                )
+                contents = MarkupContent(kind=MarkupKind.Markdown, value=markdown)
+            elif documentation is not None:
+                contents = MarkupContent(
+                    kind=MarkupKind.PlainText, value=documentation.plain_text
+                )
+            #  the hover is for a position in an older version
+            if self.document_version(uri) != version:
+                return None
+            if section is not None:
+                assignments = self.get_effective_assignments(
+                    unit_file.uri, section, directive.name
+                )
+                #  only worth showing if other files take part
+                if any(a.uri != unit_file.uri for a in assignments):
+                    contents = add_effective_value(
+                        contents, directive.name, assignments, self.supports_markdown
+                    )
+            if contents is None:
+                return None
+            return Hover(contents=contents, range=directive.name_range)
+
+        @self.feature(TEXT_DOCUMENT_DEFINITION)
+        def textDocument_definition(params: DefinitionParams) -> list[Location] | None:
+            """Go to the unit files of units named in directive values."""
+            unit_file = self.get_unit_file(params.text_document.uri)
+            directive = unit_file.directive_at(params.position.line)
+            if (
+                directive is None
+                or get_value_type(directive.name) != ValueType.unit_name
+            ):
+                return None
+            line = unit_file.line_text(params.position.line)
+            name = word_at(line, params.position.character)
+            if not name:
+                return None
+            origin = Range(Position(0, 0), Position(0, 0))
+            return [
+                Location(uri=path.as_uri(), range=origin)
+                for path in self.unit_index.lookup(name)
+            ] or None
+
+        @self.feature(TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL, LEGEND)
+        def textDocument_semanticTokens_full(
+            params: SemanticTokensParams,
+        ) -> SemanticTokens:
+            uri = params.text_document.uri
+            return self.get_semantic_tokens(uri).full(self.get_unit_file(uri))
+
+        @self.feature(TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL_DELTA, LEGEND)
+        def textDocument_semanticTokens_full_delta(
+            params: SemanticTokensDeltaParams,
+        ) -> SemanticTokens | SemanticTokensDelta:
+            uri = params.text_document.uri
+            return self.get_semantic_tokens(uri).delta(
+                self.get_unit_file(uri), params.previous_result_id
+            )
+
+        @self.feature(TEXT_DOCUMENT_SEMANTIC_TOKENS_RANGE, LEGEND)
+        def textDocument_semanticTokens_range(
+            params: SemanticTokensRangeParams,
+        ) -> SemanticTokens:
+            uri = params.text_document.uri
+            return self.get_semantic_tokens(uri).range(
+                self.get_unit_file(uri), params.range
+            )
+
+        @self.feature(TEXT_DOCUMENT_DOCUMENT_SYMBOL)
+        def textDocument_documentSymbol(
+            params: DocumentSymbolParams,
+        ) -> list[DocumentSymbol]:
+            return document_symbols(self.get_unit_file(params.text_document.uri))
+
+        @self.feature(WORKSPACE_SYMBOL)
+        async def workspace_symbol(
+            params: WorkspaceSymbolParams,
+        ) -> list[SymbolInformation]:
+            """Units of the index and the programs they run, found by the words of
+            their names and descriptions, or the paths of programs. Files are indexed
+            in the thread pool."""
+            #  parses are updated by replacing their lines, so copies of them don't
+            #  change while they are indexed
+            open_files = {uri: copy.copy(f) for uri, f in self.unit_files.items()}
+            symbols = await self.loop.run_in_executor(
+                self.thread_pool_executor,
+                self.symbol_index.search,
+                params.query,
+                open_files,
+            )
+            self.schedule_index_save()
+            return [symbol.information() for symbol in symbols]
+
+        @self.feature(
+            TEXT_DOCUMENT_DIAGNOSTIC,
+            DiagnosticOptions(
+                identifier="systemd",
+                inter_file_dependencies=True,
+                workspace_diagnostics=True,
+            ),
+        )
+        async def textDocument_diagnostic(
+            params: DocumentDiagnosticParams,
+        ) -> (
+            RelatedFullDocumentDiagnosticReport
+            | RelatedUnchangedDocumentDiagnosticReport
+        ):
+            uri = params.text_document.uri
+            dependencies = await self.refresh_dependency_graph()
+            document = self.workspace.text_documents.get(uri)
+            result_id = document_result_id(None, dependencies)
+            if document is not None:
+                result_id = document_result_id(document.version, dependencies)
+            elif uri.startswith("file:"):
+                #  files which aren't open have no version, but may change on disk
+                try:
+                    result_id = file_result_id(Path(to_fs_path(uri)), dependencies)
+                except OSError:
+                    pass
+            if params.previous_result_id == result_id:
+                return RelatedUnchangedDocumentDiagnosticReport(result_id=result_id)
+            return RelatedFullDocumentDiagnosticReport(
+                items=self.diagnose(uri), result_id=result_id
+            )
+
+        @self.feature(WORKSPACE_DIAGNOSTIC)
+        async def workspace_diagnostic(
+            params: WorkspaceDiagnosticParams,
+        ) -> WorkspaceDiagnosticReport:
+            """Diagnostics of the unit files of the workspace. Files which aren't open
+            are checked in the thread pool, or in batches in the process pool if there
+            are many, and their reports streamed as partial results if the client asked
+            for them."""
+            loop = asyncio.get_running_loop()
+            previous = {
+                result.uri: result.value for result in params.previous_result_ids
+            }
+            paths = dict.fromkeys(
+                await loop.run_in_executor(
+                    self.thread_pool_executor, self.find_workspace_unit_files
                 )
-                if contents is None:
-                    return None
-                return Hover(contents=contents, range=hover_range)
+            )
+            #  open unit files outside of the workspace folders
+            for uri in self.workspace.text_documents:
+                path = Path(to_fs_path(uri))
+                if uri.startswith("file:") and is_unit_file(path):
+                    paths.setdefault(path)
+            dependencies = await self.refresh_dependency_graph()
+            reports: list[WorkspaceDocumentDiagnosticReport] = []
+            #  files which aren't open, with their result id
+            closed: list[tuple[Path, str]] = []
+            for path in paths:
+                uri = path.as_uri()
+                document = self.workspace.text_documents.get(uri)
+                version = document.version if document is not None else None
+                try:
+                    result_id = (
+                        document_result_id(version, dependencies)
+                        if document is not None
+                        else file_result_id(path)
+                    )
+                except OSError:
+                    continue
+                if previous.get(uri) == result_id:
+                    reports.append(
+                        WorkspaceUnchangedDocumentDiagnosticReport(
+                            uri=uri, version=version, result_id=result_id
+                        )
+                    )
+                elif document is not None:
+                    reports.append(
+                        WorkspaceFullDocumentDiagnosticReport(
+                            uri=uri,
+                            version=version,
+                            items=self.diagnose(uri),
+                            result_id=result_id,
+                        )
+                    )
+                else:
+                    closed.append((path, result_id))
+
+            #  checking is CPU bound, so threads only help with I/O, but starting worker
+            #  processes only pays off for many files
+            executor: Executor = self.thread_pool_executor
+            size = 1
+            if len(closed) >= self.process_pool_threshold:
+                executor = self.process_pool
+                workers = os.cpu_count() or 1
+                size = max(1, min(BATCH_SIZE, len(closed) // (workers * 4)))
+            pending = {
+                asyncio.ensure_future(file_reports(executor, closed[i : i + size]))
+                for i in range(0, len(closed), size)
+            }
+
+            token = params.partial_result_token
+            try:
+                if token is None:
+                    for batch in await asyncio.gather(*pending):
+                        reports += batch
+                    return WorkspaceDiagnosticReport(items=reports)
+                while True:
+                    if reports:
+                        self.lsp.notify(
+                            PROGRESS,
+                            ProgressParams(
+                                token=token,
+                                value=WorkspaceDiagnosticReportPartialResult(
+                                    items=reports
+                                ),
+                            ),
+                        )
+                    if not pending:
+                        break
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    reports = [report for future in done for report in future.result()]
+                return WorkspaceDiagnosticReport(items=[])
+            finally:
+                #  when cancelled, batches not yet started are dropped
+                for future in pending:
+                    future.cancel()
+
+        @self.feature(SYSTEMD_DEPENDENCY_GRAPH)
+        def systemd_dependencyGraph(params) -> dict:
+            """Units within params.depth (1 by default) dependency edges of params.unit,
+            and the edges between them, for visualization. The graph is served as it
+            is, and refreshed in the background for the next request. Until the unit
+            index is ready, the graph is restored in another thread, and an error is
+            served instead."""
+            #  pygls only reports errors of synchronous handlers as such
+            unit = getattr(params, "unit", None)
+            if not isinstance(unit, str):
+                raise JsonRpcInvalidParams("params.unit must be the name of a unit")
+            depth = getattr(params, "depth", None) or 1
+            if not isinstance(depth, int):
+                raise JsonRpcInvalidParams("params.depth must be an integer")
+            if not self.unit_index.ready.is_set():
+                raise JsonRpcServerError("the units are being indexed", INDEXING_ERROR)
+            self.start_graph_refresh()
+            return self.dependency_graph.subgraph(unit, depth)
+
+        @self.feature(SYSTEMD_STATS)
+        def systemd_stats(params) -> dict:
+            """Latency histograms of the handlers, hit rates of the caches, and counts of
+            docbook parses and pandoc runs"""
+            return self.stats_report()
+
+    def feature(self, feature_name: str, options=None):
+        """Register a feature, recording the latency of its handler"""
+        register = super().feature(feature_name, options)
+        return lambda handler: register(self.stats.timed(feature_name, handler))
+
+    @property
+    def process_pool(self) -> Executor:
+        """Worker processes for CPU bound checks, started on first use"""
+        if self._process_pool is None:
+            self._process_pool = start_process_pool()
+        return self._process_pool
+
+    @process_pool.setter
+    def process_pool(self, value: Executor):
+        self._process_pool = value
+
+    def index_workspace(self):
+        """Scan the roots, then restore the snapshot of the index, if any. Run in a
+        background thread: the graph is left alone until the index is ready."""
+        self.unit_index.walk()
+        snapshot = None
+        if self.persist_index:
+            snapshot = load_snapshot(snapshot_path(self.unit_index.roots))
+        if snapshot is None:
+            self.unit_index.ready.set()
+            return
+        with gc_paused():
+            try:
+                graph, symbols = decode_snapshot(snapshot, self.unit_index.paths())
+            except Exception:
+                #  the graph and the symbols are built from the files instead
+                logger.warning("ignoring malformed index snapshot", exc_info=True)
+                self.unit_index.ready.set()
+                return
+            self.dependency_graph.restore(graph)
+            generation = self.dependency_graph.generation
+            self.symbol_index.restore(symbols)
+            self.unit_index.ready.set()
+        self._saved_index = (generation, self.symbol_index.generation)
+
+    def index_generations(self) -> tuple[int, int]:
+        return self.dependency_graph.generation, self.symbol_index.generation
+
+    def schedule_index_save(self):
+        """Save the snapshot of the index SAVE_DELAY seconds after it changes"""
+        if not self.persist_index or self._index_save is not None:
+            return
+        self._index_save = self.loop.call_later(SAVE_DELAY, self.save_index)
+
+    def save_index(self, wait: bool = False) -> asyncio.Future | None:
+        """Save the snapshot of the index, if it changed since it was last saved, in
+        the thread pool unless waiting for it"""
+        self._index_save = None
+        if not self.unit_index.ready.is_set():
+            return None
+        generations = self.index_generations()
+        if generations == self._saved_index:
+            return None
+        self._saved_index = generations
+        #  the graph is only changed on the event loop, the symbols under their lock
+        graph = self.dependency_graph.snapshot()
+
+        def save():
+            snapshot = encode_snapshot(graph, self.symbol_index.snapshot())
+            save_snapshot(snapshot_path(self.unit_index.roots), snapshot)
+
+        if wait:
+            save()
+            return None
+        return self.loop.run_in_executor(None, save)
+
+    def shutdown(self):
+        if self._index_save is not None:
+            self._index_save.cancel()
+        if self._graph_refresh is not None:
+            self._graph_refresh.cancel()
+        self.save_index(wait=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+        super().shutdown()
+
+    def close(self):
+        """Stop the timers and threads of a session of a daemon once its client is gone.
+        The event loop and the process pool are shared with other sessions."""
+        self.stats_interval = None
+        if self._index_save is not None:
+            self._index_save.cancel()
+        if self._graph_refresh is not None:
+            self._graph_refresh.cancel()
+        self.save_index()
+        for run in self._diagnostics_runs.values():
+            run.cancel()
+        self._diagnostics_runs.clear()
+        if self._thread_pool_executor is not None:
+            self._thread_pool_executor.shutdown(wait=False, cancel_futures=True)
+        if self._thread_pool is not None:
+            self._thread_pool.terminate()
+
+    def stats_report(self) -> dict:
+        return self.stats.report()
+
+    def log_stats(self):
+        logger.debug("stats: %s", json.dumps(self.stats_report()))
+        if self.stats_interval:
+            self.loop.call_later(self.stats_interval, self.log_stats)
+
+    @property
+    def has_pandoc(self) -> bool:
+        if self._has_pandoc is None:
+            self._has_pandoc = shutil.which("pandoc") is not None
+        return self._has_pandoc
 
+    @has_pandoc.setter
+    def has_pandoc(self, value: bool):
+        self._has_pandoc = value
 
-server = SystemdLanguageServer("systemd-language-server", "v0.1")
+    @property
+    def supports_markdown(self) -> bool:
+        """Whether the client renders markdown in hovers, as clients which don't say
+        are assumed to"""
+        text_document = self.client_capabilities.text_document
+        hover = text_document.hover if text_document is not None else None
+        formats = hover.content_format if hover is not None else None
+        return not formats or MarkupKind.Markdown in formats
+
+    @property
+    def uses_pull_diagnostics(self) -> bool:
+        text_document = self.client_capabilities.text_document
+        return text_document is not None and text_document.diagnostic is not None
+
+    def find_workspace_unit_files(self) -> list[Path]:
+        return [path for root in self.workspace_roots for path in find_unit_files(root)]
+
+    def diagnose(self, uri: str) -> list[Diagnostic]:
+        """Diagnostics of the current version of a document"""
+        unit_file = self.get_unit_file(uri)
+        if uri not in self.workspace.text_documents:
+            diagnostics = DiagnosticsCache().diagnose(unit_file)
+        else:
+            cache = self.diagnostics.setdefault(uri, DiagnosticsCache())
+            diagnostics = cache.diagnose(unit_file)
+            logger.debug("checked %d sections of %s", cache.checked, uri)
+        name = unit_name(Path(to_fs_path(uri))) if uri.startswith("file:") else None
+        if name is not None and self.unit_index.ready.is_set():
+            diagnostics += dependency_diagnostics(
+                unit_file, name, self.dependency_graph, self.unit_index
+            )
+        return diagnostics
+
+    def get_semantic_tokens(self, uri: str) -> SemanticTokensCache:
+        if uri not in self.workspace.text_documents:
+            return SemanticTokensCache()
+        return self.semantic_tokens.setdefault(uri, SemanticTokensCache())
+
+    async def refresh_dependency_graph(self) -> str:
+        """Bring the dependency graph up to date, once the unit index is ready. Return
+        an identifier of the state of the index and the graph."""
+        refresh = self.start_graph_refresh()
+        if refresh is not None:
+            #  a cancelled request leaves the refresh to the others waiting for it
+            await asyncio.shield(refresh)
+        return f"{self.unit_index.generation}.{self.dependency_graph.generation}"
+
+    def start_graph_refresh(self) -> asyncio.Task | None:
+        """Start a refresh of the dependency graph once the unit index is ready, unless
+        one is yet to start, which will see the current state of the files. Return the
+        refresh."""
+        if not self.unit_index.ready.is_set():
+            return None
+        if self._graph_refresh is None or self._graph_refresh_started:
+            self._graph_refresh = self.loop.create_task(
+                self._refresh_graph(self._graph_refresh)
+            )
+            self._graph_refresh_started = False
+        return self._graph_refresh
+
+    async def _refresh_graph(self, previous: asyncio.Task | None):
+        """Find the changes of the graph in the thread pool, after the previous
+        refresh, since statting every unit takes tens of milliseconds for thousands of
+        units, and apply them on the event loop, where the graph is read"""
+        if previous is not None:
+            await asyncio.wait([previous])
+        self._graph_refresh_started = True
+        #  parses are updated by replacing their lines, so copies of them don't
+        #  change while the graph is refreshed
+        open_files = {uri: copy.copy(f) for uri, f in self.unit_files.items()}
+        changes = await self.loop.run_in_executor(
+            self.thread_pool_executor,
+            self.dependency_graph.changes,
+            list(self.unit_index.units),
+            self.effective_configs,
+            open_files,
+        )
+        self.dependency_graph.apply(changes)
+        if changes:
+            self.schedule_index_save()
+
+    def schedule_diagnostics(self, uri: str):
+        """Publish diagnostics of the document once changes pause for
+        diagnostics_delay, superseding any run pending for a previous version. Clients
+        pulling diagnostics request them instead."""
+        if self.uses_pull_diagnostics:
+            return
+        run = self._diagnostics_runs.pop(uri, None)
+        if run is not None:
+            run.cancel()
+        version = self.workspace.get_text_document(uri).version
+        self._diagnostics_runs[uri] = self.loop.call_later(
+            self.diagnostics_delay, self.start_diagnostics_run, uri, version
+        )
+
+    def start_diagnostics_run(self, uri: str, version: int | None):
+        self._diagnostics_runs.pop(uri, None)
+        self.loop.create_task(self.publish_unit_diagnostics(uri, version))
+
+    async def publish_unit_diagnostics(self, uri: str, version: int | None):
+        if self.document_version(uri) != version:
+            return
+        dependencies = await self.refresh_dependency_graph()
+        #  the document was closed or changed since the run was scheduled
+        if self.document_version(uri) != version:
+            return
+        self.publish_diagnostics(uri, self.diagnose(uri), version)
+        #  the dependencies of other documents may have changed with this one
+        if dependencies != self._published_dependencies:
+            self._published_dependencies = dependencies
+            for other in self.unit_files:
+                if other != uri and other not in self._diagnostics_runs:
+                    self.schedule_diagnostics(other)
+
+    def get_effective_assignments(
+        self, uri: str, section: UnitFileSection, directive: str
+    ) -> list[Assignment]:
+        """Assignments of a directive in effect for the unit of a unit file or drop-in"""
+        if not uri.startswith("file:"):
+            return []
+        name = unit_name(Path(to_fs_path(uri)))
+        if name is None:
+            return []
+        config = self.effective_configs.get(name, self.unit_files)
+        if config is None:
+            return []
+        return config.get(section.value, directive)
+
+    def document_version(self, uri: str) -> int | None:
+        document = self.workspace.text_documents.get(uri)
+        return document.version if document is not None else None
+
+    def get_unit_file(self, uri: str) -> UnitFile:
+        """Parse of the current version of a document"""
+        document = self.workspace.get_text_document(uri)
+        unit_file = self.unit_files.get(uri)
+        if unit_file is not None and unit_file.version == document.version:
+            return unit_file
+        unit_file = UnitFile(uri, document.lines, document.version)
+        if uri in self.workspace.text_documents:
+            self.unit_files[uri] = unit_file
+        return unit_file
+
+
+def start_process_pool() -> Executor:
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    #  forking a process running threads, as the server does, may deadlock the child:
+    #  workers are forked from a single threaded server process instead
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else None
+    return ProcessPoolExecutor(mp_context=multiprocessing.get_context(method))
+
+
+def add_effective_value(
+    contents: MarkupContent | None,
+    directive: str,
+    assignments: list[Assignment],
+    markdown: bool,
+) -> MarkupContent:
+    """Append the assignments in effect for a directive, with their origin, to the
+    documentation of the directive"""
+    lines = []
+    for assignment in assignments:
+        origin = f"{to_fs_path(assignment.uri)}:{assignment.line + 1}"
+        reset = "" if assignment.value else " (reset)"
+        if markdown:
+            lines.append(f"- `{directive}={assignment.value}`{reset} from `{origin}`")
+        else:
+            lines.append(f"  {directive}={assignment.value}{reset} from {origin}")
+    if markdown:
+        effective = "**Effective value**\n\n" + "\n".join(lines)
+    else:
+        effective = "Effective value:\n" + "\n".join(lines)
+    if contents is None:
+        kind = MarkupKind.Markdown if markdown else MarkupKind.PlainText
+        return MarkupContent(kind=kind, value=effective)
+    separator = "\n\n---\n\n" if contents.kind == MarkupKind.Markdown else "\n\n"
+    return MarkupContent(
+        kind=contents.kind, value=effective + separator + contents.value
+    )
+
+
+async def file_reports(
+    executor: Executor, files: list[tuple[Path, str]]
+) -> list[WorkspaceFullDocumentDiagnosticReport]:
+    """Reports of files on disk, given with their result id, checked in an executor"""
+    paths = [path for path, _ in files]
+    loop = asyncio.get_running_loop()
+    diagnostics = await loop.run_in_executor(executor, diagnose_files, paths)
+    return [
+        WorkspaceFullDocumentDiagnosticReport(
+            uri=path.as_uri(), version=None, items=items, result_id=result_id
+        )
+        for (path, result_id), items in zip(files, diagnostics)
+    ]
 
 
 def complete_unit_file_section(params: CompletionParams, unit_type: UnitType):
@@ -115,10 +939,32 @@ def complete_directive_property(
     params: CompletionParams,
     unit_type: UnitType,
     section: UnitFileSection | None,
-    current_line: str,
+    line: str,
+    unit_names: Callable[[], CompletionIndex] | None = None,
 ):
-    directive = current_line.split("=")[0]
-    pass
+    """Complete the value of a directive. Unit names are only indexed, by calling
+    unit_names, for directives taking them."""
+    position = params.position
+    before_cursor = line[: position.character]
+    equals = before_cursor.find("=")
+    if equals < 0:
+        return None
+    directive = before_cursor[:equals].strip()
+    value = before_cursor[equals + 1 :]
+    start = equals + 1 + value_token_start(directive, value)
+    token = before_cursor[start:]
+    items = complete_value(directive, token, section)
+    if unit_names is not None and get_value_type(directive) == ValueType.unit_name:
+        items = [*items, *unit_names().complete(token)]
+    if not items:
+        return None
+    return CompletionList(
+        is_incomplete=False,
+        items=items,  # type: ignore[arg-type]
+        item_defaults=CompletionListItemDefaultsType(
+            edit_range=Range(Position(position.line, start), position)
+        ),
+    )
 
 
 def complete_directive(
@@ -127,20 +973,34 @@ def complete_directive(
     section: UnitFileSection | None,
     current_line: str,
 ):
-    directives = get_directives(unit_type, section)
-    items = [
-        CompletionItem(label=s, insert_text=s + "=", kind=CompletionItemKind.Property)
-        for s in directives
-        if s.startswith(current_line)
-    ]
-    return CompletionList(is_incomplete=False, items=items)
+    items = get_completion_index(unit_type, section).complete(current_line)
+    return CompletionList(is_incomplete=False, items=items)  # type: ignore[arg-type]
+
+
+def word_at(line: str, character: int) -> str:
+    """Whitespace delimited word of a directive value at character"""
+    start = max(line.rfind(c, 0, character) for c in " \t=") + 1
+    ends = [i for i in (line.find(c, character) for c in " \t") if i >= 0]
+    return line[start : min(ends, default=len(line))].lstrip(VALUE_PREFIX_CHARS)
+
+
+def address(value: str) -> tuple[str, int]:
+    """Host and port of [HOST:]PORT, the host being the loopback address by default"""
+    host, _, port = value.rpartition(":")
+    if not port.isdigit():
+        raise ArgumentTypeError(f"expected [HOST:]PORT, got {value!r}")
+    return host.strip("[]") or "127.0.0.1", int(port)
+
 
+def is_loopback(host: str) -> bool:
+    import ipaddress
 
-def range_for_directive(document: TextDocument, position: Position) -> Range:
-    """Range indicating directive (before =)"""
-    current_line = document.lines[position.line].strip()
-    idx = current_line.find("=")
-    return Range(Position(position.line, 0), Position(position.line, idx - 1))
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
 
 
 def get_parser():
@@ -151,6 +1011,54 @@ def get_parser():
         default="info",
         choices=["debug", "info", "warning", "error", "critical"],
     )
+    parser.add_argument(
+        "--prerender",
+        action="store_true",
+        help="render documentation of all directives in the background at startup",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="report the time spent importing each module at startup, and exit",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        metavar="SECONDS",
+        help="log handler latencies and cache statistics periodically, at debug level",
+    )
+    parser.add_argument(
+        "--no-index-cache",
+        action="store_true",
+        help="don't save the dependency graph and symbols of the workspace, nor restore "
+        "them at startup",
+    )
+    transports = parser.add_mutually_exclusive_group()
+    transports.add_argument(
+        "--tcp",
+        type=address,
+        metavar="[HOST:]PORT",
+        help="serve clients connecting over TCP, instead of a single client on stdio",
+    )
+    transports.add_argument(
+        "--ws",
+        type=address,
+        metavar="[HOST:]PORT",
+        help="serve clients connecting over WebSocket, instead of a single client on "
+        "stdio",
+    )
+    parser.add_argument(
+        "--allow-remote",
+        action="store_true",
+        help="let --tcp and --ws listen on other addresses than loopback ones, where "
+        "any host can connect, as clients aren't authenticated",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    add_check_arguments(
+        subparsers.add_parser(
+            "check", help="check unit files and report problems, without serving LSP"
+        )
+    )
     return parser
 
 
@@ -163,10 +1071,49 @@ def main():
         pygls_logger.setLevel(args.log_level.upper())
         logger.setLevel(args.log_level.upper())
 
+    if args.command == "check":
+        sys.exit(check(args))
+
+    if args.profile_startup:
+        profile_startup()
+        return
+
+    if args.prerender:
+        threading.Thread(target=prerender_documentation, daemon=True).start()
+
+    if args.tcp is not None or args.ws is not None:
+        #  clients aren't authenticated, and can read any file the daemon can
+        host = (args.tcp or args.ws)[0]
+        if not is_loopback(host):
+            if not args.allow_remote:
+                parser.error(
+                    f"refusing to serve unauthenticated clients on {host}, which isn't "
+                    "a loopback address: pass --allow-remote to do so"
+                )
+            logger.warning(
+                "serving unauthenticated clients on %s, from any host which can "
+                "connect",
+                host,
+            )
+        from .daemon import Daemon
+
+        daemon = Daemon()
+        daemon.stats_interval = args.stats_interval
+        daemon.persist_index = not args.no_index_cache
+        if args.tcp is not None:
+            listener = daemon.listen_tcp(*args.tcp)
+        else:
+            listener = daemon.listen_ws(*args.ws)
+        daemon.serve_forever(listener)
+        return
+
     if os.isatty(sys.stdout.fileno()):
         logger.warning(
             "systemd-language-server is running from a TTY. "
             "Usually you want to integrate it to be launched by a text editor."
         )
 
+    server = SystemdLanguageServer(SERVER_NAME, SERVER_VERSION)
+    server.stats_interval = args.stats_interval
+    server.persist_index = not args.no_index_cache
     server.start_io()
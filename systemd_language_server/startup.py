@@ -0,0 +1,87 @@
+import subprocess
+import sys
+import time
+from typing import Callable, NamedTuple, TextIO
+
+#  Editors spawn a language server per workspace, so its cold start is on the critical
+#  path of opening a file. Modules only needed by some requests (xml.etree, lxml,
+#  multiprocessing) are imported on first use, the bundled docbooks are looked up and the
+#  documentation bundle loaded on first hover, and pandoc is looked up on first hover.
+#  systemd-language-server --profile-startup reports where the remaining time goes.
+
+#  number of modules listed by --profile-startup
+PROFILE_TOP = 15
+
+
+class ImportTime(NamedTuple):
+    module: str
+    #  microseconds spent importing the module, excluding its imports
+    self_us: int
+    #  microseconds spent importing the module, including its imports
+    cumulative_us: int
+    #  depth in the import tree, the module imported being at 0
+    depth: int
+
+
+def parse_importtime(text: str) -> list[ImportTime]:
+    """Parse the output of python -X importtime"""
+    times = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        module = name.lstrip()
+        depth = (len(name) - len(module) - 1) // 2
+        times.append(ImportTime(module, int(fields[0]), int(fields[1]), depth))
+    return times
+
+
+def import_times(module: str) -> list[ImportTime]:
+    """Times of the imports made importing a module in a fresh interpreter"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return parse_importtime(proc.stderr)
+
+
+def timed(function: Callable) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def profile_startup(output: TextIO = sys.stdout):
+    """Report the time spent importing the server, by module, and the time of the work
+    deferred to the first requests"""
+    from .server import SystemdLanguageServer
+    from .unit import UnitFileSection, UnitType, get_documentation_content
+    from .values import get_value_schema
+
+    times = import_times("systemd_language_server.server")
+    total = sum(t.cumulative_us for t in times if t.depth == 0)
+    output.write(f"interpreter and server imports: {total / 1000:.1f} ms\n")
+    output.write(f"{'cumulative':>12} {'self':>10}  module\n")
+    for t in sorted(times, key=lambda t: t.cumulative_us, reverse=True)[:PROFILE_TOP]:
+        output.write(
+            f"{t.cumulative_us / 1000:>9.1f} ms {t.self_us / 1000:>7.1f} ms  "
+            f"{'  ' * t.depth}{t.module}\n"
+        )
+    output.write("deferred:\n")
+    steps = [
+        ("server construction", lambda: SystemdLanguageServer("profile", "v0")),
+        (
+            "first hover",
+            lambda: get_documentation_content(
+                "ExecStart", UnitType.service, UnitFileSection.service
+            ),
+        ),
+        ("first diagnostics", get_value_schema),
+    ]
+    for name, step in steps:
+        output.write(f"{timed(step) * 1000:>9.1f} ms  {name}\n")
@@ -0,0 +1,155 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from collections import Counter
+from typing import Callable
+
+#  Observability of the server, served by the systemd/stats request: latency histograms of
+#  each request and notification handler, kept per server, and counters of cache hits and
+#  misses, docbook parses and pandoc runs, kept per process since the caches they count
+#  are module globals.
+
+#  upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_counters: Counter[str] = Counter()
+_counters_lock = threading.Lock()
+
+
+def count(name: str, n: int = 1):
+    """Add to a process wide counter. Cache counters are named <cache>.hit and
+    <cache>.miss."""
+    with _counters_lock:
+        _counters[name] += n
+
+
+def counters() -> dict[str, int]:
+    with _counters_lock:
+        return dict(_counters)
+
+
+def cache_stats(hits: int, misses: int) -> dict:
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else None,
+    }
+
+
+def cache_report(counts: dict[str, int]) -> dict[str, dict]:
+    """Hits, misses and hit rate of each cache counted"""
+    caches = dict()
+    for name in counts:
+        cache, _, kind = name.rpartition(".")
+        if kind not in ("hit", "miss"):
+            continue
+        caches[cache] = cache_stats(
+            counts.get(cache + ".hit", 0), counts.get(cache + ".miss", 0)
+        )
+    return caches
+
+
+class Histogram:
+    """Latencies in buckets of fixed bounds, so that recording costs no allocation"""
+
+    def __init__(self):
+        #  the last bucket holds latencies above the last bound
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile, or the maximum if it's
+        in the last bucket"""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def report(self) -> dict:
+        #  counts of the non empty buckets, keyed by upper bound
+        buckets = {
+            f"le_{bound}ms": n for bound, n in zip(BUCKETS_MS, self.buckets) if n
+        }
+        if self.buckets[-1]:
+            buckets["inf"] = self.buckets[-1]
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": buckets,
+        }
+
+
+class HandlerStats:
+    """Latency histograms of the handlers of a server, keyed by method"""
+
+    def __init__(self):
+        self.histograms: dict[str, Histogram] = dict()
+        self.started = time.monotonic()
+        #  handlers run on the event loop and in the thread pool
+        self._lock = threading.Lock()
+
+    def record(self, method: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get(method)
+            if histogram is None:
+                histogram = self.histograms[method] = Histogram()
+            histogram.record(seconds * 1000)
+
+    def timed(self, method: str, handler: Callable) -> Callable:
+        """Wrap a handler to record its latency"""
+        if asyncio.iscoroutinefunction(handler):
+
+            @functools.wraps(handler)
+            async def timed_coroutine(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await handler(*args, **kwargs)
+                finally:
+                    self.record(method, time.perf_counter() - start)
+
+            return timed_coroutine
+
+        @functools.wraps(handler)
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                self.record(method, time.perf_counter() - start)
+
+        return timed_function
+
+    def report(self) -> dict:
+        with self._lock:
+            handlers = {
+                method: histogram.report()
+                for method, histogram in sorted(self.histograms.items())
+            }
+        counts = counters()
+        return {
+            "uptime_s": time.monotonic() - self.started,
+            "handlers": handlers,
+            "caches": cache_report(counts),
+            "counters": {
+                name: n
+                for name, n in sorted(counts.items())
+                if not name.endswith((".hit", ".miss"))
+            },
+        }
@@ -0,0 +1,345 @@
+import bisect
+import heapq
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple
+
+from lsprotocol.types import (
+    DocumentSymbol,
+    Location,
+    Position,
+    Range,
+    SymbolInformation,
+    SymbolKind,
+)
+from pygls.uris import to_fs_path
+
+from . import stats
+from .effective import file_stamp
+from .index import UnitIndex, dropin_unit_name, is_dropin
+from .parser import UnitFile
+
+#  Document symbols are the sections of a unit file, with their directives as children,
+#  from the cached parse of the document. Workspace symbols are the units of the index,
+#  and the programs their ExecStart=-like directives run. They are found through an inverted
+#  index, mapping the words of unit names and descriptions, and the paths and names of
+#  programs, to the symbols they come from. Words of a query are looked up as prefixes
+#  in the sorted list of words, so that a search costs the number of matches rather
+#  than the number of files. Files are indexed on the first search, then again when the
+#  unit index or their content changes. The symbols of files can be saved with their
+#  stamps, and restored by another server, which then only stats the files.
+#  As most words are found in a single symbol, postings of one symbol are the symbol
+#  itself rather than a set, which would take several times its size, and words are
+#  interned, so that the symbols of a whole workspace sharing them hold a single copy.
+
+#  maximum number of workspace symbols returned by a search
+MAX_SYMBOLS = 200
+
+NAME_SEPARATORS_PROG = re.compile(r"[-_.@\\]")
+WORD_PROG = re.compile(r"\w+")
+#  prefixes of Exec*= command lines, see systemd.service(5)
+EXEC_PREFIXES = "@-:+!|"
+#  directives running command lines, unlike ExecPaths= and ExecSearchPath=
+EXEC_DIRECTIVES = frozenset(
+    {
+        "ExecCondition",
+        "ExecReload",
+        "ExecStart",
+        "ExecStartPost",
+        "ExecStartPre",
+        "ExecStop",
+        "ExecStopPost",
+        "ExecStopPre",
+    }
+)
+
+
+class Symbol(NamedTuple):
+    name: str
+    kind: SymbolKind
+    uri: str
+    line: int
+    #  name of the unit of a program, None for units
+    container: str | None
+    #  words the symbol is found by
+    terms: tuple[str, ...]
+
+    def information(self) -> SymbolInformation:
+        position = Position(self.line, 0)
+        return SymbolInformation(
+            name=self.name,
+            kind=self.kind,
+            location=Location(uri=self.uri, range=Range(position, position)),
+            container_name=self.container,
+        )
+
+
+#  symbols of each file, with the stamp of the content they were found in
+SymbolSnapshot = dict[Path, tuple[tuple, list[Symbol]]]
+
+
+def document_symbols(unit_file: UnitFile) -> list[DocumentSymbol]:
+    """Sections and their directives. Directives above the first section header are
+    at the top level."""
+    symbols = []
+    for section in unit_file.sections:
+        children = [
+            DocumentSymbol(
+                name=directive.name,
+                detail=directive.value,
+                kind=SymbolKind.Property,
+                range=directive.range,
+                selection_range=directive.name_range,
+            )
+            for directive in section.directives
+            if directive.name
+        ]
+        if section.line is None:
+            symbols += children
+            continue
+        header = unit_file.line_text(section.line).strip()
+        symbols.append(
+            DocumentSymbol(
+                name=header,
+                kind=SymbolKind.Namespace,
+                range=section.range,
+                selection_range=Range(
+                    section.range.start,
+                    Position(section.line, section.range.start.character + len(header)),
+                ),
+                children=children,
+            )
+        )
+    return symbols
+
+
+def name_terms(name: str) -> list[str]:
+    name = name.lower()
+    return [name] + [part for part in NAME_SEPARATORS_PROG.split(name) if part]
+
+
+def program(command_line: str) -> str | None:
+    """Program run by an Exec*= command line"""
+    words = command_line.split(maxsplit=1)
+    if not words:
+        return None
+    return words[0].lstrip(EXEC_PREFIXES) or None
+
+
+def unit_file_symbols(unit_file: UnitFile, unit: str, dropin: bool) -> list[Symbol]:
+    """The unit defined by a unit file, and the programs it runs. Drop-ins only have
+    programs."""
+    descriptions = []
+    programs = []
+    for section, directive, value, line in unit_file.assignments():
+        if section == "Unit" and directive == "Description":
+            descriptions.append(value)
+        elif directive in EXEC_DIRECTIVES and value:
+            path = program(value)
+            if path is not None:
+                name = path.rsplit("/", 1)[-1].lower()
+                terms = (path.lower(), name) if name != path.lower() else (name,)
+                terms = tuple(map(sys.intern, terms))
+                programs.append(
+                    Symbol(path, SymbolKind.Function, unit_file.uri, line, unit, terms)
+                )
+    if dropin:
+        return programs
+    terms = name_terms(unit)
+    terms += [
+        word for value in descriptions for word in WORD_PROG.findall(value.lower())
+    ]
+    name = unit if not descriptions else f"{unit} ({descriptions[-1]})"
+    unit_symbol = Symbol(
+        name,
+        SymbolKind.Module,
+        unit_file.uri,
+        0,
+        None,
+        tuple(dict.fromkeys(map(sys.intern, terms))),
+    )
+    return [unit_symbol] + programs
+
+
+class SymbolIndex:
+    """Inverted index of the symbols of the files of a unit index"""
+
+    def __init__(self, index: UnitIndex):
+        self.index = index
+        #  symbols of each file, with the stamp of the content they were found in
+        self.files: dict[Path, tuple[tuple, list[Symbol]]] = dict()
+        #  symbols found by each word: the symbol if there is only one, else a set
+        self.postings: dict[str, Symbol | set[Symbol]] = dict()
+        self.lock = threading.Lock()
+        #  generation of the unit index when files were last listed
+        self._generation = -1
+        #  files changed on disk, to index again
+        self._invalid: set[Path] = set()
+        #  files indexed from their open document
+        self._opened: set[Path] = set()
+        #  words of the postings in order, for prefix lookups, sorted again on change
+        self._terms: list[str] | None = None
+        #  incremented on each change of the symbols
+        self.generation = 0
+        #  loads the symbols of a snapshot, indexed on the next refresh
+        self._restored: Callable[[], SymbolSnapshot] | None = None
+
+    def invalidate(self, path: Path):
+        with self.lock:
+            self._invalid.add(path)
+
+    def refresh(self, open_files: dict[str, UnitFile] | None = None):
+        """Index the files added to the unit index or changed since the last refresh.
+        Open files, keyed by URI, take precedence over their content on disk."""
+        open_files = open_files or dict()
+        with self.lock:
+            if self._restored is not None:
+                restored = self._restored()
+                for path, (stamp, symbols) in restored.items():
+                    self._set(path, stamp, symbols)
+                self._invalid.update(restored)
+                self._restored = None
+            if self._generation != self.index.generation:
+                with self.index.lock:
+                    self._generation = self.index.generation
+                    paths = {
+                        path
+                        for files in (self.index.units, self.index.dropins)
+                        for indexed in files.values()
+                        for path in indexed
+                    }
+                for path in self.files.keys() - paths:
+                    self._remove(path)
+                for path in paths - self.files.keys():
+                    self._add(path)
+            for path in self._invalid & self.files.keys():
+                self._add(path)
+            self._invalid.clear()
+            opened = {
+                Path(to_fs_path(uri)): unit_file
+                for uri, unit_file in open_files.items()
+                if uri.startswith("file:")
+            }
+            #  documents closed since the last refresh are indexed from disk again
+            for path in self._opened - opened.keys():
+                self._add(path)
+            self._opened = opened.keys() & self.files.keys()
+            for path in self._opened:
+                self._add(path, opened[path])
+
+    def _add(self, path: Path, unit_file: UnitFile | None = None):
+        """Index a file, from its open document if any, unless it's unchanged"""
+        if unit_file is not None:
+            stamp: tuple = ("version", unit_file.version)
+            cached = self.files.get(path)
+            if cached is not None and cached[0] == stamp:
+                return
+        else:
+            try:
+                stamp = ("stat", file_stamp(path))
+                cached = self.files.get(path)
+                if cached is not None and cached[0] == stamp:
+                    return
+                unit_file = UnitFile(path.as_uri(), path.read_text().splitlines(True))
+            except (OSError, UnicodeDecodeError):
+                self._remove(path)
+                return
+        stats.count("symbol_index_parses")
+        if is_dropin(path):
+            unit = dropin_unit_name(path.parent.name) or path.parent.name
+            symbols = unit_file_symbols(unit_file, unit, dropin=True)
+        else:
+            symbols = unit_file_symbols(unit_file, path.name, dropin=False)
+        self._set(path, stamp, symbols)
+
+    def _set(self, path: Path, stamp: tuple, symbols: list[Symbol]):
+        self._remove(path)
+        self.files[path] = (stamp, symbols)
+        self.generation += 1
+        for symbol in symbols:
+            for term in symbol.terms:
+                postings = self.postings.get(term)
+                if postings is None:
+                    self.postings[term] = symbol
+                    self._terms = None
+                elif isinstance(postings, set):
+                    postings.add(symbol)
+                elif postings != symbol:
+                    self.postings[term] = {postings, symbol}
+
+    def _remove(self, path: Path):
+        if path not in self.files:
+            return
+        _, symbols = self.files.pop(path)
+        self.generation += 1
+        for symbol in symbols:
+            for term in symbol.terms:
+                postings = self.postings.get(term)
+                if isinstance(postings, set):
+                    postings.discard(symbol)
+                    if len(postings) == 1:
+                        self.postings[term] = postings.pop()
+                elif postings == symbol:
+                    del self.postings[term]
+                    self._terms = None
+
+    def snapshot(self) -> SymbolSnapshot:
+        """Symbols of the files on disk, with their stamps"""
+        with self.lock:
+            if self._restored is not None:
+                return self._restored()
+            return {
+                path: (stamp, symbols)
+                for path, (stamp, symbols) in self.files.items()
+                if stamp[0] == "stat"
+            }
+
+    def restore(self, snapshot: Callable[[], SymbolSnapshot]):
+        """Set the symbols of a snapshot, loaded by a function, on the next refresh,
+        which checks them against the stamps of their files"""
+        with self.lock:
+            self._restored = snapshot
+
+    def _prefixed(self, prefix: str) -> set[Symbol]:
+        """Symbols found by the words starting with prefix"""
+        if self._terms is None:
+            self._terms = sorted(self.postings)
+        symbols: set[Symbol] = set()
+        start = bisect.bisect_left(self._terms, prefix)
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            postings = self.postings[term]
+            if isinstance(postings, set):
+                symbols |= postings
+            else:
+                symbols.add(postings)
+        return symbols
+
+    def search(
+        self, query: str, open_files: dict[str, UnitFile] | None = None
+    ) -> list[Symbol]:
+        """Symbols found by all the words of the query, as prefixes. Units come first."""
+        self.refresh(open_files)
+        words = query.lower().split()
+        with self.lock:
+            if not words:
+                found: Iterable[Symbol] = (
+                    symbol
+                    for _, symbols in self.files.values()
+                    for symbol in symbols
+                    if symbol.kind == SymbolKind.Module
+                )
+            else:
+                found = self._prefixed(words[0])
+                for word in words[1:]:
+                    if not found:
+                        break
+                    found &= self._prefixed(word)
+            return heapq.nsmallest(
+                MAX_SYMBOLS,
+                found,
+                key=lambda s: (s.kind != SymbolKind.Module, s.name, s.uri),
+            )
@@ -1,14 +1,26 @@
+import bisect
+import functools
+import hashlib
+import pickle
 import re
-import subprocess
+import threading
+import zlib
 from enum import Enum
 from glob import glob
 from io import StringIO
 from pathlib import Path
-
-from lsprotocol.types import MarkupContent, MarkupKind, Position
-from lxml import etree  # type: ignore
+from typing import NamedTuple
+
+from lsprotocol.types import (
+    MarkupContent,
+    MarkupKind,
+    Position,
+    TextDocumentContentChangeEvent,
+    TextDocumentContentChangeEvent_Type1,
+)
 from pygls.workspace import TextDocument
 
+from . import stats
 from .constants import (
     systemd_automount_directives,
     systemd_exec_directives,
@@ -16,6 +28,7 @@ from .constants import (
     systemd_kill_directives,
     systemd_mount_directives,
     systemd_path_directives,
+    systemd_resource_control_directives,
     systemd_scope_directives,
     systemd_service_directives,
     systemd_socket_directives,
@@ -23,6 +36,7 @@ from .constants import (
     systemd_timer_directives,
     systemd_unit_directives,
 )
+from .markdown import convert_to_markdown, convert_to_markdown_batch
 
 #  The ultimate source for information on unit files is the docbook files distributed with
 #  systemd. Therefore, the following data is managed by the language server:
@@ -32,7 +46,12 @@ from .constants import (
 #  - directive values
 #  - which docbook (.xml) directives are documented in
 #  Data is resolved at runtime, to the extent possible, therefore docbooks are bundled
-#  with systemd-language-server and parsed as required.
+#  with systemd-language-server. To avoid parsing them at runtime, they are compiled ahead
+#  of time into a documentation bundle (see compile_docs.py). The docbooks themselves are
+#  only parsed, with lxml if it's installed, if the bundle is absent or was compiled by an
+#  incompatible version. Staleness isn't checked at runtime: the bundle records digests of
+#  the docbooks it was compiled from, and a test fails until it's recompiled after they
+#  change.
 
 SECTION_HEADER_PROG = re.compile(r"^\[(?P<name>\w+)\]$")
 
@@ -58,6 +77,16 @@ class UnitType(Enum):
             UnitType.swap,
         ]
 
+    def has_resource_control(self):
+        return self in [
+            UnitType.service,
+            UnitType.socket,
+            UnitType.mount,
+            UnitType.swap,
+            UnitType.slice,
+            UnitType.scope,
+        ]
+
 
 class UnitFileSection(Enum):
     unit = "Unit"
@@ -70,22 +99,132 @@ class UnitFileSection(Enum):
     swap = "Swap"
     path = "Path"
     timer = "Timer"
+    slice = "Slice"
 
 
 _assets_dir = Path(__file__).absolute().parent / "assets"
-docbooks = glob("*.xml", root_dir=_assets_dir)
 
-#  dict mapping docbook documentation file to the list of  systemd unit directives
-#  documented within
-directives = dict()
+
+@functools.lru_cache(maxsize=1)
+def get_docbooks() -> list[str]:
+    """Docbooks bundled in the assets directory, looked up on first use rather than at
+    import, to keep startup fast"""
+    return glob("*.xml", root_dir=_assets_dir)
+
+
+#  zlib compressed pickle
+documentation_bundle_path = _assets_dir / "documentation.pickle.zlib"
+#  bump whenever the layout of the bundle or of DirectiveDocumentation changes
+DOCUMENTATION_BUNDLE_VERSION = 1
 
 
-def initialize_directive():
-    for filename in docbooks:
-        docbook_file = _assets_dir / filename
-        tree = etree.parse(open(docbook_file).read())
-        directives[filename] = tree.xpath()
-        #  TODO 10/02/20 psacawa: finish this
+class DirectiveDocumentation(NamedTuple):
+    """Documentation of a directive, extracted from a varlistentry of a docbook."""
+
+    docbook: bytes
+    plain_text: str
+    markdown: str | None = None
+
+
+#  dict mapping docbook documentation file to a dict mapping each systemd unit directive
+#  documented within to its documentation. Filled from the documentation bundle, or
+#  failing that, by parsing each docbook the first time documentation is requested from
+#  it.
+directive_index: dict[str, dict[str, DirectiveDocumentation]] = dict()
+_bundle_loaded = False
+#  documentation may be loaded from the request handlers and a prerendering thread
+_directive_index_lock = threading.Lock()
+
+
+def docbook_digest(docbook: str) -> str:
+    return hashlib.sha256((_assets_dir / docbook).read_bytes()).hexdigest()
+
+
+def load_documentation_bundle(path: Path = documentation_bundle_path) -> dict | None:
+    """Load the precompiled documentation bundle. Return None if it doesn't exist or was
+    compiled by an incompatible version."""
+    try:
+        bundle = pickle.loads(zlib.decompress(path.read_bytes()))
+    except (OSError, zlib.error, pickle.UnpicklingError):
+        return None
+    if bundle.get("version") != DOCUMENTATION_BUNDLE_VERSION:
+        return None
+    return bundle
+
+
+def build_directive_index(docbook: str) -> dict[str, DirectiveDocumentation]:
+    """Parse a docbook and map each directive documented within to its varlistentry. If
+    several varlistentries document the same directive, the first one wins. Empty if
+    the docbook isn't bundled, or lxml isn't installed."""
+    index: dict[str, DirectiveDocumentation] = dict()
+    filepath = _assets_dir / docbook
+    if not filepath.exists():
+        return index
+    try:
+        from lxml import etree  # type: ignore
+    except ImportError:
+        return index
+    stats.count("docbook_parses")
+    stream = StringIO(filepath.read_text())
+    tree = etree.parse(stream)
+    for varlistentry in tree.xpath("//varlistentry"):
+        documentation = DirectiveDocumentation(
+            docbook=etree.tostring(varlistentry),
+            plain_text="".join(varlistentry.itertext()),
+        )
+        for varname in varlistentry.findall(".//term/varname"):
+            index.setdefault(varname.text.strip("="), documentation)
+    return index
+
+
+def get_directive_index(docbook: str) -> dict[str, DirectiveDocumentation]:
+    index = directive_index.get(docbook)
+    if index is not None:
+        return index
+    global _bundle_loaded
+    with _directive_index_lock:
+        if not _bundle_loaded:
+            _bundle_loaded = True
+            bundle = load_documentation_bundle()
+            stats.count("documentation_bundle_loads")
+            if bundle is not None:
+                for name in get_docbooks():
+                    directive_index.setdefault(name, bundle["directives"].get(name, {}))
+        index = directive_index.get(docbook)
+        if index is None:
+            index = directive_index[docbook] = build_directive_index(docbook)
+    return index
+
+
+def initialize_directive_index():
+    """Eagerly index all bundled docbooks."""
+    for docbook in get_docbooks():
+        get_directive_index(docbook)
+
+
+def prerender_documentation():
+    """Render markdown for all documented directives lacking it, i.e. when the
+    documentation bundle was compiled without markdown or is unavailable, so that no hover
+    waits on markdown conversion. Conversions are batched into a single pandoc run."""
+    initialize_directive_index()
+    pending = {
+        id(documentation): documentation
+        for index in directive_index.values()
+        for documentation in index.values()
+        if documentation.markdown is None
+    }
+    if not pending:
+        return
+    raw_varlistentries = [documentation.docbook for documentation in pending.values()]
+    markdowns = convert_to_markdown_batch(raw_varlistentries)
+    rendered = {
+        key: documentation._replace(markdown=markdown)
+        for (key, documentation), markdown in zip(pending.items(), markdowns)
+    }
+    for index in directive_index.values():
+        for directive, documentation in index.items():
+            if id(documentation) in rendered:
+                index[directive] = rendered[id(documentation)]
 
 
 def unit_type_to_unit_file_section(ut: UnitType) -> UnitFileSection | None:
@@ -111,46 +250,37 @@ directive_dict = {
     UnitFileSection.swap: systemd_swap_directives,
     UnitFileSection.path: systemd_path_directives,
     UnitFileSection.scope: systemd_scope_directives,
+    #  slices only take resource control directives
+    UnitFileSection.slice: (),
 }
 
 
-def convert_to_markdown(raw_varlistentry: bytes):
-    """Use pandoc to convert docbook entry to markdown"""
-    argv = "pandoc --from=docbook --to markdown -".split()
-    proc = subprocess.run(argv, input=raw_varlistentry, stdout=subprocess.PIPE)
-    return proc.stdout.decode()
-
-
 def get_documentation_content(
     directive: str,
     unit_type: UnitType,
     section: UnitFileSection | None,
-    markdown_available=False,
+    markdown=True,
 ) -> MarkupContent | None:
-    """Get documentation for unit file directive."""
-    docbooks = get_manual_sections(unit_type, section)
-    for manual in docbooks:
-        filepath = _assets_dir / manual
-        stream = StringIO(open(filepath).read())
-        tree = etree.parse(stream)
-        for varlistentry in tree.xpath("//varlistentry"):
-            directives_in_varlist: list[str] = [
-                varname.text.strip("=")
-                for varname in varlistentry.findall(".//term/varname")
-            ]
-            if directive not in directives_in_varlist:
-                continue
-            raw_varlistentry = etree.tostring(varlistentry)
-            value = bytes()
-            kind: MarkupKind
-            if markdown_available:
-                kind = MarkupKind.Markdown
-                value = convert_to_markdown(raw_varlistentry)
-            else:
-                kind = MarkupKind.PlainText
-                value = "".join((varlistentry.itertext()))
-
-            return MarkupContent(kind=kind, value=value)
+    """Get documentation for unit file directive, as markdown unless the client only
+    supports plain text. Markdown is rendered by the builtin renderer without pandoc."""
+    documentation = find_documentation(directive, unit_type, section)
+    if documentation is None:
+        return None
+    if markdown:
+        value = documentation.markdown or convert_to_markdown(documentation.docbook)
+        return MarkupContent(kind=MarkupKind.Markdown, value=value)
+    return MarkupContent(kind=MarkupKind.PlainText, value=documentation.plain_text)
+
+
+def find_documentation(
+    directive: str, unit_type: UnitType, section: UnitFileSection | None
+) -> DirectiveDocumentation | None:
+    """Documentation of a directive, from the first manual of the section documenting
+    it. May load the documentation bundle or parse docbooks: blocking."""
+    for manual in get_manual_sections(unit_type, section):
+        documentation = get_directive_index(manual).get(directive)
+        if documentation is not None:
+            return documentation
     return None
 
 
@@ -167,7 +297,9 @@ def get_manual_sections(unit_type: UnitType, section: UnitFileSection | None):
     return ret
 
 
-def get_directives(unit_type: UnitType, section: UnitFileSection | None) -> list[str]:
+def _build_directives(
+    unit_type: UnitType, section: UnitFileSection | None
+) -> tuple[str, ...]:
     #  Two variants: i) the current unit file section is known, ii) it isn't (e.g. buffer
     #  has no section headers yet). If it is, we supply completions value for the unit
     #  type/section. Otherwise, we supply those valid for all sections.
@@ -176,7 +308,7 @@ def get_directives(unit_type: UnitType, section: UnitFileSection | None) -> list
     if section == UnitFileSection.install:
         return systemd_install_directives
 
-    directives: list[str] = []
+    directives: tuple[str, ...] = ()
     if section is None:
         #  if unit type has a corresponding unit file section, add it
         section_from_type = unit_type_to_unit_file_section(unit_type)
@@ -188,11 +320,35 @@ def get_directives(unit_type: UnitType, section: UnitFileSection | None) -> list
 
     if unit_type.is_execable():
         directives += systemd_exec_directives + systemd_kill_directives
-    return directives
+    if unit_type.has_resource_control():
+        directives += systemd_resource_control_directives
+    return tuple(dict.fromkeys(directives))
+
+
+#  directives valid for each unit type and section (None if unknown), computed once
+directive_tables: dict[tuple[UnitType, UnitFileSection | None], tuple[str, ...]] = {
+    (unit_type, section): _build_directives(unit_type, section)
+    for unit_type in UnitType
+    for section in [None, *UnitFileSection]
+}
+directive_sets: dict[tuple[UnitType, UnitFileSection | None], frozenset[str]] = {
+    key: frozenset(directives) for key, directives in directive_tables.items()
+}
+
+
+def get_directives(
+    unit_type: UnitType, section: UnitFileSection | None
+) -> tuple[str, ...]:
+    return directive_tables[(unit_type, section)]
 
 
 def get_unit_type(document):
-    return UnitType(Path(document.uri).suffix.strip("."))
+    path = Path(document.uri)
+    #  drop-ins take the type of the units they extend, e.g. foo.service.d/bar.conf
+    if path.suffix == ".conf" and path.parent.name.endswith(".d"):
+        name = path.parent.name[: -len(".d")]
+        return UnitType(Path(name).suffix.strip(".") or name)
+    return UnitType(path.suffix.strip("."))
 
 
 def get_current_section(
@@ -200,13 +356,78 @@ def get_current_section(
 ) -> UnitFileSection | None:
     """Determine section of cursor in current document"""
 
+    lines = document.lines
     for i in reversed(range(0, position.line)):
-        line = document.lines[i].strip()
-        match = SECTION_HEADER_PROG.search(line)
-        if match is not None:
-            try:
-                section = UnitFileSection(match.group("name"))
-                return section
-            except ValueError:
-                pass
+        if is_section_header(lines[i]):
+            return parse_section_header(lines[i])
     return None
+
+
+def is_section_header(line: str) -> bool:
+    return line.lstrip().startswith("[")
+
+
+def parse_section_header(line: str) -> UnitFileSection | None:
+    match = SECTION_HEADER_PROG.search(line.strip())
+    if match is None:
+        return None
+    try:
+        return UnitFileSection(match.group("name"))
+    except ValueError:
+        return None
+
+
+class SectionIndex:
+    """Sorted line numbers of the section headers of a document, kept up to date from the
+    document's changes, so that the section at a line can be found by bisection instead
+    of by scanning backwards. Sections of unknown headers, e.g. [X-Foo], are None."""
+
+    def __init__(self, lines: list[str]):
+        self.header_lines: list[int] = []
+        self.sections: list[UnitFileSection | None] = []
+        self.rebuild(lines)
+
+    def rebuild(self, lines: list[str]):
+        self.header_lines.clear()
+        self.sections.clear()
+        self._rescan(lines, range(len(lines)))
+
+    def apply_changes(
+        self, changes: list[TextDocumentContentChangeEvent], lines: list[str]
+    ):
+        """Update the index after changes, given the lines of the document with all
+        changes applied. Only the changed lines are rescanned."""
+        dirty: set[int] = set()
+        for change in changes:
+            if not isinstance(change, TextDocumentContentChangeEvent_Type1):
+                self.rebuild(lines)
+                return
+            start, end = change.range.start.line, change.range.end.line
+            added = change.text.count("\n")
+            delta = added - (end - start)
+            lo = bisect.bisect_left(self.header_lines, start)
+            hi = bisect.bisect_right(self.header_lines, end)
+            del self.header_lines[lo:hi]
+            del self.sections[lo:hi]
+            for i in range(lo, len(self.header_lines)):
+                self.header_lines[i] += delta
+            dirty = {
+                line if line < start else line + delta
+                for line in dirty
+                if not start <= line <= end
+            }
+            dirty.update(range(start, start + added + 1))
+        self._rescan(lines, sorted(line for line in dirty if line < len(lines)))
+
+    def _rescan(self, lines: list[str], line_numbers):
+        for i in line_numbers:
+            if not is_section_header(lines[i]):
+                continue
+            j = bisect.bisect_left(self.header_lines, i)
+            self.header_lines.insert(j, i)
+            self.sections.insert(j, parse_section_header(lines[i]))
+
+    def section_at(self, line: int) -> UnitFileSection | None:
+        """Section of the given line, i.e. that of the nearest header above it."""
+        i = bisect.bisect_left(self.header_lines, line)
+        return self.sections[i - 1] if i > 0 else None
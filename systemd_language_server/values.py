@@ -0,0 +1,168 @@
+import functools
+import re
+from enum import Enum
+
+from .constants import (
+    systemd_boolean_values,
+    systemd_capabilities,
+    systemd_capability_directives,
+    systemd_enum_directive_values,
+    systemd_signal_directives,
+    systemd_signals,
+    systemd_special_units,
+    systemd_syscall_directives,
+    systemd_timespan_directives,
+    systemd_timespan_units,
+    systemd_unit_name_directives,
+)
+from .unit import UnitFileSection, get_directive_index, get_docbooks
+
+#  Schema of the values taken by directives. Directive documentation is consistently
+#  worded, so boolean directives are recognized from their docbooks. Other value types
+#  are declared in constants.py.
+
+BOOLEAN_PROG = re.compile(r"[Tt]akes an? boolean")
+#  "takes a boolean argument, or ..." introduces a directive taking other values too
+BOOLEAN_OR_PROG = re.compile(r"[Tt]akes an? boolean \w+, or ")
+#  a number and its unit in a time span, e.g. "5min" in "5min 20s"
+TIMESPAN_TERM_PROG = re.compile(r"\s*[0-9]+(?:\.[0-9]*)?\s*(?P<unit>[^\s0-9.]*)")
+
+#  sections of enumerated directives sharing their name with directives of other sections,
+#  which take other values, e.g. Type= of [Mount]
+enum_directive_sections = {"Type": UnitFileSection.service}
+
+#  as accepted by parse_boolean() and parse_sec() of systemd
+boolean_values = frozenset(systemd_boolean_values + ("1", "0", "y", "n", "t", "f"))
+timespan_unit_names = frozenset(
+    systemd_timespan_units
+    + ("usec", "μs", "µs", "nsec", "ns", "msec", "seconds", "second", "sec")
+    + ("minutes", "minute", "m", "hours", "hour", "hr", "days", "day")
+    + ("weeks", "week", "months", "month", "years", "year")
+)
+
+
+class ValueType(Enum):
+    boolean = "boolean"
+    enumeration = "enumeration"
+    signal = "signal"
+    timespan = "timespan"
+    capability = "capability"
+    syscall = "syscall"
+    unit_name = "unit_name"
+
+    def is_list(self):
+        """Whether directives of this type take a space separated list of values"""
+        return self in [ValueType.capability, ValueType.syscall, ValueType.unit_name]
+
+
+@functools.lru_cache(maxsize=1)
+def get_value_schema() -> dict[str, ValueType]:
+    """Map directives to the type of their values, for directives whose type is known"""
+    schema: dict[str, ValueType] = dict()
+    for docbook in get_docbooks():
+        for directive, documentation in get_directive_index(docbook).items():
+            text = " ".join(documentation.plain_text.split())
+            if BOOLEAN_PROG.search(text) and not BOOLEAN_OR_PROG.search(text):
+                schema[directive] = ValueType.boolean
+    for directive in systemd_enum_directive_values:
+        schema[directive] = ValueType.enumeration
+    for directives, value_type in [
+        (systemd_signal_directives, ValueType.signal),
+        (systemd_timespan_directives, ValueType.timespan),
+        (systemd_capability_directives, ValueType.capability),
+        (systemd_syscall_directives, ValueType.syscall),
+        (systemd_unit_name_directives, ValueType.unit_name),
+    ]:
+        for directive in directives:
+            schema[directive] = value_type
+    return schema
+
+
+def get_value_type(directive: str) -> ValueType | None:
+    return get_value_schema().get(directive)
+
+
+@functools.lru_cache(maxsize=1)
+def get_syscall_groups() -> tuple[str, ...]:
+    """Predefined system call groups, from the table in the documentation of
+    SystemCallFilter="""
+    documentation = get_directive_index("systemd.exec.xml").get("SystemCallFilter")
+    if documentation is None:
+        return ()
+    from xml.etree import ElementTree
+
+    root = ElementTree.fromstring(documentation.docbook)
+    groups = []
+    for row in root.iterfind(".//table/tgroup/tbody/row"):
+        entry = row.find("entry")
+        if entry is not None and entry.text and entry.text.strip().startswith("@"):
+            groups.append(entry.text.strip())
+    return tuple(groups)
+
+
+def get_value_candidates(directive: str) -> tuple[str, ...]:
+    """Values which may be suggested for the directive"""
+    value_type = get_value_type(directive)
+    if value_type == ValueType.enumeration:
+        return systemd_enum_directive_values[directive]
+    if value_type == ValueType.boolean:
+        return systemd_boolean_values
+    if value_type == ValueType.timespan:
+        return ("infinity",)
+    if value_type == ValueType.signal:
+        return systemd_signals
+    if value_type == ValueType.capability:
+        return systemd_capabilities
+    if value_type == ValueType.syscall:
+        return get_syscall_groups()
+    if value_type == ValueType.unit_name:
+        return systemd_special_units
+    return ()
+
+
+def check_value(
+    directive: str, value: str, section: UnitFileSection | None = None
+) -> str | None:
+    """Why value is invalid for directive, None if it's valid or can't be checked.
+    Only values of closed types are checked: booleans, enumerations and time spans."""
+    if directive.startswith(("Condition", "Assert")):
+        value = value.lstrip("|!")
+    #  empty values reset directives, and specifiers are only expanded by systemd
+    if not value or "%" in value:
+        return None
+    value_type = get_value_type(directive)
+    if value_type == ValueType.boolean:
+        if value.lower() not in boolean_values:
+            return f"{directive}= takes a boolean, not {value!r}"
+    elif value_type == ValueType.enumeration:
+        if enum_directive_sections.get(directive, section) != section:
+            return None
+        values = systemd_enum_directive_values[directive]
+        #  enumerations are not exhaustive of prefixed values like StandardOutput=file:...
+        #  or numeric values like IOSchedulingClass=2, and those containing "yes" also
+        #  accept the other spellings of booleans
+        if (
+            value not in values
+            and ":" not in value
+            and not value.isdigit()
+            and not ("yes" in values and value.lower() in boolean_values)
+        ):
+            return f"{directive}= takes one of {', '.join(values)}, not {value!r}"
+    elif value_type == ValueType.timespan:
+        if value != "infinity" and not is_timespan(value):
+            return f"{directive}= takes a time span, not {value!r}"
+    return None
+
+
+def is_timespan(value: str) -> bool:
+    position = 0
+    value = value.rstrip()
+    while position < len(value):
+        match = TIMESPAN_TERM_PROG.match(value, position)
+        if match is None:
+            return False
+        unit = match.group("unit")
+        if unit and unit not in timespan_unit_names:
+            return False
+        position = match.end()
+    return True
@@ -0,0 +1,382 @@
+"""Latency benchmarks of the hot paths of the language server: completion, hover, document
+sync, parsing and section lookup, on synthetic units of 10 to 10,000 lines. Requests are
+sent to a real server over the pipes used by the test suite. Results can be saved as JSON
+and compared with those of another release:
+
+    python -m tests.benchmark --output new.json --compare old.json
+
+With --memory, the memory held for the unit files of a tree is also measured, per
+directive:
+
+    python -m tests.benchmark --memory /usr/lib/systemd/system
+"""
+
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from importlib import metadata
+from pathlib import Path
+from typing import Callable
+
+from lsprotocol.types import (
+    INITIALIZE,
+    TEXT_DOCUMENT_COMPLETION,
+    TEXT_DOCUMENT_DID_CHANGE,
+    TEXT_DOCUMENT_DID_OPEN,
+    TEXT_DOCUMENT_HOVER,
+    ClientCapabilities,
+    CompletionParams,
+    DidChangeTextDocumentParams,
+    DidOpenTextDocumentParams,
+    HoverParams,
+    InitializeParams,
+    Position,
+    Range,
+    TextDocumentContentChangeEvent_Type1,
+    TextDocumentContentChangeEvent_Type2,
+    TextDocumentIdentifier,
+    TextDocumentItem,
+    VersionedTextDocumentIdentifier,
+)
+from pygls.server import LanguageServer
+
+import systemd_language_server.server as server_module
+from systemd_language_server import markdown
+from systemd_language_server.effective import EffectiveConfigCache
+from systemd_language_server.graph import DependencyGraph
+from systemd_language_server.index import UnitIndex
+from systemd_language_server.parser import LineKind, UnitFile
+from systemd_language_server.server import SystemdLanguageServer
+from systemd_language_server.symbols import SymbolIndex
+from systemd_language_server.unit import find_documentation
+
+from .utils import serve_over_pipes
+
+SIZES = (10, 100, 1000, 10000)
+ITERATIONS = 100
+WARMUP = 5
+#  ratio of median latencies over which a benchmark is reported as a regression
+THRESHOLD = 1.25
+TIMEOUT = 10
+
+#  directives repeated to fill the [Service] section of synthetic units
+FILLER = [
+    "Environment=VAR{i}=value{i}\n",
+    "ExecStartPre=/bin/echo {i}\n",
+    "# comment {i}\n",
+    "LimitNOFILE={i}\n",
+    "Restart=on-failure\n",
+    "TimeoutStartSec={i}s\n",
+]
+
+
+def synthetic_unit(size: int) -> list[str]:
+    """Lines of a service unit of the given number of lines (at least 10)"""
+    head = [
+        "[Unit]\n",
+        "Description=Synthetic unit\n",
+        "After=network.target\n",
+        "\n",
+        "[Service]\n",
+        "Type=simple\n",
+        "ExecStart=/usr/bin/true\n",
+    ]
+    tail = ["\n", "[Install]\n", "WantedBy=multi-user.target\n"]
+    body = [
+        FILLER[i % len(FILLER)].format(i=i) for i in range(size - len(head) - len(tail))
+    ]
+    return head + body + tail
+
+
+def directive_line(lines: list[str]) -> int:
+    """A line in the middle of the unit holding a directive"""
+    line = len(lines) // 2
+    while lines[line].startswith(("#", "\n", "[")):
+        line -= 1
+    return line
+
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    """Statistics of latencies in seconds, in milliseconds"""
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p90_ms": quantiles[89] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "min_ms": min(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def measure(operation: Callable[[int], object], iterations: int) -> dict[str, float]:
+    for i in range(WARMUP):
+        operation(i)
+    latencies = []
+    for i in range(WARMUP, WARMUP + iterations):
+        start = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+class Session:
+    """A document open in a server driven over pipes"""
+
+    def __init__(
+        self, client: LanguageServer, server: SystemdLanguageServer, root: Path
+    ):
+        self.client, self.server = client, server
+        self.uri = (root / "synthetic.service").as_uri()
+        self.version = 1
+        #  keep diagnostics runs, which are debounced, out of the measurements
+        server.diagnostics_delay = 3600
+        server.index_search_paths = False
+        client.lsp.send_request(
+            INITIALIZE,
+            InitializeParams(
+                process_id=None,
+                root_uri=root.as_uri(),
+                capabilities=ClientCapabilities(),
+            ),
+        ).result(timeout=TIMEOUT)
+
+    def request(self, method: str, params):
+        return self.client.lsp.send_request(method, params).result(timeout=TIMEOUT)
+
+    def open(self, lines: list[str]):
+        self.version += 1
+        self.client.lsp.notify(
+            TEXT_DOCUMENT_DID_OPEN,
+            DidOpenTextDocumentParams(
+                TextDocumentItem(
+                    uri=self.uri,
+                    language_id="systemd",
+                    version=self.version,
+                    text="".join(lines),
+                )
+            ),
+        )
+
+    def change(self, changes: list):
+        self.version += 1
+        self.client.lsp.notify(
+            TEXT_DOCUMENT_DID_CHANGE,
+            DidChangeTextDocumentParams(
+                text_document=VersionedTextDocumentIdentifier(
+                    uri=self.uri, version=self.version
+                ),
+                content_changes=changes,
+            ),
+        )
+        #  notifications aren't answered: wait for the change to be applied with a
+        #  request on the section header, which returns right away
+        self.hover(Position(0, 0))
+
+    def completion(self, position: Position):
+        return self.request(
+            TEXT_DOCUMENT_COMPLETION,
+            CompletionParams(TextDocumentIdentifier(uri=self.uri), position),
+        )
+
+    def hover(self, position: Position):
+        return self.request(
+            TEXT_DOCUMENT_HOVER,
+            HoverParams(TextDocumentIdentifier(uri=self.uri), position),
+        )
+
+
+def unconverted_documentation(*args):
+    """Documentation of a directive without the markdown of the bundle, for hovers to
+    convert it"""
+    documentation = find_documentation(*args)
+    return documentation and documentation._replace(markdown=None)
+
+
+def run_benchmarks(
+    sizes=SIZES, iterations: int = ITERATIONS
+) -> dict[str, dict[str, float]]:
+    """Statistics of each benchmark, keyed by benchmark/size"""
+    results = dict()
+    with tempfile.TemporaryDirectory() as root, serve_over_pipes() as (
+        client,
+        server,
+    ):
+        session = Session(client, server, Path(root))
+        for size in sizes:
+            lines = synthetic_unit(size)
+            line = directive_line(lines)
+            session.open(lines)
+            #  parse once, so the server holds the document
+            session.hover(Position(0, 0))
+
+            def edit(i: int):
+                character = lines[line].index("=") + 1
+                session.change(
+                    [
+                        TextDocumentContentChangeEvent_Type1(
+                            range=Range(
+                                Position(line, character), Position(line, character + 1)
+                            ),
+                            text=lines[line][character],
+                        )
+                    ]
+                )
+
+            def full_sync(i: int):
+                session.change([TextDocumentContentChangeEvent_Type2("".join(lines))])
+
+            def hover(i: int):
+                server.has_pandoc = False
+                session.hover(Position(line, 1))
+
+            def hover_pandoc(i: int):
+                #  the bundle holds markdown already, and conversions are cached in
+                #  memory and on disk: each hover converts again, with a fresh cache
+                markdown.memory_cache.clear()
+                cache_home = os.environ.get("XDG_CACHE_HOME")
+                os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp(dir=root)
+                server_module.find_documentation = unconverted_documentation
+                server.has_pandoc = True
+                try:
+                    session.hover(Position(line, 1))
+                finally:
+                    server_module.find_documentation = find_documentation
+                    if cache_home is None:
+                        del os.environ["XDG_CACHE_HOME"]
+                    else:
+                        os.environ["XDG_CACHE_HOME"] = cache_home
+
+            unit_file = UnitFile(session.uri, lines)
+            benchmarks = {
+                "completion": lambda i: session.completion(Position(line, 0)),
+                "hover": hover,
+                "sync-incremental": edit,
+                "sync-full": full_sync,
+                "parse": lambda i: UnitFile(session.uri, lines),
+                "section-lookup": lambda i: unit_file.section_at(i % size),
+            }
+            if markdown.pandoc_version() is not None:
+                benchmarks["hover-pandoc"] = hover_pandoc
+            for name, operation in benchmarks.items():
+                results[f"{name}/{size}"] = measure(operation, iterations)
+    return results
+
+
+def measure_memory(roots: list[Path]) -> dict[str, float]:
+    """Memory held for the unit files under roots by the effective configurations, the
+    dependency graph and the symbol index, in all and per directive"""
+    index = UnitIndex()
+    index.roots = [root.absolute() for root in roots]
+    index.walk()
+    tracemalloc.start()
+    try:
+        configs = EffectiveConfigCache(index)
+        graph = DependencyGraph()
+        graph.refresh(list(index.units), configs)
+        symbols = SymbolIndex(index)
+        symbols.refresh()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    directives = 0
+    for path in symbols.files:
+        try:
+            lines = path.read_text().splitlines(True)
+        except (OSError, UnicodeDecodeError):
+            continue
+        unit_file = UnitFile(path.as_uri(), lines)
+        directives += sum(line.kind == LineKind.directive for line in unit_file.lines)
+    return {
+        "files": len(symbols.files),
+        "directives": directives,
+        "bytes": size,
+        "bytes_per_directive": size / max(directives, 1),
+    }
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float = THRESHOLD,
+) -> list[tuple[str, float, bool]]:
+    """Ratio of the median latency of each benchmark to that of the baseline, and whether
+    it exceeds the threshold"""
+    ratios = []
+    for key, stats in results.items():
+        if key in baseline and baseline[key]["p50_ms"] > 0:
+            ratio = stats["p50_ms"] / baseline[key]["p50_ms"]
+            ratios.append((key, ratio, ratio > threshold))
+    return ratios
+
+
+def package_version() -> str:
+    try:
+        return metadata.version("systemd-language-server")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = ArgumentParser(prog="python -m tests.benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--output", type=Path, help="save results as JSON")
+    parser.add_argument(
+        "--compare", type=Path, help="compare with results saved with --output"
+    )
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument(
+        "--memory",
+        type=Path,
+        nargs="+",
+        metavar="ROOT",
+        help="measure the memory held for the unit files under the roots",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.iterations)
+    print(f"{'benchmark':<28}{'p50':>10}{'p90':>10}{'p99':>10}  (ms)")
+    for key, stats in results.items():
+        print(
+            f"{key:<28}{stats['p50_ms']:>10.3f}{stats['p90_ms']:>10.3f}"
+            f"{stats['p99_ms']:>10.3f}"
+        )
+    memory = None
+    if args.memory is not None:
+        memory = measure_memory(args.memory)
+        print(
+            f"\nmemory: {memory['bytes'] / 2**20:.1f} MiB for {memory['files']} files, "
+            f"{memory['bytes_per_directive']:.0f} bytes per directive"
+        )
+    if args.output is not None:
+        report = {
+            "version": package_version(),
+            "python": platform.python_version(),
+            "iterations": args.iterations,
+            "results": results,
+        }
+        if memory is not None:
+            report["memory"] = memory
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        ratios = compare(results, baseline["results"], args.threshold)
+        print(f"\ncompared with {baseline['version']}:")
+        for key, ratio, regressed in ratios:
+            print(f"{key:<28}{ratio:>9.2f}x{'  REGRESSION' if regressed else ''}")
+        if any(regressed for _, _, regressed in ratios):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
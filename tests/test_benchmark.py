@@ -0,0 +1,38 @@
+import json
+from pathlib import Path
+
+from .benchmark import compare, main, measure_memory, synthetic_unit
+
+
+def test_synthetic_unit():
+    assert len(synthetic_unit(10)) == 10
+    assert len(synthetic_unit(1000)) == 1000
+
+
+def test_compare():
+    baseline = {"hover/10": {"p50_ms": 1.0}, "parse/10": {"p50_ms": 1.0}}
+    results = {"hover/10": {"p50_ms": 1.1}, "parse/10": {"p50_ms": 2.0}}
+    assert compare(results, baseline) == [
+        ("hover/10", 1.1, False),
+        ("parse/10", 2.0, True),
+    ]
+
+
+def test_benchmark(tmp_path: Path):
+    """The suite runs, and saves results which it can be compared with"""
+    output = tmp_path / "results.json"
+    argv = ["--sizes", "10", "--iterations", "2", "--output", str(output)]
+    assert main(argv) == 0
+    report = json.loads(output.read_text())
+    assert set(report["results"]) >= {"completion/10", "hover/10", "sync-full/10"}
+    assert main(argv + ["--compare", str(output), "--threshold", "1000"]) == 0
+
+
+def test_memory(tmp_path: Path):
+    """Parsed units are held compactly"""
+    for i in range(50):
+        (tmp_path / f"unit{i}.service").write_text("".join(synthetic_unit(100)))
+    memory = measure_memory([tmp_path])
+    assert memory["files"] == 50
+    assert memory["directives"] == 50 * 80
+    assert memory["bytes_per_directive"] < 1000
@@ -0,0 +1,74 @@
+import json
+from io import StringIO
+from pathlib import Path
+
+import pytest
+
+from systemd_language_server import check
+from systemd_language_server.server import get_parser
+
+
+def run_check(*argv: str) -> tuple[int, str]:
+    output = StringIO()
+    exit_code = check.check(get_parser().parse_args(["check", *argv]), output)
+    return exit_code, output.getvalue()
+
+
+@pytest.fixture()
+def units(tmp_path: Path) -> Path:
+    (tmp_path / "good.service").write_text("[Service]\nExecStart=/bin/true\n")
+    (tmp_path / "good.service.d").mkdir()
+    (tmp_path / "good.service.d" / "override.conf").write_text("[Service]\nNice=5\n")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "bad.socket").write_text("[Socket]\nAccept=maybe\n")
+    (tmp_path / "README").write_text("not a unit file\n")
+    return tmp_path
+
+
+def test_check_text(units: Path):
+    assert run_check(str(units / "good.service")) == (0, "")
+    exit_code, output = run_check(str(units))
+    assert exit_code == 1
+    assert output == (
+        f"{units / 'sub' / 'bad.socket'}:2:8: warning: "
+        "Accept= takes a boolean, not 'maybe' [invalid-value]\n"
+    )
+    assert run_check(str(units / "missing.service"))[0] == 2
+
+
+def test_check_dropins(units: Path):
+    """Drop-ins found in directories are checked as parts of the units they extend"""
+    dropins = units / "good.service.d"
+    assert dropins / "override.conf" in check.collect_unit_files([units])
+    (dropins / "bad.conf").write_text("[Service]\nAccept=yes\n")
+    exit_code, output = run_check(str(dropins))
+    assert exit_code == 1
+    assert "bad.conf:2:1" in output
+    assert "Accept= is not valid in section [Service]" in output
+
+
+def test_check_json(units: Path):
+    exit_code, output = run_check("--format", "json", str(units))
+    assert exit_code == 1
+    (problem,) = json.loads(output)
+    assert problem["path"] == str(units / "sub" / "bad.socket")
+    assert (problem["line"], problem["column"]) == (2, 8)
+    assert problem["severity"] == "warning"
+
+
+def test_check_sarif(units: Path):
+    exit_code, output = run_check("--format", "sarif", str(units))
+    assert exit_code == 1
+    (run,) = json.loads(output)["runs"]
+    assert run["tool"]["driver"]["rules"] == [{"id": "invalid-value"}]
+    (result,) = run["results"]
+    assert result["level"] == "warning"
+    region = result["locations"][0]["physicalLocation"]["region"]
+    assert (region["startLine"], region["startColumn"]) == (2, 8)
+
+
+def test_check_process_pool(units: Path, monkeypatch: pytest.MonkeyPatch):
+    paths = check.collect_unit_files([units])
+    inline = check.check_files(paths, jobs=1)
+    monkeypatch.setattr(check, "POOL_THRESHOLD", 0)
+    assert check.check_files(paths, jobs=2) == inline
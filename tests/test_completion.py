@@ -0,0 +1,87 @@
+from systemd_language_server.completion import (
+    DirectiveIndex,
+    complete_value,
+    get_completion_index,
+    match_humps,
+    split_humps,
+    value_token_start,
+)
+from systemd_language_server.unit import UnitFileSection, UnitType
+from systemd_language_server.values import ValueType, check_value, get_value_type
+
+
+def test_split_humps():
+    assert split_humps("ExecStart") == ("exec", "start")
+    assert split_humps("CPUQuota") == ("cpu", "quota")
+    assert split_humps("IPAddressAllow") == ("ip", "address", "allow")
+
+
+def test_match_humps():
+    humps = split_humps("ExecStartPre")
+    assert match_humps("exst", humps)
+    assert match_humps("execstp", humps)
+    assert match_humps("esp", humps)
+    assert not match_humps("xs", humps)
+    assert not match_humps("prest", humps)
+
+
+def test_directive_index_ranking():
+    index = DirectiveIndex(("ExecStart", "ExecStop", "execute", "RestartSec"))
+    labels = [item.label for item in index.complete("exec")]
+    #  case-sensitive prefix matches rank above case-insensitive ones
+    assert labels == ["execute", "ExecStart", "ExecStop"]
+    labels = [item.label for item in index.complete("ReSe")]
+    assert labels == ["RestartSec"]
+    #  items are reused between requests
+    assert index.complete("ExecSta")[0] is index.complete("ExecSt")[0]
+
+
+def test_get_completion_index_cached():
+    index = get_completion_index(UnitType.service, UnitFileSection.service)
+    assert index is get_completion_index(UnitType.service, UnitFileSection.service)
+    assert index.complete("") is index.all_items
+
+
+def test_value_token_start():
+    assert value_token_start("Type", " simple") == 1
+    assert value_token_start("After", "a.service b.serv") == 10
+    assert value_token_start("SystemCallFilter", "@basic-io ~@mo") == 11
+
+
+def test_complete_value():
+    labels = [item.label for item in complete_value("Restart", "on-")]
+    assert labels[:2] == ["on-abnormal", "on-abort"]
+    assert "always" not in labels
+    assert [item.label for item in complete_value("PrivateTmp", "y")] == ["yes"]
+    assert "5min" in [item.label for item in complete_value("RestartSec", "5")]
+    assert "@system-service" in [
+        item.label for item in complete_value("SystemCallFilter", "@sys")
+    ]
+    assert complete_value("Description", "") == ()
+
+
+def test_complete_value_section():
+    """Types of services are only completed in [Service]"""
+    service = UnitFileSection.service
+    assert "simple" in [item.label for item in complete_value("Type", "", service)]
+    assert complete_value("Type", "", UnitFileSection.mount) == ()
+    assert complete_value("Type", "", UnitFileSection.socket) == ()
+
+
+def test_value_schema():
+    #  recognized from the docbooks
+    assert get_value_type("PrivateTmp") == ValueType.boolean
+    #  declared in constants
+    assert get_value_type("TimeoutStartSec") == ValueType.timespan
+    assert get_value_type("KillMode") == ValueType.enumeration
+    assert get_value_type("Wants") == ValueType.unit_name
+    assert get_value_type("Description") is None
+
+
+def test_check_value():
+    assert check_value("RestartSec", "5min 20s") is None
+    assert check_value("RestartSec", "soon") is not None
+    #  suffixed "Sec", but taking a device and a time span
+    assert check_value("IODeviceLatencyTargetSec", "/dev/sda 25ms") is None
+    for value in ("us", "usec", "μs", "ns", "nsec"):
+        assert check_value("Timestamping", value) is None
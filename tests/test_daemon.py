@@ -0,0 +1,124 @@
+import json
+import socket
+import sys
+from pathlib import Path
+from threading import Thread
+
+import pytest
+
+from systemd_language_server.daemon import Daemon
+from systemd_language_server.server import address, is_loopback, main
+
+TIMEOUT = 10
+
+
+class Client:
+    """Client of a daemon over TCP, speaking JSON-RPC by hand"""
+
+    def __init__(self, port: int):
+        self.socket = socket.create_connection(("127.0.0.1", port), timeout=TIMEOUT)
+        self.file = self.socket.makefile("rb")
+        self.next_id = 0
+
+    def send(self, message: dict):
+        body = json.dumps({"jsonrpc": "2.0", **message}).encode()
+        self.socket.sendall(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+
+    def receive(self) -> dict:
+        length = 0
+        while (line := self.file.readline().strip()) != b"":
+            name, _, value = line.partition(b":")
+            if name.lower() == b"content-length":
+                length = int(value)
+        return json.loads(self.file.read(length))
+
+    def request(self, method: str, params) -> dict:
+        self.next_id += 1
+        self.send({"id": self.next_id, "method": method, "params": params})
+        while True:
+            message = self.receive()
+            if message.get("id") == self.next_id and "method" not in message:
+                return message
+
+    def initialize(self, root: Path):
+        self.request(
+            "initialize",
+            {"processId": None, "rootUri": root.as_uri(), "capabilities": {}},
+        )
+        self.send({"method": "initialized", "params": {}})
+
+    def open(self, uri: str, text: str):
+        self.send(
+            {
+                "method": "textDocument/didOpen",
+                "params": {
+                    "textDocument": {
+                        "uri": uri,
+                        "languageId": "systemd",
+                        "version": 1,
+                        "text": text,
+                    }
+                },
+            }
+        )
+
+    def hover(self, uri: str, line: int, character: int) -> dict:
+        return self.request(
+            "textDocument/hover",
+            {
+                "textDocument": {"uri": uri},
+                "position": {"line": line, "character": character},
+            },
+        )
+
+    def exit(self):
+        self.request("shutdown", None)
+        self.send({"method": "exit"})
+        #  the daemon closes the connection
+        assert self.file.read() == b""
+        self.socket.close()
+
+
+def test_address():
+    assert address("localhost:2087") == ("localhost", 2087)
+    assert address("[::1]:2087") == ("::1", 2087)
+    assert address("2087") == ("127.0.0.1", 2087)
+    assert is_loopback("localhost") and is_loopback("::1")
+    assert not is_loopback("0.0.0.0") and not is_loopback("example.com")
+
+
+def test_remote_address_refused(monkeypatch: pytest.MonkeyPatch):
+    """Listening where other hosts can connect takes --allow-remote"""
+    monkeypatch.setattr(sys, "argv", ["systemd-language-server", "--tcp", "0.0.0.0:0"])
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == 2
+
+
+def test_daemon_sessions(tmp_path: Path):
+    daemon = Daemon()
+    listener = daemon.listen_tcp("127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    thread = Thread(target=daemon.serve_forever, args=[listener])
+    thread.start()
+    try:
+        uri = (tmp_path / "foo.service").as_uri()
+        first, second = Client(port), Client(port)
+        for client in (first, second):
+            client.initialize(tmp_path)
+        #  each session holds the documents of its own client
+        first.open(uri, "[Service]\nType=simple\n")
+        second.open(uri, "[Unit]\nDescription=foo\n")
+        assert "Type" in first.hover(uri, 1, 1)["result"]["contents"]["value"]
+        assert "Description" in second.hover(uri, 1, 1)["result"]["contents"]["value"]
+        assert len(daemon.sessions) == 2
+
+        #  the exit of a client only ends its session
+        first.exit()
+        assert "Description" in second.hover(uri, 1, 1)["result"]["contents"]["value"]
+        assert len(daemon.sessions) == 1
+        second.exit()
+    finally:
+        daemon.loop.call_soon_threadsafe(daemon.loop.stop)
+        thread.join()
+    assert not daemon.sessions
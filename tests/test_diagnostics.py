@@ -0,0 +1,66 @@
+from lsprotocol.types import Position, Range, TextDocumentContentChangeEvent_Type1
+
+from systemd_language_server.diagnostics import DiagnosticsCache
+from systemd_language_server.parser import UnitFile
+
+from .utils import apply_change
+
+UNIT_FILE = """\
+[Unit]
+Description=Test service
+Bogus=1
+
+[Service]
+Type=simple
+Restart=sometimes
+TimeoutStopSec=5min 20s
+RuntimeMaxSec=forever
+PrivateTmp=maybe
+WantedBy=multi-user.target
+X-Custom=ignored
+
+[Mount]
+What=/dev/sda1
+
+[Frobnicate]
+Foo=bar
+"""
+
+
+def messages(diagnostics) -> list[tuple[int, str]]:
+    return [(d.range.start.line, d.message) for d in diagnostics]
+
+
+def test_diagnose():
+    unit_file = UnitFile("file:///test.service", UNIT_FILE.splitlines(True))
+    diagnostics = DiagnosticsCache().diagnose(unit_file)
+    assert [line for line, _ in messages(diagnostics)] == [2, 6, 8, 9, 10, 13, 16]
+    by_line = dict(messages(diagnostics))
+    assert by_line[2] == "Unknown directive Bogus="
+    assert by_line[6].startswith("Restart= takes one of")
+    assert by_line[8] == "RuntimeMaxSec= takes a time span, not 'forever'"
+    assert by_line[9] == "PrivateTmp= takes a boolean, not 'maybe'"
+    assert by_line[10] == "WantedBy= is not valid in section [Service]"
+    assert by_line[13] == "Section [Mount] is not valid in .service units"
+    assert by_line[16] == "Unknown section [Frobnicate]"
+    assert diagnostics[0].range == Range(Position(2, 0), Position(2, 5))
+    assert diagnostics[1].range == Range(Position(6, 8), Position(6, 17))
+
+
+def test_diagnose_incremental():
+    """Only changed sections are checked again, and diagnostics of others move along"""
+    lines = UNIT_FILE.splitlines(True)
+    unit_file = UnitFile("file:///test.service", lines, 0)
+    cache = DiagnosticsCache()
+    before = messages(cache.diagnose(unit_file))
+    assert cache.checked == 4
+
+    change = TextDocumentContentChangeEvent_Type1(
+        range=Range(Position(1, 0), Position(1, 0)), text="Documentation=man:foo(1)\n"
+    )
+    lines = apply_change(lines, change)
+    unit_file.apply_changes([change], lines, 1)
+    after = messages(cache.diagnose(unit_file))
+    assert cache.checked == 1
+    assert after == [(line + 1, message) for line, message in before]
+    assert after == messages(DiagnosticsCache().diagnose(unit_file))
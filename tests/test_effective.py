@@ -0,0 +1,54 @@
+import os
+from pathlib import Path
+
+from systemd_language_server.effective import EffectiveConfigCache
+from systemd_language_server.index import UnitIndex
+from systemd_language_server.parser import UnitFile
+
+
+def write(path: Path, text: str) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def test_effective_config(tmp_path: Path):
+    unit = write(
+        tmp_path / "foo.service",
+        "[Service]\nExecStart=/bin/foo\nEnvironment=A=1\nRestart=no\n",
+    )
+    override = write(
+        tmp_path / "foo.service.d" / "override.conf",
+        "[Service]\nExecStart=\nExecStart=/bin/bar\nEnvironment=B=2\n",
+    )
+    index = UnitIndex()
+    index.roots = [tmp_path]
+    index.walk()
+    cache = EffectiveConfigCache(index)
+
+    config = cache.get("foo.service")
+    assert config is not None
+    assert config.values("Service", "ExecStart") == ["/bin/bar"]
+    assert config.values("Service", "Environment") == ["A=1", "B=2"]
+    assert config.values("Service", "Restart") == ["no"]
+    (reset, exec_start) = config.get("Service", "ExecStart")
+    assert reset.value == "" and reset.uri == override.as_uri()
+    assert exec_start.line == 2
+    assert cache.get("missing.service") is None
+
+    #  unchanged files are served from the cache, changed ones are parsed again
+    assert cache.get("foo.service") is config
+    write(override, "[Service]\nRestart=always\n")
+    os.utime(override, ns=(0, 0))
+    config = cache.get("foo.service")
+    assert config is not None
+    assert config.values("Service", "ExecStart") == ["/bin/foo"]
+    #  directives taking a single value take the last one
+    assert config.values("Service", "Restart") == ["always"]
+
+    #  open documents take precedence over files on disk
+    open_unit = UnitFile(unit.as_uri(), ["[Service]\n", "Restart=on-failure\n"], 3)
+    config = cache.get("foo.service", {unit.as_uri(): open_unit})
+    assert config is not None
+    assert config.values("Service", "Restart") == ["always"]
+    assert config.values("Service", "ExecStart") == []
@@ -0,0 +1,93 @@
+from pathlib import Path
+
+from systemd_language_server.effective import EffectiveConfigCache
+from systemd_language_server.graph import DependencyGraph
+from systemd_language_server.index import UnitIndex
+
+
+def make_graph(root: Path, units: dict[str, str]) -> tuple[DependencyGraph, UnitIndex]:
+    for name, text in units.items():
+        (root / name).write_text(text)
+    index = UnitIndex()
+    index.roots = [root]
+    index.walk()
+    graph = DependencyGraph()
+    graph.refresh(index.units, EffectiveConfigCache(index))
+    return graph, index
+
+
+def test_ordering_cycles(tmp_path: Path):
+    graph, _ = make_graph(
+        tmp_path,
+        {
+            "a.service": "[Unit]\nAfter=b.service\nWants=b.service\n",
+            "b.service": "[Unit]\nAfter=c.service\n",
+            "c.service": "[Unit]\n",
+            "d.service": "[Unit]\nBefore=c.service\nAfter=b.service\n",
+            "e.service": "[Unit]\nAfter=e.service\n",
+        },
+    )
+    cycles = graph.ordering_cycles()
+    assert sorted(cycles) == ["b.service", "c.service", "d.service", "e.service"]
+    assert graph.ordering_cycle("b.service") == [
+        "b.service",
+        "c.service",
+        "d.service",
+        "b.service",
+    ]
+    assert graph.ordering_cycle("e.service") == ["e.service", "e.service"]
+    assert graph.ordering_cycle("a.service") is None
+
+
+def test_refresh(tmp_path: Path):
+    graph, index = make_graph(
+        tmp_path,
+        {
+            "a.service": "[Unit]\nAfter=b.service\n",
+            "b.service": "[Unit]\nAfter=a.service\n",
+        },
+    )
+    configs = EffectiveConfigCache(index)
+    graph.refresh(index.units, configs)
+    assert "a.service" in graph.ordering_cycles()
+
+    generation = graph.generation
+    graph.refresh(index.units, configs)
+    assert graph.generation == generation
+
+    override = tmp_path / "b.service.d" / "override.conf"
+    override.parent.mkdir()
+    override.write_text("[Unit]\nAfter=\n")
+    index.add(override)
+    #  changes are found without changing the graph, then applied
+    changes = graph.changes(index.units, configs)
+    assert set(changes) == {"b.service"}
+    assert graph.generation == generation
+    graph.apply(changes)
+    assert graph.generation > generation
+    assert graph.ordering_cycles() == {}
+
+    index.remove(tmp_path / "a.service")
+    graph.refresh(index.units, configs)
+    assert "a.service" not in graph.edges
+    assert "a.service" not in graph.reverse
+
+
+def test_subgraph(tmp_path: Path):
+    graph, _ = make_graph(
+        tmp_path,
+        {
+            "a.service": "[Unit]\nRequires=b.service\n",
+            "b.service": "[Unit]\nWants=c.service\n",
+            "c.service": "[Unit]\n",
+        },
+    )
+    assert graph.subgraph("b.service") == {
+        "nodes": ["a.service", "b.service", "c.service"],
+        "edges": [
+            {"from": "a.service", "kind": "Requires", "to": "b.service"},
+            {"from": "b.service", "kind": "Wants", "to": "c.service"},
+        ],
+    }
+    assert graph.subgraph("a.service")["nodes"] == ["a.service", "b.service"]
+    assert len(graph.subgraph("a.service", depth=2)["nodes"]) == 3
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+from systemd_language_server.index import (
+    UnitIndex,
+    dropin_directories,
+    template_name,
+    unit_name,
+)
+
+
+def make_units(root: Path, *names: str) -> list[Path]:
+    paths = []
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("[Unit]\n")
+        paths.append(path)
+    return paths
+
+
+def test_template_name():
+    assert template_name("getty@tty1.service") == "getty@.service"
+    assert template_name("getty@.service") is None
+    assert template_name("getty.service") is None
+
+
+def test_scan(tmp_path: Path):
+    workspace, system = tmp_path / "workspace", tmp_path / "system"
+    app, getty, _, _ = make_units(
+        workspace,
+        "app.service",
+        "sub/getty@.service",
+        ".git/ignored.service",
+        "multi-user.target.wants/app.service",
+    )
+    system_app, _ = make_units(system, "app.service", "README")
+
+    index = UnitIndex()
+    index.roots = [workspace, system]
+    index.walk()
+    assert sorted(index.units) == ["app.service", "getty@.service"]
+    assert index.lookup("app.service") == [app, system_app]
+    assert index.lookup("getty@tty1.service") == [getty]
+    assert index.lookup("missing.service") == []
+
+    labels = {item.label for item in index.completion_index().complete("ap")}
+    assert labels == {"app.service"}
+
+    index.remove(app)
+    index.remove(system_app)
+    assert index.lookup("app.service") == []
+    assert "app.service" not in index.completion_index().labels
+
+    (new,) = make_units(workspace, "new.socket")
+    index.add(new)
+    assert index.lookup("new.socket") == [new]
+    assert "new.socket" in index.completion_index().labels
+
+
+def test_dropin_directories():
+    assert dropin_directories("foo-bar@baz.service") == [
+        "service.d",
+        "foo-.service.d",
+        "foo-bar@.service.d",
+        "foo-bar@baz.service.d",
+    ]
+    assert unit_name(Path("/etc/foo.service.d/override.conf")) == "foo.service"
+    assert unit_name(Path("/etc/service.d/override.conf")) is None
+    assert unit_name(Path("/etc/foo.service")) == "foo.service"
+    assert unit_name(Path("/etc/foo.conf")) is None
+
+
+def test_lookup_dropins(tmp_path: Path):
+    etc, lib = tmp_path / "etc", tmp_path / "lib"
+    etc_override, etc_all, _, _ = make_units(
+        etc,
+        "foo@.service.d/50-override.conf",
+        "service.d/10-all.conf",
+        "foo@bar.service.d/README",
+        "bar.service.d/10-other.conf",
+    )
+    lib_instance, lib_override = make_units(
+        lib, "foo@bar.service.d/20-instance.conf", "foo@.service.d/50-override.conf"
+    )
+
+    index = UnitIndex()
+    index.roots = [etc, lib]
+    index.walk()
+    assert index.lookup_dropins("foo@bar.service") == [
+        etc_all,
+        lib_instance,
+        etc_override,
+    ]
+    index.remove(etc_override)
+    assert index.lookup_dropins("foo@bar.service")[-1] == lib_override
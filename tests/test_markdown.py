@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+
+from systemd_language_server import markdown
+from systemd_language_server.markdown import (
+    convert_to_markdown,
+    convert_to_markdown_async,
+    convert_to_markdown_batch,
+    docbook_to_markdown,
+)
+
+VARLISTENTRY = b"""<varlistentry>
+  <term><varname>KillMode=</varname></term>
+  <listitem><para>Specifies how processes of this unit shall be killed. One of
+  <option>control-group</option>, <option>mixed</option>.</para>
+
+  <para>See <citerefentry><refentrytitle>kill</refentrytitle><manvolnum>2</manvolnum>
+  </citerefentry> and the list:
+  <itemizedlist>
+    <listitem><para>first</para></listitem>
+    <listitem><para>second</para></listitem>
+  </itemizedlist></para>
+
+  <programlisting>[Service]
+KillMode=mixed</programlisting></listitem>
+</varlistentry>"""
+
+
+def test_docbook_to_markdown():
+    assert docbook_to_markdown(VARLISTENTRY) == (
+        "`KillMode=`\n\n"
+        "Specifies how processes of this unit shall be killed. One of "
+        "`control-group`, `mixed`.\n\n"
+        "See kill(2) and the list:\n\n"
+        "- first\n- second\n\n"
+        "```\n[Service]\nKillMode=mixed\n```\n"
+    )
+
+
+@pytest.fixture()
+def markdown_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    markdown.memory_cache.clear()
+    yield tmp_path
+    markdown.memory_cache.clear()
+
+
+def test_convert_to_markdown_disk_cache(markdown_cache, monkeypatch):
+    calls = []
+
+    def fake_pandoc(raw_varlistentry):
+        calls.append(raw_varlistentry)
+        return "rendered by pandoc\n"
+
+    monkeypatch.setattr(markdown, "pandoc_version", lambda: "1.0")
+    monkeypatch.setattr(markdown, "pandoc_to_markdown", fake_pandoc)
+    assert convert_to_markdown(VARLISTENTRY) == "rendered by pandoc\n"
+    assert len(list(markdown_cache.rglob("*.md"))) == 1
+    assert not list(markdown_cache.rglob("*.tmp"))
+
+    #  served from disk in a fresh process, i.e. after clearing the memory cache
+    markdown.memory_cache.clear()
+    assert convert_to_markdown(VARLISTENTRY) == "rendered by pandoc\n"
+    assert len(calls) == 1
+
+
+def test_convert_to_markdown_without_pandoc(markdown_cache, monkeypatch):
+    monkeypatch.setattr(markdown, "pandoc_version", lambda: None)
+    assert convert_to_markdown(VARLISTENTRY) == docbook_to_markdown(VARLISTENTRY)
+    assert list(markdown_cache.rglob("*.md")) == []
+
+
+def test_convert_to_markdown_batch(markdown_cache, monkeypatch):
+    if markdown.pandoc_version() is None:
+        pytest.skip("pandoc not found")
+    entries = [VARLISTENTRY, VARLISTENTRY.replace(b"KillMode", b"KillSignal")]
+    assert convert_to_markdown_batch(entries) == [
+        markdown.pandoc_to_markdown(entry) for entry in entries
+    ]
+    assert len(list(markdown_cache.rglob("*.md"))) == 2
+
+
+def test_convert_to_markdown_async(markdown_cache, monkeypatch):
+    """pandoc runs as a subprocess of the event loop, and is killed when cancelled"""
+    monkeypatch.setattr(markdown, "pandoc_version", lambda: "1.0")
+    #  a pandoc rendering docbook as is
+    monkeypatch.setattr(markdown, "PANDOC_ARGV", ["cat"])
+    rendered = asyncio.run(convert_to_markdown_async(VARLISTENTRY))
+    assert rendered == VARLISTENTRY.decode()
+    assert len(list(markdown_cache.rglob("*.md"))) == 1
+    assert convert_to_markdown(VARLISTENTRY) == rendered
+
+    monkeypatch.setattr(markdown, "PANDOC_ARGV", ["sleep", "10"])
+
+    async def cancel():
+        conversion = asyncio.ensure_future(markdown.pandoc_to_markdown_async(b""))
+        await asyncio.sleep(0.1)
+        conversion.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await conversion
+
+    start = time.monotonic()
+    asyncio.run(cancel())
+    assert time.monotonic() - start < 5
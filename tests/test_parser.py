@@ -0,0 +1,98 @@
+from random import Random
+
+from lsprotocol.types import Position, Range
+
+from systemd_language_server.constants import systemd_unit_directives
+from systemd_language_server.parser import LineKind, UnitFile, parse_line
+from systemd_language_server.unit import UnitFileSection
+
+from .utils import random_changes
+
+UNIT_FILE = """\
+# comment
+[Unit]
+Description = Test service
+
+[Service]
+ExecStart=/bin/echo \\
+    hello \\
+# interleaved comment
+    world
+Restart=always
+[Bogus]
+Foo=bar
+"""
+
+
+def test_parse():
+    unit_file = UnitFile("file:///test.service", UNIT_FILE.splitlines(True))
+    kinds = [line.kind for line in unit_file.lines]
+    assert kinds == [
+        LineKind.comment,
+        LineKind.section_header,
+        LineKind.directive,
+        LineKind.blank,
+        LineKind.section_header,
+        LineKind.directive,
+        LineKind.continuation,
+        LineKind.comment,
+        LineKind.continuation,
+        LineKind.directive,
+        LineKind.section_header,
+        LineKind.directive,
+    ]
+
+    description = unit_file.directive_at(2)
+    assert description is not None
+    assert description.name == "Description"
+    assert description.value == "Test service"
+    assert description.name_range == Range(Position(2, 0), Position(2, 11))
+    assert description.value_range == Range(Position(2, 14), Position(2, 26))
+
+    exec_start = unit_file.directive_at(7)
+    assert exec_start is not None
+    assert exec_start is unit_file.directive_at(5)
+    assert exec_start.name == "ExecStart"
+    assert exec_start.value == "/bin/echo hello world"
+    assert exec_start.section == UnitFileSection.service
+    assert exec_start.range == Range(Position(5, 0), Position(8, 9))
+
+    assert unit_file.directive_at(3) is None
+
+    sections = unit_file.sections
+    assert [section.name for section in sections] == ["Unit", "Service", "Bogus"]
+    assert [d.name for d in sections[1].directives] == ["ExecStart", "Restart"]
+    assert sections[2].section is None
+    assert sections[2].directives[0].section is None
+    #  directives and lines under an unknown header agree on its section
+    foo = unit_file.directive_at(11)
+    assert foo is not None and foo.section is None
+    assert unit_file.section_at(11) is None
+
+
+def test_parse_incremental():
+    random = Random(1)
+    snippets = [
+        "[Unit]\n",
+        "[Service]\n",
+        "Foo=bar\n",
+        "Foo=bar \\\n",
+        "  continued\n",
+        "# comment\n",
+        "\n",
+    ]
+    lines = [random.choice(snippets) for _ in range(50)]
+    unit_file = UnitFile("file:///test.service", lines, 0)
+    for version in range(1, 200):
+        lines, changes = random_changes(random, lines, snippets)
+        unit_file.apply_changes(changes, lines, version)
+        fresh = UnitFile("file:///test.service", lines, version)
+        assert unit_file.lines == fresh.lines
+        assert unit_file.sections == fresh.sections
+
+
+def test_names_interned():
+    """Parses of many files share the strings of directive names"""
+    first = parse_line("Description=foo", False)
+    second = parse_line("  Description = bar", False)
+    assert first.name is second.name is systemd_unit_directives[0]
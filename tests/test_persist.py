@@ -0,0 +1,70 @@
+import os
+import pickle
+from pathlib import Path
+
+from systemd_language_server import stats
+from systemd_language_server.persist import (
+    INDEX_FORMAT,
+    load_snapshot,
+    save_snapshot,
+    snapshot_path,
+)
+from systemd_language_server.server import SystemdLanguageServer
+
+
+def test_snapshot_file(tmp_path: Path):
+    path = snapshot_path([tmp_path])
+    assert path != snapshot_path([tmp_path, Path("/etc/systemd/system")])
+    assert load_snapshot(path) is None
+    save_snapshot(path, {"graph": {}, "symbols": {}})
+    snapshot = load_snapshot(path)
+    assert snapshot is not None and snapshot["graph"] == {}
+    #  snapshots of other versions, and unreadable ones, are ignored
+    path.write_bytes(pickle.dumps({"format": (INDEX_FORMAT - 1, "0.0.0")}))
+    assert load_snapshot(path) is None
+    path.write_bytes(b"garbage")
+    assert load_snapshot(path) is None
+    path.write_bytes(b"\x80\x09")
+    assert load_snapshot(path) is None
+    #  no temporary file is left behind
+    save_snapshot(path, {"graph": {}, "symbols": {}})
+    assert list(path.parent.iterdir()) == [path]
+
+
+def start_server(root: Path) -> SystemdLanguageServer:
+    server = SystemdLanguageServer("systemd-server", "v0")
+    server.unit_index.roots = [root]
+    server.index_workspace()
+    server.loop.run_until_complete(server.refresh_dependency_graph())
+    server.symbol_index.refresh()
+    return server
+
+
+def test_warm_restart(tmp_path: Path):
+    """A server started again restores the graph and the symbols, and parses only the
+    files changed since"""
+    for i in range(10):
+        (tmp_path / f"{i}.service").write_text(
+            f"[Unit]\nAfter={(i + 1) % 10}.service\n[Service]\nExecStart=/bin/p{i}\n"
+        )
+    server = start_server(tmp_path)
+    assert "0.service" in server.dependency_graph.ordering_cycles()
+    server.save_index(wait=True)
+    server.loop.close()
+
+    (tmp_path / "3.service").write_text("[Service]\nExecStart=/bin/changed\n")
+    os.utime(tmp_path / "3.service", ns=(0, 0))
+    (tmp_path / "9.service").unlink()
+    (tmp_path / "a.service").write_text("[Unit]\nAfter=0.service\n")
+    before = stats.counters()
+    server = start_server(tmp_path)
+    counts = stats.counters()
+    assert counts["index_snapshot.hit"] == before.get("index_snapshot.hit", 0) + 1
+    #  3.service and a.service, once for the graph and once for the symbols
+    assert counts["unit_file.miss"] - before.get("unit_file.miss", 0) == 2
+    assert counts["symbol_index_parses"] - before["symbol_index_parses"] == 2
+    assert not server.dependency_graph.ordering_cycles()
+    assert set(server.dependency_graph.edges) == {f"{i}.service" for i in "012345678a"}
+    assert server.symbol_index.search("changed")
+    assert not server.symbol_index.search("p9")
+    server.loop.close()
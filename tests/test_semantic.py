@@ -0,0 +1,125 @@
+from random import Random
+
+from lsprotocol.types import Position, Range, TextDocumentContentChangeEvent_Type1
+
+from systemd_language_server.parser import UnitFile, parse_line
+from systemd_language_server.semantic import (
+    COMMENT,
+    DIRECTIVE,
+    KNOWN,
+    SECTION,
+    SPECIFIER,
+    VALUE,
+    VARIABLE,
+    SemanticTokensCache,
+    diff,
+    encode,
+    line_tokens,
+)
+
+from .utils import apply_change, random_changes
+
+UNIT_FILE = """\
+[Unit]
+Description=Instance %i of foo
+# comment
+
+[Service]
+ExecStart=/usr/bin/foo --name=%n \\
+    $FOO ${BAR} 100%% $$HOME
+Bogus=1
+"""
+
+
+def test_line_tokens():
+    assert line_tokens(parse_line("[Unit]", False)) == [(0, 6, SECTION, KNOWN)]
+    assert line_tokens(parse_line("[Frobnicate]", False)) == [(0, 12, SECTION, 0)]
+    assert line_tokens(parse_line("  # comment ", False)) == [(2, 9, COMMENT, 0)]
+    assert line_tokens(parse_line("Bogus = 1", False)) == [
+        (0, 5, DIRECTIVE, 0),
+        (8, 1, VALUE, 0),
+    ]
+    assert line_tokens(parse_line("ExecStart=foo %n ${A}$B \\", False)) == [
+        (0, 9, DIRECTIVE, KNOWN),
+        (10, 4, VALUE, 0),
+        (14, 2, SPECIFIER, 0),
+        (16, 1, VALUE, 0),
+        (17, 4, VARIABLE, 0),
+        (21, 2, VARIABLE, 0),
+    ]
+    #  escapes are part of the value
+    assert line_tokens(parse_line("  100%% $$HOME", True)) == [(2, 12, VALUE, 0)]
+
+
+def test_encode():
+    tokens = SemanticTokensCache().tokens(
+        UnitFile("file:///foo.service", UNIT_FILE.splitlines(True))
+    )
+    data = encode(tokens)
+    assert data[:15] == [
+        *(0, 0, 6, SECTION, KNOWN),
+        *(1, 0, 11, DIRECTIVE, KNOWN),
+        *(0, 12, 9, VALUE, 0),
+    ]
+    assert len(data) == 5 * sum(len(line) for line in tokens)
+    #  tokens of a range are relative to the start of the document
+    assert encode(tokens[6:7], 6)[:5] == [6, 4, 4, VARIABLE, 0]
+
+
+def apply_edits(data: list[int], edits) -> list[int]:
+    for edit in sorted(edits, key=lambda edit: edit.start, reverse=True):
+        data = data[: edit.start] + edit.data + data[edit.start + edit.delete_count :]
+    return data
+
+
+def test_delta():
+    """Deltas applied to the previous result give the tokens of the new version, and
+    only changed lines are classified"""
+    random = Random(7)
+    lines = UNIT_FILE.splitlines(True) * 10
+    snippets = ["\n", "[Service]\n", "ExecStart=%n ", "$FOO ", "\\\n", "# x\n", "A=b"]
+    unit_file = UnitFile("file:///foo.service", lines, 1)
+    cache = SemanticTokensCache()
+    result = cache.full(unit_file)
+    data = result.data
+    for version in range(2, 50):
+        lines, changes = random_changes(random, lines, snippets)
+        unit_file.apply_changes(changes, lines, version)
+        delta = cache.delta(unit_file, result.result_id)
+        data = apply_edits(data, delta.edits)
+        expected = encode(
+            SemanticTokensCache().tokens(UnitFile("file:///foo.service", lines))
+        )
+        assert data == expected
+        assert cache.classified <= sum(c.text.count("\n") + 1 for c in changes) * 2
+        result = delta
+
+
+def test_delta_unknown_result():
+    unit_file = UnitFile("file:///foo.service", UNIT_FILE.splitlines(True))
+    cache = SemanticTokensCache()
+    cache.full(unit_file)
+    full = cache.delta(unit_file, "unknown")
+    assert full.data == encode(cache.tokens(unit_file))
+    assert cache.delta(unit_file, full.result_id).edits == []
+
+
+def test_diff():
+    """Only the changed lines and the token after them are encoded again"""
+    old = [[(0, 3, VALUE, 0)], [], [(0, 3, VALUE, 0), (4, 2, VALUE, 0)], [], []]
+    new = old[:1] + [[(1, 2, COMMENT, 0)], []] + old[1:]
+    (edit,) = diff(old, new)
+    assert apply_edits(encode(old), [edit]) == encode(new)
+    assert (edit.start, edit.delete_count, len(edit.data)) == (5, 10, 15)
+    assert diff(new, new) == []
+    assert apply_edits(encode(new), diff(new, old)) == encode(old)
+    assert apply_edits(encode(old), diff(old, [])) == []
+
+
+def test_range():
+    lines = UNIT_FILE.splitlines(True)
+    unit_file = UnitFile("file:///foo.service", lines)
+    cache = SemanticTokensCache()
+    tokens = cache.range(unit_file, Range(Position(4, 0), Position(5, 4)))
+    assert tokens.data == encode(cache.tokens(unit_file)[4:6], 4)
+    assert tokens.data[:5] == [4, 0, 9, SECTION, KNOWN]
@@ -1,41 +1,92 @@
 import re
+import threading
+import time
 from concurrent.futures import TimeoutError
 from dataclasses import dataclass
 from pathlib import Path
 
 import pytest
 from lsprotocol.types import (
+    CANCEL_REQUEST,
     INITIALIZE,
+    PROGRESS,
     TEXT_DOCUMENT_COMPLETION,
+    TEXT_DOCUMENT_DEFINITION,
+    TEXT_DOCUMENT_DIAGNOSTIC,
     TEXT_DOCUMENT_DID_CHANGE,
     TEXT_DOCUMENT_DID_OPEN,
+    TEXT_DOCUMENT_DOCUMENT_SYMBOL,
     TEXT_DOCUMENT_HOVER,
+    TEXT_DOCUMENT_PUBLISH_DIAGNOSTICS,
+    TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL,
+    TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL_DELTA,
+    WORKSPACE_DIAGNOSTIC,
+    WORKSPACE_SYMBOL,
+    CancelParams,
     ClientCapabilities,
     CompletionList,
     CompletionParams,
+    DefinitionParams,
     DidChangeTextDocumentParams,
     DidOpenTextDocumentParams,
+    DocumentDiagnosticParams,
+    DocumentDiagnosticReportKind,
+    DocumentSymbolParams,
     Hover,
+    HoverClientCapabilities,
     HoverParams,
     InitializeParams,
+    Location,
     MarkupContent,
     MarkupKind,
     Position,
+    PreviousResultId,
+    ProgressParams,
+    PublishDiagnosticsParams,
+    Range,
+    SemanticTokensDeltaParams,
+    SemanticTokensParams,
+    TextDocumentClientCapabilities,
+    TextDocumentContentChangeEvent_Type1,
     TextDocumentContentChangeEvent_Type2,
     TextDocumentIdentifier,
     TextDocumentItem,
     VersionedTextDocumentIdentifier,
+    WorkspaceDiagnosticParams,
+    WorkspaceSymbolParams,
+)
+from pygls.exceptions import (
+    JsonRpcInvalidParams,
+    JsonRpcRequestCancelled,
+    JsonRpcServerError,
 )
 from pygls.server import LanguageServer
 
-from systemd_language_server.server import SystemdLanguageServer
+import systemd_language_server.server as server_module
+from systemd_language_server.index import UnitIndex
+from systemd_language_server.server import (
+    SYSTEMD_DEPENDENCY_GRAPH,
+    SYSTEMD_STATS,
+    SystemdLanguageServer,
+    complete_directive_property,
+)
+from systemd_language_server.unit import (
+    DirectiveDocumentation,
+    UnitFileSection,
+    UnitType,
+    find_documentation,
+)
 
 ClientServerPair = tuple[LanguageServer, SystemdLanguageServer]
 
 MAX_SERVER_INIT_RETRIES = 5
 
 
-def client_init(client: LanguageServer, datadir: Path):
+def client_init(
+    client: LanguageServer,
+    datadir: Path,
+    capabilities: ClientCapabilities | None = None,
+):
     for _ in range(MAX_SERVER_INIT_RETRIES):
         try:
             client.lsp.send_request(
@@ -43,7 +94,7 @@ def client_init(client: LanguageServer, datadir: Path):
                 InitializeParams(
                     process_id=123,
                     root_uri=datadir.as_uri(),
-                    capabilities=ClientCapabilities(),
+                    capabilities=capabilities or ClientCapabilities(),
                 ),
             ).result(timeout=1)
         except TimeoutError:
@@ -137,6 +188,32 @@ service_directive_test = CompletionTestParams(
     ["WorkingDirectory", "KillMode"],
 )
 
+#  camel hump fuzzy matching: "ExSt" completes to ExecStart...
+service_fuzzy_directive_test = CompletionTestParams(
+    "test.service",
+    "[Service]\nExSt\n",
+    (1, 4),
+    ["ExecStart", "ExecStartPre", "ExecStop"],
+    ["WorkingDirectory", "KillMode", "ExecReload"],
+)
+
+
+#  values of directives
+service_type_value_test = CompletionTestParams(
+    "test.service",
+    "[Service]\nType=no\n",
+    (1, 7),
+    ["notify", "notify-reload"],
+    ["simple", "ExecStart"],
+)
+syscall_filter_value_test = CompletionTestParams(
+    "test.service",
+    "[Service]\nSystemCallFilter=@system-service ~@mou\n",
+    (1, 38),
+    ["@mount"],
+    ["@system-service", "@aio"],
+)
+
 
 @pytest.mark.parametrize(
     "params",
@@ -149,6 +226,9 @@ service_directive_test = CompletionTestParams(
         mount_section_test,
         timer_section_test,
         service_directive_test,
+        service_fuzzy_directive_test,
+        service_type_value_test,
+        syscall_filter_value_test,
     ],
 )
 def test_completion(client_server_pair: ClientServerPair, params: CompletionTestParams):
@@ -186,12 +266,389 @@ def test_completion(client_server_pair: ClientServerPair, params: CompletionTest
         assert not excluded_label in labels
 
 
+def test_completion_after_incremental_change(client_server_pair: ClientServerPair):
+    """The section of the cursor is tracked across incremental changes"""
+    client, server = client_server_pair
+
+    datadir = Path(__file__).parent / "data"
+    unit_file = datadir / "test.service"
+    uri = unit_file.as_uri()
+
+    client_init(client, datadir)
+    client_open(client, unit_file, "[Service]\nExecStart=/bin/true\n\n")
+
+    #  insert an [Install] section header above the cursor
+    client.lsp.notify(
+        TEXT_DOCUMENT_DID_CHANGE,
+        params=DidChangeTextDocumentParams(
+            text_document=VersionedTextDocumentIdentifier(version=2, uri=uri),
+            content_changes=[
+                TextDocumentContentChangeEvent_Type1(
+                    range=Range(Position(2, 0), Position(2, 0)), text="[Install]\n"
+                )
+            ],
+        ),
+    )
+
+    completion_list: CompletionList = client.lsp.send_request(
+        TEXT_DOCUMENT_COMPLETION,
+        params=CompletionParams(
+            text_document=TextDocumentIdentifier(uri=uri),
+            position=Position(3, 0),
+            context=None,
+        ),
+    ).result(timeout=1)
+    labels = [i.label for i in completion_list.items]
+    assert "WantedBy" in labels
+    assert "ExecStart" not in labels
+
+
+def test_definition(client_server_pair: ClientServerPair):
+    """Unit names in dependency directives resolve to unit files of the workspace"""
+    client, server = client_server_pair
+    server.index_search_paths = False
+
+    datadir = Path(__file__).parent / "data"
+    unit_file = datadir / "test.service"
+    uri = unit_file.as_uri()
+
+    client_init(client, datadir)
+    client_open(client, unit_file, "[Unit]\nAfter=network.target test.socket\n")
+    assert server.unit_index.ready.wait(timeout=1)
+
+    def definition(character: int) -> list[Location] | None:
+        return client.lsp.send_request(
+            TEXT_DOCUMENT_DEFINITION,
+            params=DefinitionParams(
+                text_document=TextDocumentIdentifier(uri=uri),
+                position=Position(1, character),
+            ),
+        ).result(timeout=1)
+
+    locations = definition(len("After=network.target te"))
+    assert locations is not None
+    assert [location.uri for location in locations] == [
+        (datadir / "test.socket").as_uri()
+    ]
+    assert definition(len("After=netw")) is None
+    assert definition(len("Aft")) is None
+
+
+def test_dependency_diagnostics(client_server_pair: ClientServerPair, tmp_path: Path):
+    """Ordering cycles and missing dependencies are reported, and the graph is served"""
+    client, server = client_server_pair
+    server.index_search_paths = False
+
+    (tmp_path / "b.service").write_text("[Unit]\nAfter=a.service\n")
+    unit_file = tmp_path / "a.service"
+    text = "[Unit]\nAfter=b.service\nRequires=missing.service network.target\n"
+    unit_file.write_text(text)
+
+    client_init(client, tmp_path)
+    client_open(client, unit_file, text)
+    assert server.unit_index.ready.wait(timeout=1)
+
+    report = client.lsp.send_request(
+        TEXT_DOCUMENT_DIAGNOSTIC,
+        params=DocumentDiagnosticParams(
+            text_document=TextDocumentIdentifier(uri=unit_file.as_uri())
+        ),
+    ).result(timeout=1)
+    codes = {d.code: d.range for d in report.items}
+    assert codes == {
+        "ordering-cycle": Range(Position(1, 6), Position(1, 15)),
+        "missing-dependency": Range(Position(2, 9), Position(2, 24)),
+    }
+
+    graph = client.lsp.send_request(
+        SYSTEMD_DEPENDENCY_GRAPH, {"unit": "a.service"}
+    ).result(timeout=1)
+    assert graph.nodes == [
+        "a.service",
+        "b.service",
+        "missing.service",
+        "network.target",
+    ]
+    for params in [{}, {"unit": 1}]:
+        with pytest.raises(JsonRpcInvalidParams):
+            client.lsp.send_request(SYSTEMD_DEPENDENCY_GRAPH, params).result(timeout=1)
+    #  the graph isn't served while the index is restored
+    server.unit_index.ready.clear()
+    with pytest.raises(JsonRpcServerError):
+        client.lsp.send_request(SYSTEMD_DEPENDENCY_GRAPH, {"unit": "a.service"}).result(
+            timeout=1
+        )
+
+
+def test_stats(client_server_pair: ClientServerPair):
+    """Handler latencies are recorded and served"""
+    client, server = client_server_pair
+    server.has_pandoc = False
+
+    datadir = Path(__file__).parent / "data"
+    unit_file = datadir / "test.service"
+    client_init(client, datadir)
+    client_open(client, unit_file, "[Service]\nExecStart=/bin/true\n")
+    for _ in range(3):
+        client.lsp.send_request(
+            TEXT_DOCUMENT_HOVER,
+            params=HoverParams(
+                text_document=TextDocumentIdentifier(uri=unit_file.as_uri()),
+                position=Position(1, 0),
+            ),
+        ).result(timeout=1)
+
+    report = client.lsp.send_request(SYSTEMD_STATS, {}).result(timeout=1)
+    assert report.uptime_s > 0
+    handlers = server.stats_report()["handlers"]
+    assert handlers[TEXT_DOCUMENT_HOVER]["count"] == 3
+    assert handlers[TEXT_DOCUMENT_DID_OPEN]["count"] == 1
+    assert set(server.stats_report()) >= {"handlers", "caches", "counters"}
+
+
+def test_diagnostics(client_server_pair: ClientServerPair):
+    """Diagnostics are published once changes pause, for the latest version only"""
+    client, server = client_server_pair
+    server.diagnostics_delay = 0.2
+
+    published: list[PublishDiagnosticsParams] = []
+    done = threading.Event()
+
+    @client.feature(TEXT_DOCUMENT_PUBLISH_DIAGNOSTICS)
+    def publish_diagnostics(params: PublishDiagnosticsParams):
+        published.append(params)
+        done.set()
+
+    datadir = Path(__file__).parent / "data"
+    unit_file = datadir / "test.service"
+    uri = unit_file.as_uri()
+
+    client_init(client, datadir)
+    client_open(client, unit_file, "[Service]\nRestart=always\n")
+    for version, text in [
+        (2, "[Service]\nRestart=al\n"),
+        (3, "[Service]\nRestart=a\n"),
+    ]:
+        client.lsp.notify(
+            TEXT_DOCUMENT_DID_CHANGE,
+            params=DidChangeTextDocumentParams(
+                text_document=VersionedTextDocumentIdentifier(version=version, uri=uri),
+                content_changes=[TextDocumentContentChangeEvent_Type2(text=text)],
+            ),
+        )
+
+    assert done.wait(timeout=2)
+    assert [params.version for params in published] == [3]
+    (diagnostic,) = published[0].diagnostics
+    assert diagnostic.range == Range(Position(1, 8), Position(1, 9))
+
+
+def test_document_diagnostic(client_server_pair: ClientServerPair):
+    """Pulled diagnostics are reported unchanged while the version is the same"""
+    client, server = client_server_pair
+
+    datadir = Path(__file__).parent / "data"
+    unit_file = datadir / "test.service"
+    uri = unit_file.as_uri()
+
+    client_init(client, datadir)
+    client_open(client, unit_file, "[Service]\nRestart=sometimes\n")
+    #  result ids also depend on the state of the index
+    assert server.unit_index.ready.wait(timeout=5)
+
+    def pull(previous_result_id: str | None = None):
+        return client.lsp.send_request(
+            TEXT_DOCUMENT_DIAGNOSTIC,
+            params=DocumentDiagnosticParams(
+                text_document=TextDocumentIdentifier(uri=uri),
+                previous_result_id=previous_result_id,
+            ),
+        ).result(timeout=1)
+
+    full = pull()
+    assert full.kind == DocumentDiagnosticReportKind.Full
+    assert len(full.items) == 1
+    unchanged = pull(full.result_id)
+    assert unchanged.kind == DocumentDiagnosticReportKind.Unchanged
+    assert unchanged.result_id == full.result_id
+
+    client.lsp.notify(
+        TEXT_DOCUMENT_DID_CHANGE,
+        params=DidChangeTextDocumentParams(
+            text_document=VersionedTextDocumentIdentifier(version=2, uri=uri),
+            content_changes=[
+                TextDocumentContentChangeEvent_Type2(text="[Service]\nRestart=always\n")
+            ],
+        ),
+    )
+    changed = pull(full.result_id)
+    assert changed.kind == DocumentDiagnosticReportKind.Full
+    assert changed.items == []
+
+
+def test_document_diagnostic_closed(
+    client_server_pair: ClientServerPair, tmp_path: Path
+):
+    """Pulled diagnostics of files which aren't open are checked again once changed"""
+    client, server = client_server_pair
+
+    unit_file = tmp_path / "test.service"
+    unit_file.write_text("[Service]\nRestart=sometimes\n")
+    client_init(client, tmp_path)
+    assert server.unit_index.ready.wait(timeout=5)
+
+    def pull(previous_result_id: str | None = None):
+        return client.lsp.send_request(
+            TEXT_DOCUMENT_DIAGNOSTIC,
+            params=DocumentDiagnosticParams(
+                text_document=TextDocumentIdentifier(uri=unit_file.as_uri()),
+                previous_result_id=previous_result_id,
+            ),
+        ).result(timeout=1)
+
+    full = pull()
+    assert len(full.items) == 1
+    assert pull(full.result_id).kind == DocumentDiagnosticReportKind.Unchanged
+
+    unit_file.write_text("[Service]\nRestart=always\n")
+    changed = pull(full.result_id)
+    assert changed.kind == DocumentDiagnosticReportKind.Full
+    assert changed.items == []
+
+
+def test_semantic_tokens(client_server_pair: ClientServerPair):
+    """Semantic tokens are sent in full, then as edits of the previous result"""
+    client, server = client_server_pair
+
+    datadir = Path(__file__).parent / "data"
+    uri = (datadir / "test.service").as_uri()
+    client_init(client, datadir)
+    client_open(client, datadir / "test.service", "[Service]\nType=simple\n")
+
+    full = client.lsp.send_request(
+        TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL,
+        SemanticTokensParams(text_document=TextDocumentIdentifier(uri=uri)),
+    ).result(timeout=1)
+    assert len(full.data) == 15
+    client.lsp.notify(
+        TEXT_DOCUMENT_DID_CHANGE,
+        params=DidChangeTextDocumentParams(
+            text_document=VersionedTextDocumentIdentifier(version=2, uri=uri),
+            content_changes=[
+                TextDocumentContentChangeEvent_Type1(
+                    range=Range(Position(2, 0), Position(2, 0)),
+                    text="Restart=always\n",
+                )
+            ],
+        ),
+    )
+    delta = client.lsp.send_request(
+        TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL_DELTA,
+        SemanticTokensDeltaParams(
+            text_document=TextDocumentIdentifier(uri=uri),
+            previous_result_id=full.result_id,
+        ),
+    ).result(timeout=1)
+    (edit,) = delta.edits
+    assert (edit.start, edit.delete_count, len(edit.data)) == (15, 0, 10)
+    assert delta.result_id != full.result_id
+    assert server.semantic_tokens[uri].classified == 1
+
+
+def test_symbols(client_server_pair: ClientServerPair, tmp_path: Path):
+    client, server = client_server_pair
+    server.index_search_paths = False
+    (tmp_path / "foo.service").write_text("[Service]\nExecStart=/usr/bin/foo\n")
+    bar = tmp_path / "bar.service"
+    bar.write_text("[Unit]\nDescription=Bar\n")
+    client_init(client, tmp_path)
+    client_open(client, bar, "[Unit]\nDescription=Bar\n[Service]\nExecStart=/bin/b\n")
+    assert server.unit_index.ready.wait(timeout=5)
+
+    (unit, service) = client.lsp.send_request(
+        TEXT_DOCUMENT_DOCUMENT_SYMBOL,
+        DocumentSymbolParams(text_document=TextDocumentIdentifier(uri=bar.as_uri())),
+    ).result(timeout=1)
+    assert (unit.name, service.children[0].name) == ("[Unit]", "ExecStart")
+
+    def search(query: str) -> list[tuple[str, str]]:
+        symbols = client.lsp.send_request(
+            WORKSPACE_SYMBOL, WorkspaceSymbolParams(query=query)
+        ).result(timeout=5)
+        return [(s.name, s.location.uri) for s in symbols]
+
+    assert search("/usr/bin/foo") == [
+        ("/usr/bin/foo", (tmp_path / "foo.service").as_uri())
+    ]
+    #  from the open document
+    assert search("/bin/b") == [("/bin/b", bar.as_uri())]
+
+
+def test_workspace_diagnostic(client_server_pair: ClientServerPair):
+    """Workspace diagnostics are streamed as partial results when asked to"""
+    client, server = client_server_pair
+
+    partial_results: list[ProgressParams] = []
+
+    @client.feature(PROGRESS)
+    def progress(params: ProgressParams):
+        partial_results.append(params)
+
+    datadir = Path(__file__).parent / "data"
+    client_init(client, datadir)
+    assert server.unit_index.ready.wait(timeout=5)
+    unit_files = sorted(path.as_uri() for path in datadir.iterdir())
+
+    report = client.lsp.send_request(
+        WORKSPACE_DIAGNOSTIC, params=WorkspaceDiagnosticParams(previous_result_ids=[])
+    ).result(timeout=2)
+    assert sorted(item.uri for item in report.items) == unit_files
+    assert all(item.kind == DocumentDiagnosticReportKind.Full for item in report.items)
+
+    previous_result_ids = [
+        PreviousResultId(uri=item.uri, value=item.result_id) for item in report.items
+    ]
+    report = client.lsp.send_request(
+        WORKSPACE_DIAGNOSTIC,
+        params=WorkspaceDiagnosticParams(
+            previous_result_ids=previous_result_ids, partial_result_token="token"
+        ),
+    ).result(timeout=2)
+    assert report.items == []
+    #  partial results are untyped on the client side
+    items = [item for params in partial_results for item in params.value["items"]]
+    assert sorted(item["uri"] for item in items) == unit_files
+    assert all(item["kind"] == "unchanged" for item in items)
+
+
+def test_workspace_diagnostic_process_pool(client_server_pair: ClientServerPair):
+    """Many files are checked in worker processes, with the same results"""
+    client, server = client_server_pair
+
+    datadir = Path(__file__).parent / "data"
+    client_init(client, datadir)
+    assert server.unit_index.ready.wait(timeout=5)
+
+    def diagnostics() -> dict[str, list]:
+        report = client.lsp.send_request(
+            WORKSPACE_DIAGNOSTIC,
+            params=WorkspaceDiagnosticParams(previous_result_ids=[]),
+        ).result(timeout=30)
+        return {item.uri: item.items for item in report.items}
+
+    in_threads = diagnostics()
+    server.process_pool_threshold = 0
+    assert diagnostics() == in_threads
+    assert server._process_pool is not None
+
+
 @dataclass
 class HoverTestParams:
     filename: str | None
     text: str
     position: tuple[int, int]
-    has_pandoc: bool
+    #  whether the client supports markdown
+    markdown: bool
     pattern_returned: str | None
 
 
@@ -253,14 +710,25 @@ wrong_section_hover_test = HoverTestParams(
 )
 def test_hover(client_server_pair: ClientServerPair, params: HoverTestParams):
     client, server = client_server_pair
-    server.has_pandoc = params.has_pandoc
+    server.has_pandoc = False
 
     datadir = Path(__file__).parent / "data"
     assert params.filename is not None
     unit_file = datadir / params.filename
     uri = unit_file.as_uri()
 
-    client_init(client, datadir)
+    content_format = (
+        [MarkupKind.Markdown] if params.markdown else [MarkupKind.PlainText]
+    )
+    client_init(
+        client,
+        datadir,
+        ClientCapabilities(
+            text_document=TextDocumentClientCapabilities(
+                hover=HoverClientCapabilities(content_format=content_format)
+            )
+        ),
+    )
     client_open(client, unit_file)
 
     client.lsp.notify(
@@ -287,5 +755,151 @@ def test_hover(client_server_pair: ClientServerPair, params: HoverTestParams):
 
     content = hover.contents
     assert isinstance(content, MarkupContent)
-    assert (content.kind == MarkupKind.Markdown) == params.has_pandoc
+    assert (content.kind == MarkupKind.Markdown) == params.markdown
     assert re.search(params.pattern_returned, content.value) is not None
+
+
+def test_hover_markdown_without_pandoc(
+    client_server_pair: ClientServerPair, monkeypatch: pytest.MonkeyPatch
+):
+    """Without pandoc, documentation the bundle lacks markdown for is rendered by the
+    builtin renderer"""
+    client, server = client_server_pair
+    server.has_pandoc = False
+
+    def unrendered(*args):
+        documentation = find_documentation(*args)
+        return documentation and documentation._replace(markdown=None)
+
+    monkeypatch.setattr(server_module, "find_documentation", unrendered)
+
+    datadir = Path(__file__).parent / "data"
+    unit_file = datadir / "test.service"
+    client_init(client, datadir)
+    client_open(client, unit_file, "[Service]\nExecStart=/bin/true\n")
+    hover: Hover = client.lsp.send_request(
+        TEXT_DOCUMENT_HOVER,
+        params=HoverParams(
+            text_document=TextDocumentIdentifier(uri=unit_file.as_uri()),
+            position=Position(1, 0),
+        ),
+    ).result(timeout=5)
+    assert isinstance(hover.contents, MarkupContent)
+    assert hover.contents.kind == MarkupKind.Markdown
+    assert "`Type=`" in hover.contents.value
+
+
+def test_hover_dropped(
+    client_server_pair: ClientServerPair, monkeypatch: pytest.MonkeyPatch
+):
+    """Hovers are dropped when the document changes, or the request is cancelled, while
+    documentation is rendered"""
+    client, server = client_server_pair
+    rendering, release = threading.Event(), threading.Event()
+
+    def render(*args):
+        rendering.set()
+        release.wait(timeout=5)
+        return DirectiveDocumentation(
+            docbook=b"", plain_text="documentation", markdown="documentation"
+        )
+
+    monkeypatch.setattr(server_module, "find_documentation", render)
+    server.has_pandoc = False
+
+    datadir = Path(__file__).parent / "data"
+    unit_file = datadir / "test.service"
+    uri = unit_file.as_uri()
+    client_init(client, datadir)
+    client_open(client, unit_file, "[Service]\nExecStart=/bin/true\n")
+    params = HoverParams(
+        text_document=TextDocumentIdentifier(uri=uri), position=Position(1, 0)
+    )
+
+    try:
+        hover = client.lsp.send_request(TEXT_DOCUMENT_HOVER, params)
+        assert rendering.wait(timeout=1)
+        client.lsp.notify(
+            TEXT_DOCUMENT_DID_CHANGE,
+            params=DidChangeTextDocumentParams(
+                text_document=VersionedTextDocumentIdentifier(version=2, uri=uri),
+                content_changes=[
+                    TextDocumentContentChangeEvent_Type2(
+                        text="[Service]\nType=simple\n"
+                    )
+                ],
+            ),
+        )
+        for _ in range(100):
+            if server.document_version(uri) == 2:
+                break
+            time.sleep(0.01)
+        release.set()
+        assert hover.result(timeout=1) is None
+
+        rendering.clear()
+        release.clear()
+        hover = client.lsp.send_request(TEXT_DOCUMENT_HOVER, params, msg_id="hover")
+        assert rendering.wait(timeout=1)
+        client.lsp.notify(CANCEL_REQUEST, CancelParams(id="hover"))
+        with pytest.raises(JsonRpcRequestCancelled):
+            hover.result(timeout=1)
+    finally:
+        release.set()
+
+
+def test_hover_effective_value(client_server_pair: ClientServerPair, tmp_path: Path):
+    """Hover shows the value of a directive in effect, merged with its drop-ins"""
+    client, server = client_server_pair
+    server.index_search_paths = False
+    server.has_pandoc = False
+
+    unit_file = tmp_path / "foo.service"
+    unit_file.write_text("[Service]\nExecStart=/bin/foo\n")
+    override = tmp_path / "foo.service.d" / "override.conf"
+    override.parent.mkdir()
+    override.write_text("[Service]\nExecStart=\nExecStart=/bin/bar\n")
+
+    client_init(client, tmp_path)
+    client_open(client, unit_file)
+    assert server.unit_index.ready.wait(timeout=1)
+
+    hover: Hover = client.lsp.send_request(
+        TEXT_DOCUMENT_HOVER,
+        params=HoverParams(
+            text_document=TextDocumentIdentifier(uri=unit_file.as_uri()),
+            position=Position(1, 0),
+        ),
+    ).result(timeout=1)
+    assert isinstance(hover.contents, MarkupContent)
+    assert f"`ExecStart=/bin/bar` from `{override}:3`" in hover.contents.value
+    assert "Commands that are executed when this service is started" in (
+        hover.contents.value
+    )
+
+
+def test_unit_names_indexed_lazily():
+    """Unit names are only indexed to complete directives taking them"""
+    index = UnitIndex()
+    index.add(Path("/etc/systemd/system/foo.service"))
+    calls = []
+
+    def unit_names():
+        calls.append(1)
+        return index.completion_index()
+
+    def complete(line: str):
+        params = CompletionParams(
+            TextDocumentIdentifier(uri="file:///bar.service"),
+            Position(0, len(line)),
+        )
+        return complete_directive_property(
+            params, UnitType.service, UnitFileSection.service, line, unit_names
+        )
+
+    assert complete("Restart=on-") is not None
+    assert not calls
+    completions = complete("After=fo")
+    assert completions is not None
+    assert "foo.service" in [item.label for item in completions.items]
+    assert calls
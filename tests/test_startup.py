@@ -0,0 +1,48 @@
+import subprocess
+import sys
+from io import StringIO
+
+from systemd_language_server.startup import (
+    ImportTime,
+    parse_importtime,
+    profile_startup,
+)
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 | _io
+import time:       300 |        400 |   lsprotocol
+import time:      1000 |       1500 | systemd_language_server.server
+"""
+
+
+def test_parse_importtime():
+    assert parse_importtime(IMPORTTIME) == [
+        ImportTime("_io", 100, 100, 0),
+        ImportTime("lsprotocol", 300, 400, 1),
+        ImportTime("systemd_language_server.server", 1000, 1500, 0),
+    ]
+
+
+def test_deferred_imports():
+    """Modules only some requests need aren't imported at startup"""
+    deferred = ["xml.etree.ElementTree", "lxml", "concurrent.futures.process"]
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, systemd_language_server.server\n"
+            f"print([m for m in {deferred!r} if m in sys.modules])",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    assert proc.stdout.strip() == "[]"
+
+
+def test_profile_startup():
+    output = StringIO()
+    profile_startup(output)
+    assert "systemd_language_server.server" in output.getvalue()
+    assert "first hover" in output.getvalue()
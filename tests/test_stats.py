@@ -0,0 +1,49 @@
+import asyncio
+
+from systemd_language_server.stats import (
+    HandlerStats,
+    Histogram,
+    cache_report,
+    count,
+    counters,
+)
+
+
+def test_histogram():
+    histogram = Histogram()
+    for ms in [0.05, 0.3, 0.3, 0.3, 7, 20000]:
+        histogram.record(ms)
+    report = histogram.report()
+    assert report["count"] == 6
+    assert report["p50_ms"] == 0.5
+    assert report["p90_ms"] == report["max_ms"] == 20000
+    assert report["buckets"] == {"le_0.1ms": 1, "le_0.5ms": 3, "le_10ms": 1, "inf": 1}
+
+
+def test_cache_report():
+    assert cache_report({"a.hit": 3, "a.miss": 1, "b.miss": 2, "runs": 5}) == {
+        "a": {"hits": 3, "misses": 1, "hit_rate": 0.75},
+        "b": {"hits": 0, "misses": 2, "hit_rate": 0.0},
+    }
+    before = counters().get("test_runs", 0)
+    count("test_runs", 2)
+    assert counters()["test_runs"] == before + 2
+
+
+def test_timed():
+    stats = HandlerStats()
+
+    def handler(params):
+        return params
+
+    async def coroutine(params):
+        return params
+
+    timed = stats.timed("sync", handler)
+    assert timed(1) == 1
+    assert timed.__wrapped__ is handler
+    timed_coroutine = stats.timed("async", coroutine)
+    assert asyncio.iscoroutinefunction(timed_coroutine)
+    assert asyncio.run(timed_coroutine(2)) == 2
+    handlers = stats.report()["handlers"]
+    assert handlers["sync"]["count"] == handlers["async"]["count"] == 1
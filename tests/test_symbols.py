@@ -0,0 +1,119 @@
+import os
+from pathlib import Path
+
+from lsprotocol.types import SymbolKind
+
+from systemd_language_server.index import UnitIndex
+from systemd_language_server.parser import UnitFile
+from systemd_language_server.symbols import (
+    SymbolIndex,
+    document_symbols,
+    program,
+    unit_file_symbols,
+)
+
+UNIT_FILE = """\
+Orphan=1
+[Unit]
+Description=Foo daemon
+
+[Service]
+ExecStartPre=-/usr/bin/foo-setup --init
+ExecStart=/usr/bin/foo \\
+    --verbose
+"""
+
+
+def test_document_symbols():
+    unit_file = UnitFile("file:///foo.service", UNIT_FILE.splitlines(True))
+    orphan, unit, service = document_symbols(unit_file)
+    assert (orphan.name, orphan.kind) == ("Orphan", SymbolKind.Property)
+    assert (unit.name, unit.kind) == ("[Unit]", SymbolKind.Namespace)
+    assert [(c.name, c.detail) for c in unit.children] == [
+        ("Description", "Foo daemon")
+    ]
+    assert [c.name for c in service.children] == ["ExecStartPre", "ExecStart"]
+    assert service.range.end.line == 7
+    assert service.selection_range.end.character == len("[Service]")
+
+
+def test_program():
+    assert program("-/usr/bin/foo --init") == "/usr/bin/foo"
+    assert program("!!foo") == "foo"
+    assert program("  ") is None
+
+
+def test_unit_file_symbols():
+    """Only directives running commands name programs"""
+    text = UNIT_FILE + "ExecSearchPath=/opt/bin\nExecPaths=/usr/lib/foo\n"
+    unit_file = UnitFile("file:///foo.service", text.splitlines(True))
+    _, *programs = unit_file_symbols(unit_file, "foo.service", dropin=False)
+    assert names(programs) == ["/usr/bin/foo-setup", "/usr/bin/foo"]
+    assert unit_file_symbols(unit_file, "foo.service", dropin=True) == programs
+
+
+def make_index(tmp_path: Path) -> tuple[UnitIndex, SymbolIndex]:
+    (tmp_path / "foo.service").write_text(UNIT_FILE)
+    (tmp_path / "bar-baz.service").write_text(
+        "[Unit]\nDescription=Bar of the network\n[Service]\nExecStart=bar\n"
+    )
+    (tmp_path / "bar-baz.service.d").mkdir()
+    (tmp_path / "bar-baz.service.d/override.conf").write_text(
+        "[Service]\nExecStart=\nExecStart=/opt/qux\n"
+    )
+    index = UnitIndex()
+    index.roots = [tmp_path]
+    index.walk()
+    return index, SymbolIndex(index)
+
+
+def names(symbols) -> list[str]:
+    return [symbol.name for symbol in symbols]
+
+
+def test_search(tmp_path: Path):
+    _, symbols = make_index(tmp_path)
+    assert names(symbols.search("/usr/bin/foo")) == [
+        "/usr/bin/foo",
+        "/usr/bin/foo-setup",
+    ]
+    (found,) = symbols.search("foo-s")
+    assert (found.container, found.line) == ("foo.service", 5)
+    #  units come first, and all words must match, as prefixes
+    assert names(symbols.search("foo")) == [
+        "foo.service (Foo daemon)",
+        "/usr/bin/foo",
+        "/usr/bin/foo-setup",
+    ]
+    assert names(symbols.search("NETW bar")) == ["bar-baz.service (Bar of the network)"]
+    assert names(symbols.search("baz")) == ["bar-baz.service (Bar of the network)"]
+    assert symbols.search("network foo") == []
+    #  programs of drop-ins belong to the unit they extend
+    (qux,) = symbols.search("qux")
+    assert qux.container == "bar-baz.service"
+    assert len(symbols.search("")) == 2
+
+
+def test_search_changes(tmp_path: Path):
+    index, symbols = make_index(tmp_path)
+    assert symbols.search("qux")
+
+    #  changes on disk are indexed once notified
+    override = tmp_path / "bar-baz.service.d/override.conf"
+    override.write_text("[Service]\nExecStart=/opt/quux\n")
+    os.utime(override, ns=(0, 0))
+    symbols.invalidate(override)
+    assert names(symbols.search("qu")) == ["/opt/quux"]
+
+    #  open documents take precedence
+    foo = tmp_path / "foo.service"
+    unit_file = UnitFile(foo.as_uri(), ["[Unit]\n", "Description=Edited\n"], 2)
+    assert names(symbols.search("edited", {foo.as_uri(): unit_file})) == [
+        "foo.service (Edited)"
+    ]
+    #  and are indexed from disk again once closed
+    assert symbols.search("edited") == []
+    assert symbols.search("daemon")
+
+    index.remove(foo)
+    assert symbols.search("daemon") == []
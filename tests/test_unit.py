@@ -0,0 +1,119 @@
+import sys
+from random import Random
+
+from lsprotocol.types import Position
+from pygls.workspace import TextDocument
+
+from systemd_language_server import unit
+from systemd_language_server.constants import (
+    systemd_exec_directives,
+    systemd_service_directives,
+)
+from systemd_language_server.unit import (
+    DirectiveDocumentation,
+    SectionIndex,
+    UnitFileSection,
+    UnitType,
+    build_directive_index,
+    directive_index,
+    docbook_digest,
+    get_current_section,
+    get_directive_index,
+    get_directives,
+    get_docbooks,
+    get_unit_type,
+    load_documentation_bundle,
+    prerender_documentation,
+)
+
+from .utils import random_changes
+
+
+def test_directive_index():
+    index = get_directive_index("systemd.service.xml")
+    assert "ExecStart" in index
+    assert "ExecStartPre" in index
+    assert "Description" not in index
+    #  each docbook is parsed only once
+    assert get_directive_index("systemd.service.xml") is index
+
+
+def test_directive_index_missing_docbook():
+    #  there is no systemd.target.xml bundled
+    assert get_directive_index("systemd.target.xml") == {}
+
+
+def test_directive_index_without_lxml(monkeypatch):
+    """Docbooks missing from the bundle have no documentation without lxml"""
+    monkeypatch.setitem(sys.modules, "lxml", None)
+    assert build_directive_index("systemd.target.xml") == {}
+    assert build_directive_index("systemd.kill.xml") == {}
+
+
+def test_documentation_bundle_up_to_date():
+    """The bundle must be recompiled with compile_docs whenever the docbooks change."""
+    bundle = load_documentation_bundle()
+    assert bundle is not None
+    assert bundle["sources"] == {
+        docbook: docbook_digest(docbook) for docbook in get_docbooks()
+    }
+
+
+def test_build_directive_index_matches_bundle():
+    bundle = load_documentation_bundle()
+    assert bundle is not None
+    built = build_directive_index("systemd.kill.xml")
+    bundled = bundle["directives"]["systemd.kill.xml"]
+    assert built.keys() == bundled.keys()
+    assert built["KillMode"].plain_text == bundled["KillMode"].plain_text
+
+
+def test_prerender_documentation(monkeypatch):
+    documentation = DirectiveDocumentation(b"<varlistentry/>", "")
+    monkeypatch.setitem(directive_index, "systemd.fake.xml", {"Fake": documentation})
+    monkeypatch.setattr(unit, "convert_to_markdown_batch", lambda raws: ["*fake*\n"])
+    prerender_documentation()
+    assert directive_index["systemd.fake.xml"]["Fake"].markdown == "*fake*\n"
+
+
+def test_section_index_incremental():
+    random = Random(0)
+    snippets = [
+        "[Unit]\n",
+        "[Service]\n",
+        "[Install]\n",
+        "[Bogus]\n",
+        "Foo=bar\n",
+        "\n",
+    ]
+    lines = [random.choice(snippets) for _ in range(50)]
+    index = SectionIndex(lines)
+    for _ in range(200):
+        lines, changes = random_changes(random, lines, snippets)
+        index.apply_changes(changes, lines)
+        assert index.header_lines == SectionIndex(lines).header_lines
+        document = TextDocument("file:///test.service", "".join(lines))
+        for line in range(len(lines)):
+            assert index.section_at(line) == get_current_section(
+                document, Position(line, 0)
+            )
+
+
+def test_get_directives_immutable():
+    exec_directives = len(systemd_exec_directives)
+    service_directives = len(systemd_service_directives)
+    for _ in range(3):
+        directives = get_directives(UnitType.service, UnitFileSection.service)
+    assert directives is get_directives(UnitType.service, UnitFileSection.service)
+    assert "ExecStart" in directives and "KillMode" in directives
+    assert len(directives) == len(set(directives))
+    #  module level tables are left untouched
+    assert len(systemd_service_directives) == service_directives
+    assert len(systemd_exec_directives) == exec_directives
+
+
+def test_get_unit_type():
+    assert get_unit_type(TextDocument("file:///foo.socket")) == UnitType.socket
+    dropin = TextDocument("file:///foo.socket.d/override.conf")
+    assert get_unit_type(dropin) == UnitType.socket
+    assert get_unit_type(TextDocument("file:///service.d/all.conf")) == UnitType.service
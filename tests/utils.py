@@ -0,0 +1,76 @@
+import os
+from contextlib import contextmanager
+from random import Random
+from threading import Thread
+from typing import Iterator
+
+from lsprotocol.types import (
+    EXIT,
+    SHUTDOWN,
+    Position,
+    Range,
+    TextDocumentContentChangeEvent_Type1,
+)
+from pygls.server import LanguageServer
+
+from systemd_language_server.server import SystemdLanguageServer
+
+
+@contextmanager
+def serve_over_pipes() -> Iterator[tuple[LanguageServer, SystemdLanguageServer]]:
+    """
+    Create a client and server in their own threads communicating over a pair of pipes.
+    Inspired by pygls.tests.  client_server
+    """
+    r_cs, w_cs = os.pipe()
+    r_sc, w_sc = os.pipe()
+
+    thread_main = lambda client_or_server, read, write: client_or_server.start_io(
+        os.fdopen(read, "rb"), os.fdopen(write, "wb")
+    )
+    client = LanguageServer("client", "v1")
+    client_thread = Thread(target=thread_main, args=[client, r_sc, w_cs])
+    client_thread.start()
+
+    server = SystemdLanguageServer("systemd-server", "v0")
+    server_thread = Thread(target=thread_main, args=[server, r_cs, w_sc])
+    server_thread.start()
+
+    try:
+        yield client, server
+    finally:
+        client.lsp.send_request(SHUTDOWN)
+        client.lsp.notify(EXIT)
+        client_thread.join()
+        server_thread.join()
+
+
+def apply_change(lines: list[str], change: TextDocumentContentChangeEvent_Type1):
+    start, end = change.range.start, change.range.end
+    text = "".join(lines)
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    begin = offsets[start.line] + start.character
+    stop = offsets[end.line] + end.character
+    return (text[:begin] + change.text + text[stop:]).splitlines(True)
+
+
+def random_changes(
+    random: Random, lines: list[str], snippets: list[str]
+) -> tuple[list[str], list[TextDocumentContentChangeEvent_Type1]]:
+    """Apply a few random edits made of snippets to lines. Return the new lines and the
+    edits."""
+    changes = []
+    for _ in range(random.randint(1, 3)):
+        start = random.randrange(len(lines))
+        end = random.randrange(start, min(start + 5, len(lines)))
+        text = "".join(random.choice(snippets) for _ in range(random.randint(0, 3)))
+        #  replace whole lines, or split them in the middle
+        character = random.choice([0, 1]) if lines[end] != "\n" else 0
+        change = TextDocumentContentChangeEvent_Type1(
+            range=Range(Position(start, 0), Position(end, character)), text=text
+        )
+        lines = apply_change(lines, change)
+        changes.append(change)
+    return lines, changes